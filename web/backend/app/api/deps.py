@@ -2,24 +2,23 @@
 Shared API dependencies — auth, DB session, pagination.
 """
 import uuid
-from fastapi import Depends, HTTPException, status, Query
+from typing import Literal
+from fastapi import Depends, Header, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.core.database import get_db
 from app.core.security import decode_token
+from app.core.streaming import negotiate
 from app.models.user import User
 
 security_scheme = HTTPBearer()
+optional_security_scheme = HTTPBearer(auto_error=False)
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    """Decode JWT and return the authenticated user."""
-    payload = decode_token(credentials.credentials)
+async def _user_from_token(token: str, db: AsyncSession) -> User:
+    payload = decode_token(token)
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -41,14 +40,54 @@ async def get_current_user(
     return user
 
 
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """Decode JWT and return the authenticated user."""
+    return await _user_from_token(credentials.credentials, db)
+
+
+async def get_stream_user(
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security_scheme),
+    token: str | None = Query(None, description="Access token, for clients that cannot set headers (EventSource)"),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """Like ``get_current_user``, but also accepts the token as a query parameter."""
+    if credentials is None and token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+        )
+    return await _user_from_token(credentials.credentials if credentials else token, db)
+
+
 class PaginationParams:
-    """Common pagination query parameters."""
+    """
+    Common pagination query parameters.
+
+    Pass the previous response's ``next_cursor`` as ``cursor`` to read the
+    next page; ``page`` is still accepted for the first request or for
+    clients that page by number. ``count`` picks how ``total`` is computed:
+    by default exactly on the first page and not at all after that.
+    """
 
     def __init__(
         self,
-        page: int = Query(1, ge=1, description="Page number"),
+        page: int = Query(1, ge=1, description="Page number (ignored when a cursor is given)"),
         page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+        cursor: str | None = Query(None, description="Opaque cursor from the previous page's next_cursor"),
+        count: Literal["exact", "estimate", "none"] | None = Query(
+            None, description="How to compute total: exact, estimate (planner statistics) or none"
+        ),
     ):
         self.page = page
         self.page_size = page_size
-        self.offset = (page - 1) * page_size
+        self.cursor = cursor
+        self.offset = 0 if cursor else (page - 1) * page_size
+        self.count = count or ("none" if cursor else "exact")
+
+
+def get_stream_format(accept: str | None = Header(None)) -> str | None:
+    """Streaming media type requested by the ``Accept`` header; None means the JSON default."""
+    return negotiate(accept)
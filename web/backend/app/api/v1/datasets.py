@@ -1,19 +1,26 @@
 """
-Dataset API routes — CRUD, cleaning, visualization.
+Dataset API routes — CRUD, preview, query, cleaning, visualization.
 """
 import uuid
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.api.deps import get_current_user, PaginationParams
+from app.core.exceptions import BadRequestError
+from app.core.streaming import STREAM_FORMATS, table_response
+from app.api.deps import get_current_user, get_stream_format, PaginationParams
 from app.models.user import User
 from app.schemas.dataset import (
-    DatasetResponse, DatasetListResponse, DatasetPreviewResponse,
+    DatasetResponse, DatasetListResponse, DatasetPreviewResponse, DatasetProfileResponse, DatasetCacheStats,
+    DatasetQueryRequest, DatasetQueryResponse,
     CleaningOperationSchema, CleaningResult,
     VisualizationConfig, VisualizationResponse,
 )
-from app.services.dataset_service import get_dataset, list_datasets, log_cleaning_operation
+from app.services.dataset_service import (
+    cache_stats, get_dataset, get_preview, list_datasets, log_cleaning_operation, read_rows, sample_fraction,
+    sample_view,
+)
+from app.services.query_service import execute_query, run_query
 
 router = APIRouter(prefix="/datasets", tags=["Datasets"])
 
@@ -25,16 +32,24 @@ async def list_project_datasets(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    datasets, total = await list_datasets(
-        db, project_id=project_id, user_id=current_user.id,
-        offset=pagination.offset, limit=pagination.page_size,
+    page = await list_datasets(
+        db, project_id=project_id, user_id=current_user.id, limit=pagination.page_size,
+        cursor=pagination.cursor, offset=pagination.offset, count=pagination.count,
     )
     return DatasetListResponse(
-        datasets=[DatasetResponse.model_validate(d) for d in datasets],
-        total=total,
+        datasets=[DatasetResponse.model_validate(d) for d in page.items],
+        total=page.total,
+        total_estimated=page.total_estimated,
+        next_cursor=page.next_cursor,
     )
 
 
+@router.get("/cache/stats", response_model=dict[str, DatasetCacheStats])
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit/miss counters of the preview and row-group caches in this API process."""
+    return cache_stats()
+
+
 @router.get("/{dataset_id}", response_model=DatasetResponse)
 async def get_one(
     dataset_id: uuid.UUID,
@@ -45,28 +60,115 @@ async def get_one(
     return DatasetResponse.model_validate(dataset)
 
 
-@router.get("/{dataset_id}/preview", response_model=DatasetPreviewResponse)
+@router.get("/{dataset_id}/profile", response_model=DatasetProfileResponse)
+async def get_profile(
+    dataset_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Per-column statistics computed during extraction (no rescan of the data)."""
+    dataset = await get_dataset(db, dataset_id=dataset_id, user_id=current_user.id, with_profile=True)
+    return DatasetProfileResponse(
+        dataset_id=dataset.id,
+        row_count=dataset.row_count,
+        columns=(dataset.column_profile or {}).get("columns", {}),
+    )
+
+
+_STREAM_RESPONSES = {200: {"content": {media_type: {} for media_type in STREAM_FORMATS}}}
+
+
+@router.get("/{dataset_id}/preview", response_model=DatasetPreviewResponse, responses=_STREAM_RESPONSES)
 async def preview_data(
     dataset_id: uuid.UUID,
-    page: int = 1,
-    page_size: int = 100,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000),
+    columns: list[str] | None = Query(None, description="Columns to return (repeat the parameter); all by default"),
+    sample: bool = Query(False, description="Page through the dataset's stored sample instead of every row"),
+    stream_format: str | None = Depends(get_stream_format),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Return a paginated preview of the dataset rows."""
+    """
+    Return a paginated preview of the dataset rows.
+
+    Read straight from the stored Parquet file: only the row groups that
+    cover the page, and only the requested columns, are fetched. Pages and
+    decoded row groups are cached per dataset version.
+
+    JSON by default; ``Accept: application/vnd.apache.arrow.stream`` or
+    ``application/x-ndjson`` streams the rows instead, with the total row
+    count in the ``X-Total-Rows`` header.
+
+    ``sample=true`` pages through the stratified sample stored for large
+    datasets (``sampled`` / ``X-Sample-Fraction`` say so); datasets too
+    small to have one are read whole.
+    """
     dataset = await get_dataset(db, dataset_id=dataset_id, user_id=current_user.id)
 
-    # In production, load from Parquet in S3
-    # For now, return schema-based stub
-    columns = list(dataset.column_schema.keys()) if isinstance(dataset.column_schema, dict) else []
+    if not dataset.storage_key_parquet:
+        # Formats without a real engine yet have a schema but no stored rows
+        return DatasetPreviewResponse(
+            columns=columns or list(dataset.column_schema),
+            rows=[],
+            total_rows=dataset.row_count or 0,
+            page=page,
+            page_size=page_size,
+        )
+
+    # Nothing below needs the database; give the connection back before the storage reads
+    await db.close()
+    source = (sample_view(dataset) if sample else None) or dataset
+    if stream_format:
+        table, total_rows = await read_rows(
+            source, offset=(page - 1) * page_size, limit=page_size, columns=columns
+        )
+        headers = {"X-Total-Rows": str(total_rows)}
+        fraction = await sample_fraction(source)
+        if fraction is not None:
+            headers["X-Sample-Fraction"] = repr(fraction)
+        return table_response(table, stream_format, headers)
+    payload = await get_preview(source, page=page, page_size=page_size, columns=columns)
+    return DatasetPreviewResponse(**payload)
+
+
+@router.post("/{dataset_id}/query", response_model=DatasetQueryResponse, responses=_STREAM_RESPONSES)
+async def query_dataset(
+    dataset_id: uuid.UUID,
+    spec: DatasetQueryRequest,
+    stream_format: str | None = Depends(get_stream_format),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Filter, group, aggregate and sort the dataset's rows.
 
-    return DatasetPreviewResponse(
-        columns=columns,
-        rows=[],
-        total_rows=dataset.row_count or 0,
-        page=page,
-        page_size=page_size,
-    )
+    Runs over the stored Parquet file: row groups whose statistics rule out
+    the ``where`` conditions are skipped and only the referenced columns are
+    read. Results are cached per dataset version and query.
+
+    Accepts the same streaming formats as the preview; scan counts are then
+    in the ``X-Row-Groups-Scanned`` and ``X-Row-Groups-Total`` headers.
+
+    With ``sample`` set the query runs over the dataset's stored sample and
+    estimates come with error bounds (see ``DatasetQueryRequest``).
+    """
+    dataset = await get_dataset(db, dataset_id=dataset_id, user_id=current_user.id)
+    if not dataset.storage_key_parquet:
+        raise BadRequestError("Dataset has no stored rows to query")
+
+    await db.close()
+    if stream_format:
+        result = await execute_query(dataset, spec)
+        headers = {
+            "X-Row-Groups-Scanned": str(result.row_groups_scanned),
+            "X-Row-Groups-Total": str(result.row_groups_total),
+        }
+        if result.sample_fraction is not None:
+            headers["X-Sample-Fraction"] = repr(result.sample_fraction)
+        return table_response(result.table, stream_format, headers)
+    payload = await run_query(dataset, spec)
+    return DatasetQueryResponse(**payload)
 
 
 @router.post("/{dataset_id}/clean", response_model=CleaningResult)
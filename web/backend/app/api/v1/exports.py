@@ -33,7 +33,7 @@ async def export_dataset(
     else:
         raise BadRequestError(f"Export format '{format}' not available for this dataset")
 
-    url = await generate_presigned_url(bucket="datamorph-files", key=key, expires_in=3600)
+    url = await generate_presigned_url(key, expires_in=3600)
 
     return JSONResponse(content={
         "download_url": url,
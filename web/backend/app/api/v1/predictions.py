@@ -12,8 +12,9 @@ from app.models.prediction import Prediction
 from app.schemas.prediction import PredictionCreateRequest, PredictionResponse, PredictionListResponse
 from app.services.dataset_service import get_dataset
 from app.core.exceptions import NotFoundError
+from app.core.pagination import paginate
 
-from sqlalchemy import select, func
+from sqlalchemy import select
 
 router = APIRouter(prefix="/predictions", tags=["Predictions"])
 
@@ -84,25 +85,22 @@ async def list_predictions(
 ):
     from app.models.project import Project
 
-    count_result = await db.execute(
-        select(func.count())
-        .select_from(Prediction)
-        .join(Project, Prediction.project_id == Project.id)
-        .where(Prediction.project_id == project_id, Project.user_id == current_user.id)
-    )
-    total = count_result.scalar() or 0
-
-    result = await db.execute(
+    page = await paginate(
+        db,
         select(Prediction)
         .join(Project, Prediction.project_id == Project.id)
-        .where(Prediction.project_id == project_id, Project.user_id == current_user.id)
-        .order_by(Prediction.created_at.desc())
-        .offset(pagination.offset)
-        .limit(pagination.page_size)
+        .where(Prediction.project_id == project_id, Project.user_id == current_user.id),
+        sort_column=Prediction.created_at,
+        id_column=Prediction.id,
+        limit=pagination.page_size,
+        cursor=pagination.cursor,
+        offset=pagination.offset,
+        count=pagination.count,
     )
-    predictions = list(result.scalars().all())
 
     return PredictionListResponse(
-        predictions=[PredictionResponse.model_validate(p) for p in predictions],
-        total=total,
+        predictions=[PredictionResponse.model_validate(p) for p in page.items],
+        total=page.total,
+        total_estimated=page.total_estimated,
+        next_cursor=page.next_cursor,
     )
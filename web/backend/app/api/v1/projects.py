@@ -1,8 +1,8 @@
 """
-Project CRUD API routes.
+Project API routes — CRUD and full-text search.
 """
 import uuid
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
@@ -12,9 +12,11 @@ from app.schemas.project import (
     ProjectCreateRequest, ProjectUpdateRequest,
     ProjectResponse, ProjectListResponse, ProjectDetailResponse,
 )
+from app.schemas.search import SearchResponse
 from app.services.project_service import (
     create_project, get_project, list_projects, update_project, delete_project, get_project_detail,
 )
+from app.services.search_service import load_segments, search_segments
 
 router = APIRouter(prefix="/projects", tags=["Projects"])
 
@@ -38,13 +40,15 @@ async def list_all(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    projects, total = await list_projects(
-        db, user_id=current_user.id,
-        offset=pagination.offset, limit=pagination.page_size,
+    page = await list_projects(
+        db, user_id=current_user.id, limit=pagination.page_size,
+        cursor=pagination.cursor, offset=pagination.offset, count=pagination.count,
     )
     return ProjectListResponse(
-        projects=[ProjectResponse.model_validate(p) for p in projects],
-        total=total,
+        projects=[ProjectResponse.model_validate(p) for p in page.items],
+        total=page.total,
+        total_estimated=page.total_estimated,
+        next_cursor=page.next_cursor,
     )
 
 
@@ -58,6 +62,26 @@ async def get_one(
     return ProjectDetailResponse(**detail)
 
 
+@router.get("/{project_id}/search", response_model=SearchResponse)
+async def search(
+    project_id: uuid.UUID,
+    q: str = Query(..., min_length=1, max_length=500, description="Words to look for"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Search the text extracted from the project's PDFs and images.
+
+    Ranked with BM25 over the project's full-text index; each hit names the
+    file, dataset, page and row it came from.
+    """
+    segments = await load_segments(db, project_id=project_id, user_id=current_user.id)
+    # The index and the hit rows are read from storage; give the connection back first
+    await db.close()
+    return SearchResponse(**await search_segments(segments, q, limit=limit))
+
+
 @router.patch("/{project_id}", response_model=ProjectResponse)
 async def update(
     project_id: uuid.UUID,
@@ -1,22 +1,41 @@
 """
 File upload API routes.
 """
+import hashlib
 import uuid
 import os
-from fastapi import APIRouter, UploadFile, File as FastAPIFile, Depends, status
+from fastapi import APIRouter, UploadFile, File as FastAPIFile, Depends, Header, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.api.deps import get_current_user, PaginationParams
+from app.api.deps import get_current_user, get_stream_user, PaginationParams
 from app.models.user import User
 from app.config import settings
-from app.schemas.upload import UploadResponse, FileProgressResponse, FileResponse, FileListResponse
+from app.schemas.upload import (
+    UploadSessionCreateRequest, UploadSessionResponse, UploadChunkResponse,
+    DirectUploadRequest, DirectUploadCompleteRequest, DirectUploadResponse,
+    BulkUploadFile, BulkUploadResponse, BulkUploadProgressResponse,
+    UploadResponse, FileProgressResponse, FileResponse, FileListResponse,
+)
 from app.services.file_service import (
-    check_storage_limits, stream_to_temp, detect_file_type,
-    estimate_processing_time, create_file_record,
+    check_storage_limits, detect_file_type, create_file_record,
+    find_duplicate_file, reuse_extraction,
     get_file, list_project_files, delete_file_record,
 )
-from app.core.storage import upload_file_to_s3
+from app.services.direct_upload_service import (
+    reserve_direct_upload, complete_direct_upload, cancel_direct_upload,
+)
+from app.services.bulk_upload_service import ingest_bulk_upload, get_bulk_progress
+from app.services.progress_service import FINAL_STATUSES, get_last_progress, stream_progress
+from app.services.file_detector import SNIFF_BYTES
+from app.services.estimator_service import estimate_upload_timing
+from app.core.storage import upload_stream_to_s3, delete_file_from_s3
+from app.core.exceptions import StorageLimitError, BadRequestError
+from app.services.upload_session_service import (
+    create_upload_session, get_upload_session, list_received_chunks,
+    upload_session_chunk, finalize_upload_session, abort_upload_session,
+)
 
 router = APIRouter(prefix="/uploads", tags=["Uploads"])
 
@@ -29,64 +48,293 @@ async def upload_file(
     current_user: User = Depends(get_current_user),
 ):
     """Universal upload endpoint — handles CSV, PDF, Image automatically."""
-    file_size = file.size or 0
-    await check_storage_limits(current_user, file_size)
+    await check_storage_limits(current_user, file.size or 0)
 
-    # Stream to temp
-    temp_path = await stream_to_temp(file)
+    # Detect format from the first few KB, then rewind for the upload
+    head = await file.read(SNIFF_BYTES)
+    await file.seek(0)
+    detection = detect_file_type(head, file.filename or "file")
 
-    try:
-        # Detect format
-        detection = detect_file_type(temp_path, file.filename or "file")
-
-        # Create a project if none specified
-        if project_id is None:
-            from app.services.project_service import create_project
-            project = await create_project(db, user_id=current_user.id, name=file.filename or "Untitled")
-            project_id = project.id
-
-        # Upload to S3
-        storage_key = f"{current_user.id}/{project_id}/{uuid.uuid4()}{os.path.splitext(file.filename or '')[1]}"
-        await upload_file_to_s3(
-            bucket=settings.S3_BUCKET_NAME,
-            key=storage_key,
-            file_path=temp_path,
-            content_type=detection["mime_type"],
-        )
+    # Create a project if none specified
+    if project_id is None:
+        from app.services.project_service import create_project
+        project = await create_project(db, user_id=current_user.id, name=file.filename or "Untitled")
+        project_id = project.id
 
-        # Create DB record
-        file_record = await create_file_record(
-            db,
-            user_id=current_user.id,
-            project_id=project_id,
-            filename=file.filename or "file",
-            size=file_size,
-            detected_format=detection["format"],
-            mime_type=detection["mime_type"],
-            storage_bucket=settings.S3_BUCKET_NAME,
-            storage_key=storage_key,
-        )
+    # Stream to S3 in multipart chunks (no temp-file spool), hashing as we go
+    storage_key = f"{current_user.id}/{project_id}/{uuid.uuid4()}{os.path.splitext(file.filename or '')[1]}"
+    hasher = hashlib.sha256()
+    file_size = await upload_stream_to_s3(
+        file,
+        storage_key,
+        content_type=detection["mime_type"],
+        on_chunk=hasher.update,
+    )
+    content_sha256 = hasher.hexdigest()
 
-        # Queue async extraction (Celery)
+    # Same bytes already uploaded by this user: keep one object, reuse its extraction
+    duplicate = await find_duplicate_file(db, user_id=current_user.id, content_sha256=content_sha256)
+    if duplicate is not None:
+        await delete_file_from_s3(storage_key)
+        storage_key = duplicate.storage_key_original
+    elif file_size != (file.size or 0):
+        # The declared size may be missing or wrong; enforce limits on what was received
         try:
-            from app.tasks.extraction import process_file_extraction
-            process_file_extraction.delay(str(file_record.id))
-        except Exception:
-            pass  # Celery may not be running in dev
+            await check_storage_limits(current_user, file_size)
+        except StorageLimitError:
+            await delete_file_from_s3(storage_key)
+            raise
+
+    # Create DB record
+    file_record = await create_file_record(
+        db,
+        user_id=current_user.id,
+        project_id=project_id,
+        filename=file.filename or "file",
+        size=file_size,
+        detected_format=detection["format"],
+        mime_type=detection["mime_type"],
+        storage_bucket=settings.S3_BUCKET_NAME,
+        storage_key=storage_key,
+        content_sha256=content_sha256,
+        format_hints=detection["hints"],
+        charge_storage=duplicate is None,
+    )
 
+    if duplicate is not None and duplicate.status == "ready":
+        await reuse_extraction(db, source=duplicate, target=file_record)
         return UploadResponse(
             file_id=file_record.id,
-            status="processing",
+            status="ready",
             detected_format=detection["format"],
             progress_url=f"/api/v1/uploads/{file_record.id}/progress",
-            estimated_seconds=estimate_processing_time(detection["format"], file_size),
+            events_url=f"/api/v1/uploads/{file_record.id}/events",
+            estimated_seconds=0,
+            deduplicated=True,
         )
-    finally:
-        # Clean up temp file
+
+    # Queue async extraction (Celery)
+    try:
+        from app.tasks.extraction import process_file_extraction
+        process_file_extraction.delay(str(file_record.id))
+    except Exception:
+        pass  # Celery may not be running in dev
+
+    estimated_seconds, poll_interval = await estimate_upload_timing(db, detection["format"], file_size)
+    return UploadResponse(
+        file_id=file_record.id,
+        status="processing",
+        detected_format=detection["format"],
+        progress_url=f"/api/v1/uploads/{file_record.id}/progress",
+        events_url=f"/api/v1/uploads/{file_record.id}/events",
+        estimated_seconds=estimated_seconds,
+        poll_interval_seconds=poll_interval,
+        deduplicated=duplicate is not None,
+    )
+
+
+# ─── Bulk / archive uploads ────────────────────────────────────
+
+@router.post("/bulk", response_model=BulkUploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_bulk(
+    files: list[UploadFile] = FastAPIFile(...),
+    project_id: uuid.UUID | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Upload many files and/or ZIP archives; members are extracted in parallel."""
+    batch = await ingest_bulk_upload(db, user=current_user, uploads=files, project_id=project_id)
+    return BulkUploadResponse(
+        batch_id=batch["batch_id"],
+        project_id=batch["project_id"],
+        files=[
+            BulkUploadFile(
+                file_id=f.id,
+                filename=f.original_filename,
+                detected_format=f.detected_format,
+                deduplicated=f in batch["deduplicated"],
+            )
+            for f in batch["files"]
+        ],
+        progress_url=f"/api/v1/uploads/bulk/{batch['batch_id']}/progress",
+    )
+
+
+@router.get("/bulk/{batch_id}/progress", response_model=BulkUploadProgressResponse)
+async def get_bulk_upload_progress(
+    batch_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """Aggregate extraction progress for every file in a bulk upload."""
+    return await get_bulk_progress(batch_id=batch_id, user_id=current_user.id)
+
+
+# ─── Resumable (chunked) uploads ───────────────────────────────
+
+@router.post("/sessions", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_session(
+    body: UploadSessionCreateRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Open a resumable upload session; chunks are then PUT by offset."""
+    session = await create_upload_session(
+        db, user=current_user, filename=body.filename, size=body.size,
+        project_id=body.project_id, chunk_size=body.chunk_size,
+    )
+    chunk_size = int(session["chunk_size"])
+    return UploadSessionResponse(
+        session_id=session["session_id"],
+        chunk_size=chunk_size,
+        total_chunks=-(-body.size // chunk_size),
+        received_chunks=[],
+        expires_in=settings.UPLOAD_SESSION_TTL_SECONDS,
+    )
+
+
+@router.get("/sessions/{session_id}", response_model=UploadSessionResponse)
+async def get_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """Report which chunks the server already holds so a client can resume."""
+    session = await get_upload_session(session_id=session_id, user_id=current_user.id)
+    chunk_size = int(session["chunk_size"])
+    return UploadSessionResponse(
+        session_id=session_id,
+        chunk_size=chunk_size,
+        total_chunks=-(-int(session["size"]) // chunk_size),
+        received_chunks=await list_received_chunks(session_id),
+        expires_in=settings.UPLOAD_SESSION_TTL_SECONDS,
+    )
+
+
+@router.put("/sessions/{session_id}/chunks", response_model=UploadChunkResponse)
+async def put_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk"),
+    x_chunk_sha256: str = Header(..., description="Hex SHA-256 of the chunk body"),
+    current_user: User = Depends(get_current_user),
+):
+    """Upload one chunk (raw body). Safe to retry and to send in parallel."""
+    session = await get_upload_session(session_id=session_id, user_id=current_user.id)
+    limit = int(session["chunk_size"])
+
+    body = bytearray()
+    async for piece in request.stream():
+        body.extend(piece)
+        if len(body) > limit:
+            raise BadRequestError(f"Chunk exceeds session chunk size of {limit} bytes")
+
+    _, index = await upload_session_chunk(
+        session_id=session_id, user_id=current_user.id,
+        offset=offset, body=bytes(body), checksum=x_chunk_sha256,
+    )
+    return UploadChunkResponse(
+        session_id=session_id,
+        chunk_index=index,
+        received_chunks=len(await list_received_chunks(session_id)),
+        total_chunks=-(-int(session["size"]) // limit),
+    )
+
+
+@router.post("/sessions/{session_id}/complete", response_model=UploadResponse, status_code=status.HTTP_201_CREATED)
+async def complete_session(
+    session_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Assemble all chunks, create the file record and queue extraction."""
+    file_record = await finalize_upload_session(db, session_id=session_id, user_id=current_user.id)
+
+    try:
+        from app.tasks.extraction import process_file_extraction
+        process_file_extraction.delay(str(file_record.id))
+    except Exception:
+        pass  # Celery may not be running in dev
+
+    estimated_seconds, poll_interval = await estimate_upload_timing(
+        db, file_record.detected_format or "unknown", file_record.file_size_bytes,
+    )
+    return UploadResponse(
+        file_id=file_record.id,
+        status="processing",
+        detected_format=file_record.detected_format,
+        progress_url=f"/api/v1/uploads/{file_record.id}/progress",
+        events_url=f"/api/v1/uploads/{file_record.id}/events",
+        estimated_seconds=estimated_seconds,
+        poll_interval_seconds=poll_interval,
+    )
+
+
+@router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    await abort_upload_session(session_id=session_id, user_id=current_user.id)
+
+
+# ─── Direct-to-storage uploads ─────────────────────────────────
+
+@router.post("/direct", response_model=DirectUploadResponse, status_code=status.HTTP_201_CREATED)
+async def create_direct_upload(
+    body: DirectUploadRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Reserve a key and return presigned POST / multipart part URLs for it."""
+    return await reserve_direct_upload(
+        db, user=current_user, filename=body.filename,
+        size=body.size, project_id=body.project_id,
+    )
+
+
+@router.post("/direct/{upload_id}/complete", response_model=UploadResponse, status_code=status.HTTP_201_CREATED)
+async def finish_direct_upload(
+    upload_id: str,
+    body: DirectUploadCompleteRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Verify size and ETag of the uploaded object, then queue extraction.
+
+    Repeating the call returns the same file without queueing it again.
+    """
+    file_record, created = await complete_direct_upload(
+        db, upload_id=upload_id, user_id=current_user.id, etag=body.etag,
+        parts=[p.model_dump() for p in body.parts] if body.parts else None,
+    )
+
+    if created:
         try:
-            os.unlink(temp_path)
-        except OSError:
-            pass
+            from app.tasks.extraction import process_file_extraction
+            process_file_extraction.delay(str(file_record.id))
+        except Exception:
+            pass  # Celery may not be running in dev
+
+    estimated_seconds, poll_interval = await estimate_upload_timing(
+        db, file_record.detected_format or "unknown", file_record.file_size_bytes,
+    )
+    return UploadResponse(
+        file_id=file_record.id,
+        status="processing",
+        detected_format=file_record.detected_format,
+        progress_url=f"/api/v1/uploads/{file_record.id}/progress",
+        events_url=f"/api/v1/uploads/{file_record.id}/events",
+        estimated_seconds=estimated_seconds,
+        poll_interval_seconds=poll_interval,
+    )
+
+
+@router.delete("/direct/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_direct_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    await cancel_direct_upload(upload_id=upload_id, user_id=current_user.id)
 
 
 @router.get("/{file_id}/progress", response_model=FileProgressResponse)
@@ -95,8 +343,13 @@ async def get_upload_progress(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Polling endpoint for extraction progress."""
+    """Polling endpoint for extraction progress. Prefer ``/events``, which pushes each step."""
     f = await get_file(db, file_id=file_id, user_id=current_user.id)
+    # Mid-run steps only go to Redis; the row is written on state transitions
+    if f.status not in FINAL_STATUSES:
+        live = await get_last_progress(f.id)
+        if live is not None:
+            return FileProgressResponse(**live)
     return FileProgressResponse(
         status=f.status,
         progress=f.processing_progress,
@@ -105,6 +358,33 @@ async def get_upload_progress(
     )
 
 
+@router.get("/{file_id}/events")
+async def stream_upload_progress(
+    file_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_stream_user),
+):
+    """
+    Server-Sent Events stream of extraction progress. Each ``progress`` event
+    carries the same fields as ``/progress``; the stream ends once the file
+    is ready or failed. Auth and ownership are checked once per connection.
+    """
+    f = await get_file(db, file_id=file_id, user_id=current_user.id)
+    initial = FileProgressResponse(
+        status=f.status,
+        progress=f.processing_progress,
+        extraction_metadata=f.extraction_metadata,
+        error=f.error_message,
+    ).model_dump()
+    # The stream may stay open for minutes; don't hold a pooled connection for it
+    await db.close()
+    return StreamingResponse(
+        stream_progress(f.id, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/{file_id}", response_model=FileResponse)
 async def get_file_info(
     file_id: uuid.UUID,
@@ -122,13 +402,15 @@ async def list_files(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    files, total = await list_project_files(
-        db, project_id=project_id, user_id=current_user.id,
-        offset=pagination.offset, limit=pagination.page_size,
+    page = await list_project_files(
+        db, project_id=project_id, user_id=current_user.id, limit=pagination.page_size,
+        cursor=pagination.cursor, offset=pagination.offset, count=pagination.count,
     )
     return FileListResponse(
-        files=[FileResponse.model_validate(f) for f in files],
-        total=total,
+        files=[FileResponse.model_validate(f) for f in page.items],
+        total=page.total,
+        total_estimated=page.total_estimated,
+        next_cursor=page.next_cursor,
     )
 
 
@@ -21,6 +21,53 @@ class Settings(BaseSettings):
     S3_BUCKET_NAME: str = "datamorph-files"
     AWS_ACCESS_KEY_ID: str = "minio"
     AWS_SECRET_ACCESS_KEY: str = "minio123"
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MAX_ATTEMPTS: int = 5
+    S3_CONNECT_TIMEOUT: int = 5
+    S3_READ_TIMEOUT: int = 60
+
+    # Uploads — streamed to S3 as multipart parts
+    UPLOAD_PART_SIZE_BYTES: int = 16 * 1024 * 1024
+    UPLOAD_MAX_CHUNK_BYTES: int = 64 * 1024 * 1024  # resumable chunks are buffered in memory; at most 5 GiB
+    UPLOAD_MAX_CONCURRENCY: int = 4
+    UPLOAD_SESSION_TTL_SECONDS: int = 24 * 3600
+    DIRECT_UPLOAD_URL_EXPIRE_SECONDS: int = 3600
+    DIRECT_UPLOAD_SINGLE_PART_MAX_BYTES: int = 100 * 1024 * 1024
+    BULK_UPLOAD_MAX_FILES: int = 500
+    BULK_UPLOAD_CONCURRENCY: int = 8
+
+    # Extraction — streamed parse blocks, Parquet output written locally then uploaded
+    EXTRACTION_BLOCK_SIZE_BYTES: int = 8 * 1024 * 1024
+    EXTRACTION_TMP_DIR: str | None = None
+    PARQUET_ROW_GROUP_ROWS: int = 128 * 1024
+    DATASET_SAMPLE_ROWS: int = 100_000  # larger datasets also store a stratified sample of this size
+    DATASET_SAMPLE_ROW_GROUP_ROWS: int = 16 * 1024
+    SEARCH_SEGMENT_ROW_GROUP_ROWS: int = 8 * 1024  # postings per row group of a full-text index segment
+    SCHEMA_SAMPLE_ROWS: int = 100_000
+    SCHEMA_RESERVOIR_SIZE: int = 10_000
+    EXTRACTION_MAX_WORKERS: int | None = None  # process pool size; defaults to the core count
+    PDF_PAGES_PER_BATCH: int = 8
+    EXCEL_BATCH_ROWS: int = 10_000
+    EXCEL_PARALLEL_SHEETS: bool = True
+    JSON_BATCH_ROWS: int = 10_000
+    JSON_MAX_DEPTH: int = 8  # deeper objects are kept as JSON text
+    JSON_ARRAY_MODE: str = "keep"  # "keep" arrays as JSON text or "explode" one into rows
+    JSON_EXPLODE_PATH: str | None = None  # dotted path; defaults to the first array seen
+    JSON_MAX_COLUMNS: int = 2000  # distinct flattened fields before a file is rejected
+
+    # Progress events — Redis pub/sub, streamed to clients over SSE
+    PROGRESS_EVENT_TTL_SECONDS: int = 3600
+    PROGRESS_HEARTBEAT_SECONDS: int = 15
+
+    # Dataset read caches — per-process LRU bounded by bytes, over a shared Redis tier
+    PREVIEW_PAGE_CACHE_BYTES: int = 64 * 1024 * 1024
+    ROW_GROUP_CACHE_BYTES: int = 256 * 1024 * 1024
+    DATASET_LAYOUT_CACHE_BYTES: int = 32 * 1024 * 1024  # row indexes and footers; local only
+    DATASET_CACHE_TTL_SECONDS: int = 3600
+    DATASET_CACHE_MAX_ENTRY_BYTES: int = 8 * 1024 * 1024  # larger values stay in the local tier
+    QUERY_RESULT_CACHE_BYTES: int = 64 * 1024 * 1024
+    SEARCH_DIRECTORY_CACHE_BYTES: int = 64 * 1024 * 1024  # term → row groups maps of search segments
+    QUERY_WINDOW_ROW_GROUPS: int = 4  # row groups fetched and reduced together by the query engine
 
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
@@ -0,0 +1,155 @@
+"""
+Two-tier cache — a per-process LRU bounded by bytes, over a shared Redis tier.
+
+The local tier holds values as the caller uses them (decoded tables, parsed
+payloads) and evicts least-recently-used entries once their summed size
+passes its budget. Redis holds the serialized form, shared by every API
+process, so a page one worker has read is a cheap hit for the others.
+
+Keys never need invalidating: callers build them from immutable facts (for
+datasets, the id and ``version``). Redis is best effort; when it is
+unavailable the cache degrades to the local tier. Serializing and
+deserializing (compressed Arrow IPC for tables) run on a worker thread, off
+the event loop.
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable
+
+from app.core.redis import get_binary_redis
+
+
+class ByteLRU:
+    """LRU mapping whose capacity is a byte budget, not an entry count."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, value, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[1]
+        self._entries[key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
+
+
+class TwoTierCache:
+    """
+    ``ByteLRU`` in front of Redis.
+
+    ``dumps`` / ``loads`` convert between the local value and the bytes
+    kept in Redis; ``sizeof`` measures a local value (default: the length
+    of its serialized form). Values larger than ``max_entry_bytes`` are not
+    sent to Redis.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_bytes: int,
+        ttl_seconds: int,
+        max_entry_bytes: int,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+        sizeof: Callable[[Any], int] | None = None,
+    ):
+        self.name = name
+        self.local = ByteLRU(max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self.max_entry_bytes = max_entry_bytes
+        self.dumps = dumps
+        self.loads = loads
+        self.sizeof = sizeof
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.name}:{key}"
+
+    async def get(self, key: str):
+        return (await self.get_many([key]))[key]
+
+    async def get_many(self, keys: list[str]) -> dict:
+        """Look ``keys`` up locally, then fetch the rest from Redis in one round trip."""
+        found = {key: self.local.get(key) for key in keys}
+        missing = [key for key, value in found.items() if value is None]
+        if not missing:
+            return found
+        try:
+            payloads = await get_binary_redis().mget([self._redis_key(k) for k in missing])
+        except Exception:
+            payloads = [None] * len(missing)
+        hits = {key: payload for key, payload in zip(missing, payloads) if payload is not None}
+        self.misses += len(missing) - len(hits)
+        self.shared_hits += len(hits)
+        if not hits:
+            return found
+        values = await asyncio.to_thread(lambda: {key: self.loads(payload) for key, payload in hits.items()})
+        for key, value in values.items():
+            self.local.put(key, value, self.sizeof(value) if self.sizeof else len(hits[key]))
+            found[key] = value
+        return found
+
+    async def set(self, key: str, value) -> None:
+        await self.set_many({key: value})
+
+    async def set_many(self, values: dict, *, shared: bool = True) -> None:
+        """Store ``values`` locally and, unless ``shared`` is off, in Redis."""
+        if not shared and self.sizeof:
+            for key, value in values.items():
+                self.local.put(key, value, self.sizeof(value))
+            return
+        encoded = await asyncio.to_thread(lambda: {key: self.dumps(value) for key, value in values.items()})
+        payloads = {}
+        for key, value in values.items():
+            payload = encoded[key]
+            self.local.put(key, value, self.sizeof(value) if self.sizeof else len(payload))
+            if shared and len(payload) <= self.max_entry_bytes:
+                payloads[self._redis_key(key)] = payload
+        if not payloads:
+            return
+        try:
+            pipe = get_binary_redis().pipeline(transaction=False)
+            for key, payload in payloads.items():
+                pipe.set(key, payload, ex=self.ttl_seconds)
+            await pipe.execute()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        """Counters of this process since start; ``hit_rate`` covers both tiers."""
+        lookups = self.local.hits + self.shared_hits + self.misses
+        return {
+            "local_hits": self.local.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local.hits + self.shared_hits) / lookups, 4) if lookups else None,
+            "local_entries": len(self.local),
+            "local_bytes": self.local.nbytes,
+        }
@@ -1,11 +1,23 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool
 from app.config import settings
 
 engine = create_async_engine(settings.DATABASE_URL, echo=False)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+def use_null_pool() -> None:
+    """
+    Open a new connection per session. For Celery workers, whose tasks each
+    run on their own event loop (at the same time, on a threads pool):
+    asyncpg connections cannot be handed from one loop to another.
+    """
+    global engine
+    engine = create_async_engine(settings.DATABASE_URL, echo=False, poolclass=NullPool)
+    async_session.configure(bind=engine)
+
+
 class Base(DeclarativeBase):
     pass
 
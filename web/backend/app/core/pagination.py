@@ -0,0 +1,94 @@
+"""
+Keyset pagination — opaque cursors over (sort column, id).
+
+A page is read with ``WHERE (sort, id) < (last_sort, last_id) ORDER BY sort
+DESC, id DESC LIMIT n + 1``; with an index on the filter columns followed by
+(sort, id) that is one index descent whatever the depth, where OFFSET has to
+walk past every earlier row. The extra row tells whether a next page exists.
+
+The total is optional. ``exact`` runs ``count(*)`` over the filtered query,
+``estimate`` asks the planner (``EXPLAIN``, no rows read) and ``none`` skips it.
+"""
+import base64
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Select, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import BadRequestError
+
+COUNT_MODES = ("exact", "estimate", "none")
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: str | None
+    total: int | None
+    total_estimated: bool = False
+
+
+def encode_cursor(sort_value: datetime, row_id: uuid.UUID) -> str:
+    raw = json.dumps([sort_value.isoformat(), str(row_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        return datetime.fromisoformat(sort_value), uuid.UUID(row_id)
+    except (ValueError, TypeError):
+        raise BadRequestError("Invalid cursor")
+
+
+async def estimate_count(db: AsyncSession, query: Select) -> int:
+    """Row estimate of ``query`` from planner statistics."""
+    sql = query.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    result = await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    *,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: str | None = None,
+    offset: int = 0,
+    count: str = "exact",
+) -> Page:
+    """
+    One page of ``query`` (filtered, unordered), newest ``sort_column`` first.
+
+    ``cursor`` continues after the last row of an earlier page; without one,
+    ``offset`` is honoured for clients that still page by number.
+    """
+    total = None
+    if count == "exact":
+        total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar() or 0
+    elif count == "estimate":
+        total = await estimate_count(db, query)
+
+    page_query = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)
+    if cursor is not None:
+        sort_value, row_id = decode_cursor(cursor)
+        page_query = page_query.where(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    elif offset:
+        page_query = page_query.offset(offset)
+
+    items = list((await db.execute(page_query)).scalars().all())
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return Page(items=items, next_cursor=next_cursor, total=total, total_estimated=count == "estimate")
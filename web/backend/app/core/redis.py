@@ -0,0 +1,48 @@
+"""
+Shared Redis clients — async for the API process, sync for Celery workers.
+
+Celery tasks drive coroutines on a fresh event loop per task, so they can't
+share an async connection pool; they use ``get_sync_redis`` instead.
+"""
+import redis
+import redis.asyncio as aioredis
+
+from app.config import settings
+
+_redis: aioredis.Redis | None = None
+_binary_redis: aioredis.Redis | None = None
+_sync_redis: redis.Redis | None = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Return the process-wide async Redis client (connection-pooled)."""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def get_binary_redis() -> aioredis.Redis:
+    """Async client that returns raw bytes, for cached binary payloads."""
+    global _binary_redis
+    if _binary_redis is None:
+        _binary_redis = aioredis.from_url(settings.REDIS_URL)
+    return _binary_redis
+
+
+async def close_redis() -> None:
+    global _redis, _binary_redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+    if _binary_redis is not None:
+        await _binary_redis.aclose()
+        _binary_redis = None
+
+
+def get_sync_redis() -> redis.Redis:
+    """Return the process-wide blocking Redis client (Celery workers)."""
+    global _sync_redis
+    if _sync_redis is None:
+        _sync_redis = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _sync_redis
@@ -1,44 +1,373 @@
+"""
+S3 / MinIO storage layer.
+
+boto3 is synchronous, so every call is dispatched to a dedicated, bounded
+thread pool and exposed as a coroutine. The same functions are used from
+FastAPI routes and from Celery tasks (which drive them through ``_run_async``).
+The shared client keeps a connection pool sized to that thread pool and
+retries throttling / transient errors with exponential backoff.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
 from app.config import settings
 
 _client = None
+_client_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one) or larger than 5 GiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024**3
 
 
 def get_s3_client():
+    """Return the process-wide S3 client (thread-safe, lazily created)."""
     global _client
     if _client is None:
-        _client = boto3.client(
-            "s3",
-            endpoint_url=settings.S3_ENDPOINT,
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            config=BotoConfig(signature_version="s3v4"),
-            region_name="us-east-1",
-        )
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    "s3",
+                    endpoint_url=settings.S3_ENDPOINT,
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    config=BotoConfig(
+                        signature_version="s3v4",
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                        retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": "standard"},
+                        connect_timeout=settings.S3_CONNECT_TIMEOUT,
+                        read_timeout=settings.S3_READ_TIMEOUT,
+                        tcp_keepalive=True,
+                    ),
+                    region_name="us-east-1",
+                )
     return _client
 
 
-def upload_file_to_s3(file_bytes: bytes, key: str, content_type: str = "application/octet-stream"):
-    client = get_s3_client()
-    client.put_object(
-        Bucket=settings.S3_BUCKET_NAME,
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.S3_MAX_POOL_CONNECTIONS,
+                    thread_name_prefix="s3",
+                )
+    return _executor
+
+
+async def run_in_storage_pool(fn, *args, **kwargs):
+    """Run a blocking storage call on the bounded S3 thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def _call(method: str, **params):
+    return await run_in_storage_pool(getattr(get_s3_client(), method), **params)
+
+
+def shutdown_storage() -> None:
+    """Release pooled threads and connections (app shutdown / worker exit)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def upload_file_to_s3(
+    body: bytes,
+    key: str,
+    content_type: str = "application/octet-stream",
+    *,
+    bucket: str | None = None,
+) -> str:
+    await _call(
+        "put_object",
+        Bucket=bucket or settings.S3_BUCKET_NAME,
         Key=key,
-        Body=file_bytes,
+        Body=body,
         ContentType=content_type,
     )
     return key
 
 
-def generate_presigned_url(key: str, expires_in: int = 3600) -> str:
-    client = get_s3_client()
-    return client.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": settings.S3_BUCKET_NAME, "Key": key},
+async def upload_stream_to_s3(
+    stream,
+    key: str,
+    content_type: str = "application/octet-stream",
+    *,
+    part_size: int | None = None,
+    concurrency: int | None = None,
+    bucket: str | None = None,
+    on_chunk: Callable[[bytes], None] | None = None,
+) -> int:
+    """
+    Stream an async readable (e.g. ``UploadFile``) into S3 as multipart parts.
+
+    At most ``concurrency`` parts are in flight at once, so memory stays bounded
+    at roughly ``(concurrency + 1) * part_size``. Bodies smaller than one part
+    go up with a single ``put_object``. ``on_chunk`` (e.g. ``hasher.update``)
+    sees every chunk in stream order, off the event loop. Returns the number
+    of bytes written.
+    """
+    bucket = bucket or settings.S3_BUCKET_NAME
+    part_size = max(part_size or settings.UPLOAD_PART_SIZE_BYTES, MIN_PART_SIZE)
+    concurrency = max(concurrency or settings.UPLOAD_MAX_CONCURRENCY, 1)
+
+    chunk = await stream.read(part_size)
+    if on_chunk is not None:
+        await asyncio.to_thread(on_chunk, chunk)
+    if len(chunk) < part_size:
+        await upload_file_to_s3(chunk, key, content_type, bucket=bucket)
+        return len(chunk)
+
+    upload_id = await create_multipart_upload(key, content_type, bucket=bucket)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def _send_part(number: int, body: bytes) -> dict:
+        try:
+            etag = await upload_part(key, upload_id, number, body, bucket=bucket)
+            return {"PartNumber": number, "ETag": etag}
+        finally:
+            slots.release()
+
+    pending: list[asyncio.Task] = []
+    total = 0
+    try:
+        number = 1
+        while chunk:
+            await slots.acquire()
+            failed = next((t for t in pending if t.done() and t.exception()), None)
+            if failed is not None:
+                slots.release()
+                raise failed.exception()
+            pending.append(asyncio.create_task(_send_part(number, chunk)))
+            total += len(chunk)
+            number += 1
+            chunk = await stream.read(part_size)
+            if on_chunk is not None and chunk:
+                await asyncio.to_thread(on_chunk, chunk)
+
+        parts = await asyncio.gather(*pending)
+        await complete_multipart_upload(key, upload_id, list(parts), bucket=bucket)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        try:
+            await abort_multipart_upload(key, upload_id, bucket=bucket)
+        except Exception:
+            pass  # Best-effort; a lifecycle rule reaps orphaned uploads
+        raise
+    return total
+
+
+async def upload_path_to_s3(
+    path: str,
+    key: str,
+    content_type: str = "application/octet-stream",
+    *,
+    bucket: str | None = None,
+) -> str:
+    """Upload a local file (e.g. a worker's Parquet output) with parallel multipart parts."""
+    await run_in_storage_pool(
+        get_s3_client().upload_file,
+        path,
+        bucket or settings.S3_BUCKET_NAME,
+        key,
+        ExtraArgs={"ContentType": content_type},
+        Config=TransferConfig(
+            multipart_threshold=settings.UPLOAD_PART_SIZE_BYTES,
+            multipart_chunksize=settings.UPLOAD_PART_SIZE_BYTES,
+            max_concurrency=settings.UPLOAD_MAX_CONCURRENCY,
+        ),
+    )
+    return key
+
+
+# ─── Multipart primitives ───────────────────────────────────────
+
+async def create_multipart_upload(
+    key: str, content_type: str = "application/octet-stream", *, bucket: str | None = None
+) -> str:
+    resp = await _call(
+        "create_multipart_upload",
+        Bucket=bucket or settings.S3_BUCKET_NAME,
+        Key=key,
+        ContentType=content_type,
+    )
+    return resp["UploadId"]
+
+
+async def upload_part(
+    key: str, upload_id: str, part_number: int, body: bytes, *, bucket: str | None = None
+) -> str:
+    """Upload one part and return its ETag."""
+    resp = await _call(
+        "upload_part",
+        Bucket=bucket or settings.S3_BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=body,
+    )
+    return resp["ETag"]
+
+
+async def complete_multipart_upload(
+    key: str, upload_id: str, parts: list[dict], *, bucket: str | None = None
+) -> str:
+    """``parts`` is a list of ``{"PartNumber": n, "ETag": etag}`` in any order. Returns the ETag."""
+    resp = await _call(
+        "complete_multipart_upload",
+        Bucket=bucket or settings.S3_BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+    )
+    return resp["ETag"]
+
+
+async def abort_multipart_upload(key: str, upload_id: str, *, bucket: str | None = None) -> None:
+    await _call(
+        "abort_multipart_upload",
+        Bucket=bucket or settings.S3_BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+    )
+
+
+# ─── Presigned (direct-to-storage) uploads ─────────────────────
+
+async def generate_presigned_post(
+    key: str,
+    content_type: str,
+    size: int,
+    expires_in: int = 3600,
+    *,
+    bucket: str | None = None,
+) -> dict:
+    """Presigned POST form that only accepts exactly ``size`` bytes at ``key``."""
+    return await run_in_storage_pool(
+        get_s3_client().generate_presigned_post,
+        Bucket=bucket or settings.S3_BUCKET_NAME,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[{"Content-Type": content_type}, ["content-length-range", size, size]],
         ExpiresIn=expires_in,
     )
 
 
-def delete_file_from_s3(key: str):
+async def generate_presigned_part_urls(
+    key: str,
+    upload_id: str,
+    part_count: int,
+    expires_in: int = 3600,
+    *,
+    bucket: str | None = None,
+) -> list[str]:
+    """Presigned PUT URLs for parts ``1..part_count`` of a multipart upload."""
     client = get_s3_client()
-    client.delete_object(Bucket=settings.S3_BUCKET_NAME, Key=key)
+    bucket = bucket or settings.S3_BUCKET_NAME
+
+    def _sign_all() -> list[str]:
+        return [
+            client.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": n},
+                ExpiresIn=expires_in,
+            )
+            for n in range(1, part_count + 1)
+        ]
+
+    return await run_in_storage_pool(_sign_all)
+
+
+# ─── Object access ──────────────────────────────────────────────
+
+async def head_object(key: str, *, bucket: str | None = None) -> dict | None:
+    """Object metadata, or None if the key does not exist."""
+    try:
+        return await _call("head_object", Bucket=bucket or settings.S3_BUCKET_NAME, Key=key)
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def get_object_range(key: str, start: int, length: int, *, bucket: str | None = None) -> bytes:
+    """Blocking ranged GET, for readers that already run off the event loop."""
+    resp = get_s3_client().get_object(
+        Bucket=bucket or settings.S3_BUCKET_NAME,
+        Key=key,
+        Range=f"bytes={start}-{start + length - 1}",
+    )
+    return resp["Body"].read()
+
+
+async def read_object_range(
+    key: str, start: int, length: int, *, bucket: str | None = None
+) -> bytes:
+    """Fetch ``length`` bytes from ``start`` with a ranged GET."""
+    return await run_in_storage_pool(get_object_range, key, start, length, bucket=bucket)
+
+
+async def read_object(key: str, *, bucket: str | None = None) -> bytes | None:
+    """Whole body of a small object (e.g. a sidecar index), or None if the key does not exist."""
+    try:
+        resp = await _call("get_object", Bucket=bucket or settings.S3_BUCKET_NAME, Key=key)
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return await run_in_storage_pool(resp["Body"].read)
+
+
+async def download_to_path(key: str, path: str, *, bucket: str | None = None) -> str:
+    """Download an object to a local file with parallel ranged GETs (for random-access formats)."""
+    await run_in_storage_pool(
+        get_s3_client().download_file,
+        bucket or settings.S3_BUCKET_NAME,
+        key,
+        path,
+        Config=TransferConfig(
+            multipart_threshold=settings.UPLOAD_PART_SIZE_BYTES,
+            multipart_chunksize=settings.UPLOAD_PART_SIZE_BYTES,
+            max_concurrency=settings.UPLOAD_MAX_CONCURRENCY,
+        ),
+    )
+    return path
+
+
+def open_object_stream(key: str, *, bucket: str | None = None):
+    """
+    Open a streaming GET and return its body. Blocking — for parsers that
+    already run off the event loop and pull bytes with ``read(n)``.
+    """
+    resp = get_s3_client().get_object(Bucket=bucket or settings.S3_BUCKET_NAME, Key=key)
+    return resp["Body"]
+
+
+async def generate_presigned_url(
+    key: str, expires_in: int = 3600, *, bucket: str | None = None
+) -> str:
+    # Signing is local, but the first call creates the client and resolves credentials,
+    # which may query the instance metadata service; do all of it in the pool
+    return await run_in_storage_pool(
+        lambda: get_s3_client().generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket or settings.S3_BUCKET_NAME, "Key": key},
+            ExpiresIn=expires_in,
+        )
+    )
+
+
+async def delete_file_from_s3(key: str, *, bucket: str | None = None) -> None:
+    await _call("delete_object", Bucket=bucket or settings.S3_BUCKET_NAME, Key=key)
@@ -0,0 +1,90 @@
+"""
+Streaming row responses — Arrow IPC and NDJSON bodies for dataset reads.
+
+Dataset reads end in an Arrow table. The default JSON body turns every cell
+into a Python object before serializing it; a client that sends
+``Accept: application/vnd.apache.arrow.stream`` instead gets the record
+batches written as they are, and ``Accept: application/x-ndjson`` gets one
+JSON line per row with the same values as the JSON body. Either way the body
+streams as it is encoded, a batch at a time.
+"""
+import decimal
+import io
+import json
+from collections.abc import Iterator
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+ARROW_STREAM_MIME = "application/vnd.apache.arrow.stream"
+NDJSON_MIME = "application/x-ndjson"
+STREAM_FORMATS = (ARROW_STREAM_MIME, NDJSON_MIME)
+
+# Rows per record batch / NDJSON chunk written to the response
+STREAM_BATCH_ROWS = 16_384
+
+# Decimals go out as strings: as JSON numbers most clients would read them as floats
+ROW_ENCODERS = {decimal.Decimal: str}
+
+# Compact separators and raw UTF-8, as in FastAPI's JSON responses
+_encode_line = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode
+
+
+def negotiate(accept: str | None) -> str | None:
+    """
+    The streaming media type preferred by an ``Accept`` header, or None for JSON.
+
+    Media ranges are ranked by their ``q`` parameter, ties going to the one
+    listed first; JSON wins anything that is not explicitly a stream format.
+    """
+    best, best_q = None, 0.0
+    for media_range in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = media_type.lower(), q
+    return best if best in STREAM_FORMATS else None
+
+
+def _arrow_chunks(table: pa.Table) -> Iterator[bytes]:
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=STREAM_BATCH_ROWS):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # Schema message for an empty table, then the end-of-stream marker
+    yield sink.getvalue()
+
+
+def _finite(batch: pa.RecordBatch) -> pa.RecordBatch:
+    """NaN and infinities as nulls, which is how the JSON body serializes them."""
+    columns = [
+        pc.if_else(pc.is_finite(column), column, None) if pa.types.is_floating(column.type) else column
+        for column in batch.columns
+    ]
+    return pa.RecordBatch.from_arrays(columns, schema=batch.schema)
+
+
+def _ndjson_chunks(table: pa.Table) -> Iterator[bytes]:
+    for batch in table.to_batches(max_chunksize=STREAM_BATCH_ROWS):
+        if batch.num_rows:
+            rows = jsonable_encoder(_finite(batch).to_pylist(), custom_encoder=ROW_ENCODERS)
+            yield "".join(_encode_line(row) + "\n" for row in rows).encode()
+
+
+def table_response(table: pa.Table, media_type: str, headers: dict[str, str] | None = None) -> StreamingResponse:
+    """Stream ``table`` as ``media_type`` (one of ``STREAM_FORMATS``)."""
+    # Sync iterators run in the threadpool, so encoding stays off the event loop
+    chunks = _arrow_chunks(table) if media_type == ARROW_STREAM_MIME else _ndjson_chunks(table)
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
@@ -0,0 +1,18 @@
+"""
+Extraction engines — turn uploaded files into Parquet datasets.
+
+Engines are synchronous and run in the Celery worker, off the event loop.
+They read the original object as a stream and write Parquet to a local file,
+so memory stays bounded by one parse block plus one row group whatever the
+size of the input.
+"""
+
+# Bump a format's version whenever its engine's output changes (types, columns,
+# layout); cached extractions made by older versions are then ignored.
+ENGINE_VERSIONS = {
+    "csv": 3,
+    "tsv": 3,
+    "excel": 3,
+    "pdf": 1,
+    "json": 4,
+}
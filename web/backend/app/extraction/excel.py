@@ -0,0 +1,282 @@
+"""
+Excel engine — one dataset per worksheet, streamed row by row.
+
+``.xlsx`` sheets are read with openpyxl in read-only mode, which parses the
+sheet XML incrementally, so a 1M-row sheet never sits in memory. Merged
+ranges are not exposed in read-only mode; they are found by scanning the
+decompressed sheet XML for ``<mergeCell>`` tags, and every cell of a range
+takes the value of its top-left cell. Legacy ``.xls`` files (at most 65,536
+rows per sheet) go through xlrd.
+
+Rows are turned into text and fed to ``SchemaInferringWriter``, so typing
+works exactly as for CSV.
+"""
+import datetime
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree
+from typing import Iterator
+
+import pyarrow as pa
+
+from app.extraction.schema import SchemaInferringWriter, unique_names
+
+# The header is searched for among the first rows (titles and notes often sit above it)
+HEADER_SCAN_ROWS = 20
+
+_MERGE_CELL = re.compile(rb'<mergeCell\s+ref="([A-Z]+)(\d+):([A-Z]+)(\d+)"')
+_SCAN_CHUNK = 1024 * 1024
+
+
+def _is_xlsx(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(4) == b"PK\x03\x04"
+
+
+def list_sheets(path: str) -> list[str]:
+    """Worksheet names in workbook order (chart sheets excluded)."""
+    if _is_xlsx(path):
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return [ws.title for ws in workbook.worksheets]
+        finally:
+            workbook.close()
+
+    import xlrd
+
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        return book.sheet_names()
+    finally:
+        book.release_resources()
+
+
+def _column_index(letters: bytes) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + (letter - 64)
+    return index
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> dict[str, tuple[str, str]]:
+    """``{id: (type, member)}`` of the relationships of ``part`` ("" for the package)."""
+    folder, name = posixpath.split(part)
+    root = ElementTree.fromstring(archive.read(posixpath.join(folder, "_rels", f"{name}.rels")))
+    relationships = {}
+    for rel in root:
+        target = rel.get("Target", "")
+        # Targets are relative to the part's folder unless absolute
+        member = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+        relationships[rel.get("Id")] = (rel.get("Type", ""), member)
+    return relationships
+
+
+def _sheet_member(archive: zipfile.ZipFile, sheet: str) -> str:
+    """Archive member holding ``sheet``'s XML, found through the workbook's relationships."""
+    workbook = next(
+        member for kind, member in _relationships(archive, "").values() if kind.endswith("/officeDocument")
+    )
+    targets = _relationships(archive, workbook)
+    # Matched on local names so transitional and strict OOXML namespaces both work
+    for element in ElementTree.fromstring(archive.read(workbook)).iter():
+        if element.tag.rpartition("}")[2] == "sheet" and element.get("name") == sheet:
+            rel_id = next(value for key, value in element.attrib.items() if key.rpartition("}")[2] == "id")
+            return targets[rel_id][1]
+    raise KeyError(f"Worksheet {sheet!r} not found")
+
+
+def _scan_merges(path: str, sheet: str) -> list[tuple[int, int, int, int]]:
+    """``(min_row, min_col, max_row, max_col)``, 1-based, from a streamed scan of the sheet XML."""
+    merges = []
+    tail = b""
+    with zipfile.ZipFile(path) as archive, archive.open(_sheet_member(archive, sheet)) as xml:
+        while chunk := xml.read(_SCAN_CHUNK):
+            data = tail + chunk
+            for m in _MERGE_CELL.finditer(data):
+                merges.append((int(m[2]), _column_index(m[1]), int(m[4]), _column_index(m[3])))
+            # Keep an unterminated tag for the next chunk; complete ones were consumed
+            cut = data.rfind(b"<")
+            tail = data[cut:] if cut != -1 and b">" not in data[cut:] else b""
+    return merges
+
+
+def _xlsx_rows(path: str, sheet: str) -> tuple[Iterator[tuple], list, int | None]:
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    ws = workbook[sheet]
+    merges = _scan_merges(path, sheet)
+    width = ws.max_column
+    # The stored dimension is often stale; read every cell that is actually there
+    ws.reset_dimensions()
+
+    def rows():
+        try:
+            yield from ws.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    return rows(), merges, width
+
+
+def _xls_rows(path: str, sheet: str) -> tuple[Iterator[tuple], list, int | None]:
+    import xlrd
+
+    book = xlrd.open_workbook(path, on_demand=True, formatting_info=True)
+    ws = book.sheet_by_name(sheet)
+    merges = [(r0 + 1, c0 + 1, r1, c1) for r0, r1, c0, c1 in ws.merged_cells]
+
+    def value(cell):
+        if cell.ctype == xlrd.XL_CELL_DATE:
+            return xlrd.xldate.xldate_as_datetime(cell.value, book.datemode)
+        if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+            return bool(cell.value)
+        if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+            return None
+        if cell.ctype == xlrd.XL_CELL_NUMBER and cell.value.is_integer():
+            return int(cell.value)
+        return cell.value
+
+    def rows():
+        try:
+            for r in range(ws.nrows):
+                yield tuple(value(cell) for cell in ws.row(r))
+        finally:
+            book.release_resources()
+
+    return rows(), merges, ws.ncols
+
+
+def _fill_merges(rows: Iterator[tuple], merges: list[tuple[int, int, int, int]]) -> Iterator[list]:
+    """Copy each merged range's top-left value into the rest of the range."""
+    by_start: dict[int, list] = {}
+    for merge in merges:
+        by_start.setdefault(merge[0], []).append(merge)
+    active: list[tuple[tuple[int, int, int, int], object]] = []
+
+    for number, row in enumerate(rows, start=1):
+        row = list(row)
+        for merge in by_start.pop(number, ()):
+            anchor = row[merge[1] - 1] if merge[1] <= len(row) else None
+            active.append((merge, anchor))
+        if active:
+            active = [(m, v) for m, v in active if m[2] >= number]
+            for (min_row, min_col, max_row, max_col), anchor in active:
+                if len(row) < max_col:
+                    row.extend([None] * (max_col - len(row)))
+                for col in range(min_col - 1, max_col):
+                    row[col] = anchor
+        yield row
+
+
+def _text(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    text = str(value).strip()
+    return text or None
+
+
+def _is_empty(row: list) -> bool:
+    return all(v is None or (isinstance(v, str) and not v.strip()) for v in row)
+
+
+def _find_header(head: list[list]) -> int | None:
+    """
+    Index of the header row: the first row that spans at least half the
+    widest row nearby and holds only text. Narrower rows above it (titles,
+    notes) are skipped. None when the sheet has no header.
+    """
+    widest = max((sum(v is not None for v in row) for row in head), default=0)
+    for i, row in enumerate(head):
+        filled = [v for v in row if v is not None]
+        if filled and len(filled) * 2 >= widest and all(isinstance(v, str) for v in filled):
+            return i
+    return None
+
+
+def extract_sheet(
+    path: str,
+    sheet: str,
+    dest_path: str,
+    *,
+    batch_rows: int,
+    row_group_rows: int,
+    sample_rows: int,
+    reservoir_size: int,
+) -> dict:
+    """
+    Convert one worksheet into a Parquet file at ``dest_path``. Runs in a pool process.
+
+    Fully empty rows are dropped. Returns ``{"sheet", "row_count",
+    "column_count", "column_schema", "header_row"}``; ``column_count`` is 0
+    for an empty sheet.
+    """
+    rows, merges, declared_width = (_xlsx_rows if _is_xlsx(path) else _xls_rows)(path, sheet)
+    rows = (row for row in _fill_merges(rows, merges) if not _is_empty(row))
+
+    head = []
+    for row in rows:
+        head.append(row)
+        if len(head) == HEADER_SCAN_ROWS:
+            break
+    if not head:
+        return {"sheet": sheet, "row_count": 0, "column_count": 0, "column_schema": {}, "header_row": None}
+
+    width = max(declared_width or 0, *(len(row) for row in head))
+    header = _find_header(head)
+    if header is None:
+        names = [f"column_{i + 1}" for i in range(width)]
+        data_head = head
+    else:
+        cells = head[header] + [None] * (width - len(head[header]))
+        names = unique_names([_text(v) or "" for v in cells])
+        data_head = head[header + 1:]
+
+    schema = pa.schema([pa.field(name, pa.string()) for name in names])
+    writer = SchemaInferringWriter(
+        dest_path,
+        names,
+        row_group_rows=row_group_rows,
+        sample_rows=sample_rows,
+        reservoir_size=reservoir_size,
+    )
+
+    def flush(batch: list[list]) -> None:
+        columns = [[] for _ in names]
+        for row in batch:
+            for i, column in enumerate(columns):
+                column.append(_text(row[i]) if i < len(row) else None)
+        writer.write_batch(pa.RecordBatch.from_arrays([pa.array(c, pa.string()) for c in columns], schema=schema))
+
+    try:
+        batch = list(data_head)
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        result = writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+    return {
+        **result,
+        "sheet": sheet,
+        "column_count": len(names),
+        # 1-based among non-empty rows, as a user would count them
+        "header_row": None if header is None else header + 1,
+    }
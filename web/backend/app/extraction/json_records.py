@@ -0,0 +1,225 @@
+"""
+JSON / NDJSON engine — streamed records flattened into columns.
+
+Records are pulled one at a time: NDJSON line by line, a top-level array
+with ijson, and a top-level object from the first array-valued key (the
+usual ``{"data": [...]}`` API envelope) or as a single record. Nested
+objects flatten into dotted column names (``user.address.city``); a dot or
+backslash inside a key is escaped with a backslash, so the literal key
+``"a.b"`` becomes ``a\\.b`` and never collides with ``{"a": {"b": …}}``.
+Arrays are either kept as JSON text or, in ``explode`` mode, one array path
+is expanded into one row per element with the parent fields repeated.
+
+Flattened rows go to ``SchemaInferringWriter`` in batches; keys that first
+appear mid-stream are added as columns on the fly, once per batch, up to
+``max_columns`` in all.
+"""
+import codecs
+import io
+import json
+from decimal import Decimal
+from typing import BinaryIO, Callable, Iterator
+
+import ijson
+import pyarrow as pa
+
+from app.extraction.schema import SchemaInferringWriter
+
+ARRAY_MODES = ("keep", "explode")
+
+
+def _json_text(value) -> str:
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+def _key_text(key) -> str:
+    return str(key).replace("\\", "\\\\").replace(".", "\\.")
+
+
+def _scalar_text(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    return str(value) or None
+
+
+class Flattener:
+    """
+    Turn one record into flat rows.
+
+    ``explode_path`` names the array to expand in ``explode`` mode, as a
+    flattened column name; when it is not given, the first array path met in
+    the stream is used for every record. Objects deeper than ``max_depth`` are kept as JSON text.
+    """
+
+    def __init__(self, *, array_mode: str = "keep", explode_path: str | None = None, max_depth: int = 8):
+        if array_mode not in ARRAY_MODES:
+            raise ValueError(f"array_mode must be one of {ARRAY_MODES}")
+        self.array_mode = array_mode
+        self.explode_path = explode_path
+        self.max_depth = max_depth
+
+    def _walk(self, obj: dict, path: str, depth: int, row: dict, arrays: dict) -> None:
+        for key, value in obj.items():
+            name = f"{path}.{_key_text(key)}" if path else _key_text(key)
+            if isinstance(value, dict) and value and depth < self.max_depth:
+                self._walk(value, name, depth + 1, row, arrays)
+            elif isinstance(value, list) and self.array_mode == "explode":
+                arrays[name] = value
+                row[name] = _json_text(value)
+            elif isinstance(value, (dict, list)):
+                row[name] = _json_text(value)
+            else:
+                row[name] = _scalar_text(value)
+
+    def rows(self, record) -> list[dict]:
+        if not isinstance(record, dict):
+            return [{"value": _json_text(record) if isinstance(record, (dict, list)) else _scalar_text(record)}]
+
+        row: dict = {}
+        arrays: dict = {}
+        self._walk(record, "", 0, row, arrays)
+        if self.array_mode != "explode" or not arrays:
+            return [row]
+
+        if self.explode_path is None:
+            self.explode_path = next(iter(arrays))
+        elements = arrays.get(self.explode_path)
+        if not elements:
+            return [row]
+
+        del row[self.explode_path]
+        exploded = []
+        for element in elements:
+            out = dict(row)
+            if isinstance(element, dict):
+                self._walk(element, self.explode_path, 1, out, {})
+            else:
+                out[self.explode_path] = (
+                    _json_text(element) if isinstance(element, list) else _scalar_text(element)
+                )
+            exploded.append(out)
+        return exploded
+
+
+def _text_stream(source: BinaryIO, encoding: str):
+    """ijson reads UTF-8 bytes natively; anything else (or a BOM) is decoded first."""
+    if codecs.lookup(encoding).name == "utf-8" and encoding != "utf-8-sig":
+        return source
+    return io.TextIOWrapper(source, encoding=encoding)
+
+
+def _envelope_path(open_source: Callable[[], BinaryIO], encoding: str) -> str:
+    """ijson prefix of the records in a top-level object: its first array-valued key, else the object."""
+    source = open_source()
+    try:
+        for prefix, event, value in ijson.parse(_text_stream(source, encoding)):
+            if event == "start_array" and prefix and "." not in prefix:
+                return f"{prefix}.item"
+            if event == "end_map" and prefix == "":
+                break
+    finally:
+        source.close()
+    return ""
+
+
+def _records(source: BinaryIO, layout: str, encoding: str, prefix: str, on_bad_line) -> Iterator:
+    if layout == "ndjson":
+        for line in io.TextIOWrapper(source, encoding=encoding):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line, parse_float=Decimal)
+            except ValueError:
+                on_bad_line()
+        return
+    yield from ijson.items(_text_stream(source, encoding), prefix)
+
+
+def extract_json(
+    open_source: Callable[[], BinaryIO],
+    dest_path: str,
+    *,
+    hints: dict,
+    flattener: Flattener,
+    batch_rows: int,
+    max_columns: int,
+    row_group_rows: int,
+    sample_rows: int,
+    reservoir_size: int,
+) -> dict:
+    """
+    Convert a JSON document or NDJSON stream into a Parquet file at ``dest_path``.
+
+    ``hints["json_layout"]`` is ``array``, ``object`` or ``ndjson``. Raises
+    ValueError once the records hold more than ``max_columns`` distinct
+    flattened fields. Returns
+    ``{"row_count", "column_count", "column_schema", "record_count",
+    "skipped_rows", "explode_path"}``; ``skipped_rows`` counts NDJSON lines
+    that are not valid JSON.
+    """
+    layout = hints.get("json_layout", "array")
+    encoding = hints.get("encoding", "utf-8")
+    prefix = _envelope_path(open_source, encoding) if layout == "object" else "item"
+
+    skipped = 0
+    records = 0
+
+    def on_bad_line() -> None:
+        nonlocal skipped
+        skipped += 1
+
+    writer = SchemaInferringWriter(
+        dest_path, [], row_group_rows=row_group_rows, sample_rows=sample_rows, reservoir_size=reservoir_size
+    )
+    seen: set[str] = set()
+
+    def flush(rows: list[dict]) -> None:
+        present = list(dict.fromkeys(key for row in rows for key in row))
+        new = [key for key in present if key not in seen]
+        if new:
+            if len(seen) + len(new) > max_columns:
+                raise ValueError(f"Records have more than {max_columns} distinct fields")
+            seen.update(new)
+            writer.add_columns(new)
+        # Sparse records leave most columns empty in a batch; only build the ones it has
+        present = set(present)
+        writer.write_batch(pa.RecordBatch.from_arrays(
+            [
+                pa.array([row.get(name) for row in rows], pa.string())
+                if name in present
+                else pa.nulls(len(rows), pa.string())
+                for name in writer.names
+            ],
+            names=writer.names,
+        ))
+
+    source = open_source()
+    try:
+        batch: list[dict] = []
+        for record in _records(source, layout, encoding, prefix, on_bad_line):
+            records += 1
+            batch.extend(flattener.rows(record))
+            if len(batch) >= batch_rows:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        result = writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        source.close()
+
+    return {
+        **result,
+        "column_count": len(writer.names),
+        "record_count": records,
+        "skipped_rows": skipped,
+        "explode_path": flattener.explode_path if flattener.array_mode == "explode" else None,
+    }
@@ -0,0 +1,366 @@
+"""
+Parquet datasets — a row-group-aligned writer, the storage layout, ranged reads.
+
+Every dataset file is written the same way, so read paths can rely on it:
+
+- zstd compression;
+- row groups of exactly ``row_group_rows`` rows (all but the last);
+- dictionary encoding only for columns known to be low-cardinality;
+- min/max/null-count statistics per column chunk, plus the page index
+  (per-page min/max) so readers can skip pages as well as row groups.
+
+Next to each file sits a small JSON row index (``index_key``) with the byte
+range, first row and column statistics of every row group and the footer
+location. A reader can go straight to row N, or rule out row groups, with
+one small GET and then ranged reads of only the chunks it needs:
+``chunk_ranges`` lists them and ``SparseFile`` serves the fetched bytes to
+``pq.ParquetFile`` as if it were the whole file.
+
+Large datasets also get a small stratified sample (``sample_key``) in the
+same layout, for quick approximate reads.
+"""
+import bisect
+import datetime
+import decimal
+import io
+import math
+import os
+import random
+from typing import Callable
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PARQUET_MIME = "application/vnd.apache.parquet"
+ROW_INDEX_MIME = "application/json"
+ROW_INDEX_VERSION = 1
+
+COMPRESSION = "zstd"
+COMPRESSION_LEVEL = 3
+# A column is dictionary-encoded when its sample has at most this share of distinct values
+DICTIONARY_MAX_RATIO = 0.5
+
+
+def index_key(parquet_key: str) -> str:
+    """Storage key of the row index that belongs to ``parquet_key``."""
+    return f"{parquet_key.removesuffix('.parquet')}.index.json"
+
+
+def writer_options(schema: pa.Schema, dictionary_columns: list[str] | None) -> dict:
+    """``ParquetWriter`` keyword arguments of the dataset layout."""
+    # Categoricals arrive dictionary-typed and stay dictionary-encoded whatever the list says
+    dictionary = [
+        field.name for field in schema
+        if pa.types.is_dictionary(field.type) or field.name in (dictionary_columns or ())
+    ]
+    return {
+        "compression": COMPRESSION,
+        "compression_level": COMPRESSION_LEVEL,
+        "use_dictionary": dictionary,
+        "write_statistics": True,
+        "write_page_index": True,
+    }
+
+
+class RowGroupWriter:
+    """
+    Buffer incoming record batches and write them as fixed-size row groups.
+
+    Parsers hand over batches of whatever size their blocks produce; the
+    writer re-slices them (zero-copy) so every row group but the last holds
+    exactly ``row_group_rows`` rows. At most one row group is buffered.
+    ``dictionary_columns`` names the low-cardinality columns to
+    dictionary-encode.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        schema: pa.Schema,
+        row_group_rows: int,
+        *,
+        dictionary_columns: list[str] | None = None,
+    ):
+        self.path = path
+        self.schema = schema
+        self.row_group_rows = row_group_rows
+        self.dictionary_columns = dictionary_columns
+        self.rows_written = 0
+        self._writer = pq.ParquetWriter(path, schema, **writer_options(schema, dictionary_columns))
+        self._open = True
+        self._pending: list[pa.RecordBatch] = []
+        self._pending_rows = 0
+
+    def write_batch(self, batch: pa.RecordBatch) -> None:
+        if batch.num_rows == 0:
+            return
+        self._pending.append(batch)
+        self._pending_rows += batch.num_rows
+        while self._pending_rows >= self.row_group_rows:
+            table = pa.Table.from_batches(self._pending, schema=self.schema)
+            self._write(table.slice(0, self.row_group_rows))
+            rest = table.slice(self.row_group_rows)
+            self._pending = rest.to_batches()
+            self._pending_rows = rest.num_rows
+
+    def _write(self, table: pa.Table) -> None:
+        self._writer.write_table(table, row_group_size=table.num_rows)
+        self.rows_written += table.num_rows
+
+    def close(self) -> None:
+        if self._pending_rows:
+            self._write(pa.Table.from_batches(self._pending, schema=self.schema))
+            self._pending = []
+            self._pending_rows = 0
+        self._writer.close()
+        self._open = False
+
+    def abort(self) -> None:
+        """Close without flushing."""
+        if self._open:
+            self._writer.close()
+            self._open = False
+
+    def __enter__(self) -> "RowGroupWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# ─── Row index ───────────────────────────────────────────────
+
+def _stat_value(value):
+    if isinstance(value, (datetime.date, datetime.time, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _chunk_stats(column) -> dict:
+    stats = column.statistics
+    if stats is None:
+        return {"min": None, "max": None, "null_count": None}
+    return {
+        "min": _stat_value(stats.min) if stats.has_min_max else None,
+        "max": _stat_value(stats.max) if stats.has_min_max else None,
+        "null_count": stats.null_count if stats.has_null_count else None,
+    }
+
+
+def build_row_index(path: str) -> dict:
+    """
+    Row index of a finished Parquet file, read from its footer.
+
+    Row groups carry ``first_row``, ``num_rows``, the byte range
+    (``offset``, ``length``) covering all of their column chunks and
+    per-column ``min`` / ``max`` / ``null_count`` keyed by column path.
+    """
+    return row_index_from_metadata(pq.ParquetFile(path).metadata, os.path.getsize(path))
+
+
+def row_index_from_metadata(metadata: pq.FileMetaData, file_size: int) -> dict:
+    """``build_row_index`` for a footer that has already been read (e.g. from storage)."""
+    row_groups = []
+    first_row = 0
+    for i in range(metadata.num_row_groups):
+        group = metadata.row_group(i)
+        chunks = [group.column(j) for j in range(group.num_columns)]
+        starts = [
+            c.dictionary_page_offset if c.has_dictionary_page else c.data_page_offset
+            for c in chunks
+        ]
+        offset = min(starts) if starts else 0
+        end = max((start + c.total_compressed_size for start, c in zip(starts, chunks)), default=0)
+        row_groups.append({
+            "first_row": first_row,
+            "num_rows": group.num_rows,
+            "offset": offset,
+            "length": end - offset,
+            "columns": {c.path_in_schema: _chunk_stats(c) for c in chunks},
+        })
+        first_row += group.num_rows
+    return {
+        "version": ROW_INDEX_VERSION,
+        "row_count": metadata.num_rows,
+        "file_size": file_size,
+        # The footer is followed by its 4-byte length and the 4-byte magic
+        "footer_offset": file_size - 8 - metadata.serialized_size,
+        "footer_length": metadata.serialized_size,
+        "row_groups": row_groups,
+    }
+
+
+def locate_row(index: dict, row: int) -> tuple[int, int]:
+    """``(row_group, offset_in_group)`` holding ``row``; raises IndexError past the end."""
+    if not 0 <= row < index["row_count"]:
+        raise IndexError(f"row {row} out of range")
+    starts = [group["first_row"] for group in index["row_groups"]]
+    group = bisect.bisect_right(starts, row) - 1
+    return group, row - starts[group]
+
+
+# ─── Samples ───────────────────────────────────────────────────
+
+def sample_key(parquet_key: str) -> str:
+    """Storage key of the sample that belongs to ``parquet_key``."""
+    return f"{parquet_key.removesuffix('.parquet')}.sample.parquet"
+
+
+def _dictionary_columns(metadata: pq.FileMetaData) -> list[str]:
+    if not metadata.num_row_groups:
+        return []
+    group = metadata.row_group(0)
+    return [group.column(j).path_in_schema for j in range(group.num_columns) if group.column(j).has_dictionary_page]
+
+
+def build_sample(
+    path: str, sample_path: str, *, rows: int, row_group_rows: int, seed: int | None = None
+) -> dict | None:
+    """
+    Write a stratified sample of the Parquet file at ``path`` to ``sample_path``.
+
+    Every row group is a stratum and gives up the same share of its rows,
+    drawn uniformly at random (not at a fixed stride, which would alias
+    with periodic data), so the sample covers the file the way the data is
+    laid out. Returns ``{source_rows, rows, fraction}`` for the sample's row
+    index, or None (nothing written) when the file holds no more than
+    ``rows`` rows and can be read whole.
+    """
+    source = pq.ParquetFile(path)
+    metadata = source.metadata
+    if metadata.num_rows <= rows:
+        return None
+    share = rows / metadata.num_rows
+    rng = random.Random(seed)
+    with RowGroupWriter(
+        sample_path, source.schema_arrow, row_group_rows, dictionary_columns=_dictionary_columns(metadata)
+    ) as writer:
+        for g in range(metadata.num_row_groups):
+            num_rows = metadata.row_group(g).num_rows
+            # Randomized rounding keeps the expected size of each stratum exact
+            count = min(num_rows, math.floor(num_rows * share + rng.random()))
+            taken = sorted(rng.sample(range(num_rows), count))
+            if taken:
+                for batch in source.read_row_group(g).take(taken).to_batches():
+                    writer.write_batch(batch)
+    return {
+        "source_rows": metadata.num_rows,
+        "rows": writer.rows_written,
+        "fraction": writer.rows_written / metadata.num_rows,
+    }
+
+
+# ─── Ranged reads ───────────────────────────────────────────────
+
+# Parquet readers fetch this much of the tail in one go, hoping it holds the whole footer
+TAIL_READ_BYTES = 64 * 1024
+# Column chunks closer than this are fetched with one GET
+COALESCE_GAP_BYTES = 64 * 1024
+
+
+def tail_range(index: dict) -> tuple[int, int]:
+    """``(offset, length)`` of the file tail a reader asks for first, footer included."""
+    start = max(0, min(index["footer_offset"], index["file_size"] - TAIL_READ_BYTES))
+    return start, index["file_size"] - start
+
+
+def _leaf_count(data_type: pa.DataType) -> int:
+    if pa.types.is_struct(data_type):
+        return sum(_leaf_count(data_type.field(i).type) for i in range(data_type.num_fields))
+    if pa.types.is_map(data_type):
+        return _leaf_count(data_type.key_type) + _leaf_count(data_type.item_type)
+    if pa.types.is_list(data_type) or pa.types.is_large_list(data_type) or pa.types.is_fixed_size_list(data_type):
+        return _leaf_count(data_type.value_type)
+    return 1
+
+
+def leaf_columns(schema: pa.Schema) -> dict[str, range]:
+    """Parquet leaf column positions of each top-level field, matched by position."""
+    leaves = {}
+    first = 0
+    for field in schema:
+        count = _leaf_count(field.type)
+        leaves[field.name] = range(first, first + count)
+        first += count
+    return leaves
+
+
+def chunk_ranges(
+    metadata: pq.FileMetaData, schema: pa.Schema, row_groups: list[int], columns: list[str]
+) -> list[tuple[int, int]]:
+    """
+    Byte ranges of the column chunks a read of ``columns`` in ``row_groups``
+    touches, sorted and coalesced. Leaves are matched to fields by position,
+    since flattened names may themselves contain dots.
+    """
+    leaves = leaf_columns(schema)
+    ranges = []
+    for g in row_groups:
+        group = metadata.row_group(g)
+        for name in columns:
+            for j in leaves[name]:
+                chunk = group.column(j)
+                start = chunk.dictionary_page_offset if chunk.has_dictionary_page else chunk.data_page_offset
+                ranges.append((start, chunk.total_compressed_size))
+
+    merged: list[list[int]] = []
+    for start, length in sorted(ranges):
+        if merged and start <= merged[-1][0] + merged[-1][1] + COALESCE_GAP_BYTES:
+            merged[-1][1] = max(merged[-1][1], start + length - merged[-1][0])
+        else:
+            merged.append([start, length])
+    return [(start, length) for start, length in merged]
+
+
+class SparseFile(io.RawIOBase):
+    """
+    Read-only file over the parts of a remote object fetched so far.
+
+    ``spans`` maps offsets to bytes already downloaded; reads they cover are
+    served from memory, anything else goes to ``fetch(offset, length)`` (a
+    blocking ranged GET). Handed to ``pq.ParquetFile``, a reader that has
+    prefetched the tail and the chunks it needs makes no further requests.
+    """
+
+    def __init__(self, size: int, spans: dict[int, bytes], fetch: Callable[[int, int], bytes]):
+        self.size = size
+        self.spans = sorted(spans.items())
+        self.fetch = fetch
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        self._position = base + offset
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        start = self._position
+        stop = self.size if size is None or size < 0 else min(self.size, start + size)
+        if stop <= start:
+            return b""
+        self._position = stop
+        i = bisect.bisect_right(self.spans, start, key=lambda span: span[0]) - 1
+        if i >= 0:
+            offset, data = self.spans[i]
+            if stop <= offset + len(data):
+                return data[start - offset:stop - offset]
+        return self.fetch(start, stop - start)
+
+    def readall(self) -> bytes:
+        return self.read(-1)
@@ -0,0 +1,66 @@
+"""
+Process pool for CPU-bound engines (PDF pages, workbook sheets).
+
+One pool per worker process, started on first use, reused across tasks and
+shut down on worker exit. A pool whose process died (OOM kill, a crash in a
+parser) cannot take new work; it is dropped and the next task starts a new one.
+
+Extraction tasks are routed to the ``extraction`` queue, whose worker runs
+with ``--pool=threads``: every task lives in one process and shares a pool of
+``EXTRACTION_MAX_WORKERS`` processes (default: one per usable core), so a
+single large PDF or workbook uses all of them. Celery's prefork children are
+daemonic and may not start processes of their own; run there, engines fall
+back to the task's own process, one call at a time.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers: int | None = None) -> ProcessPoolExecutor | None:
+    """The worker's process pool, or None where this process may not start children."""
+    global _pool
+    if multiprocessing.current_process().daemon:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=max_workers or len(os.sched_getaffinity(0)),
+                    # The parent holds threads (S3 pool, Arrow); forking it is unsafe
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+async def run_in_pool(pool: ProcessPoolExecutor | None, call: Callable):
+    """Run ``call`` on ``pool``, or on a thread when there is no pool."""
+    if pool is None:
+        return await asyncio.to_thread(call)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, call)
+    except BrokenProcessPool:
+        _discard(pool)
+        raise
+
+
+def _discard(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
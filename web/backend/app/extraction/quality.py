@@ -0,0 +1,166 @@
+"""
+Data-quality scoring, accumulated batch by batch during extraction.
+
+``QualityAccumulator`` sees every typed record batch exactly once, right
+before it is written, and keeps only small per-column state:
+
+- null counts;
+- a k-minimum-values sketch of row hashes, for the duplicate-row rate
+  (exact below ``DISTINCT_SKETCH_SIZE`` distinct rows, <1% error above);
+- per numeric column, a uniform reservoir over the whole stream; Tukey
+  fences (Q1 − 1.5·IQR, Q3 + 1.5·IQR) and the share of values outside them
+  are read off it at the end, so sorted or drifting columns (ids,
+  timestamps) are judged against all of their data;
+- whether a column has held a single value so far.
+
+Type conformance (share of values that fit the inferred type) comes from the
+schema writer. ``report`` folds it all into ``quality_score`` (0–100) and the
+structured ``quality_details`` stored on the dataset.
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.extraction.sketches import hash_values, is_numeric
+
+DISTINCT_SKETCH_SIZE = 16384
+OUTLIER_SAMPLE_SIZE = 10_000
+OUTLIER_IQR_FACTOR = 1.5
+
+# Weights of the score components; they sum to 1
+SCORE_WEIGHTS = {
+    "completeness": 0.35,
+    "validity": 0.25,
+    "uniqueness": 0.2,
+    "outliers": 0.1,
+    "informativeness": 0.1,
+}
+
+_HASH_PRIME = np.uint64(0x100000001B3)
+
+
+def outlier_rate(sample: np.ndarray) -> float | None:
+    """Share of ``sample`` outside its Tukey fences, or None when it has too few values."""
+    if len(sample) < 4:
+        return None
+    q1, q3 = np.percentile(sample, [25, 75])
+    spread = OUTLIER_IQR_FACTOR * (q3 - q1)
+    return float(np.mean((sample < q1 - spread) | (sample > q3 + spread)))
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 4)
+
+
+class QualityAccumulator:
+    def __init__(self, column_count: int):
+        self.rows = 0
+        self.null_counts = [0] * column_count
+        self.samples: list[np.ndarray | None] = [None] * column_count
+        self.numeric_seen = [0] * column_count
+        # True while the column has held at most one distinct value; None when not checkable
+        self.constant: list[bool | None] = [True] * column_count
+        self._constant_value: list = [None] * column_count
+        self._kmv = np.empty(0, dtype=np.uint64)
+        self._rng = np.random.default_rng()
+
+    def update(self, batch: pa.RecordBatch) -> None:
+        if batch.num_rows == 0:
+            return
+        self.rows += batch.num_rows
+        row_hash = np.zeros(batch.num_rows, dtype=np.uint64)
+        for i, values in enumerate(batch.columns):
+            self.null_counts[i] += values.null_count
+            row_hash = row_hash * _HASH_PRIME ^ hash_values(values)
+            if is_numeric(values.type):
+                self._sample_numeric(i, values)
+            if self.constant[i]:
+                self._check_constant(i, values)
+        self._add_row_hashes(row_hash)
+
+    def _add_row_hashes(self, row_hash: np.ndarray) -> None:
+        if len(self._kmv) == DISTINCT_SKETCH_SIZE:
+            # Only hashes below the current k-th smallest can enter; usually a handful
+            row_hash = row_hash[row_hash < self._kmv[-1]]
+        merged = np.sort(np.concatenate([self._kmv, row_hash]))
+        distinct = merged[np.concatenate([[True], merged[1:] != merged[:-1]])] if len(merged) else merged
+        self._kmv = distinct[:DISTINCT_SKETCH_SIZE]
+
+    def _sample_numeric(self, i: int, values: pa.Array) -> None:
+        # Algorithm R over the column's non-null values, vectorized per batch
+        data = pc.cast(values.drop_null(), pa.float64()).to_numpy(zero_copy_only=False)
+        sample = self.samples[i] if self.samples[i] is not None else np.empty(0)
+        fill = max(0, min(OUTLIER_SAMPLE_SIZE - len(sample), len(data)))
+        sample = np.concatenate([sample, data[:fill]])
+        rest = np.arange(self.numeric_seen[i] + fill, self.numeric_seen[i] + len(data))
+        if len(rest):
+            # Slot u·(t+1) is uniform over [0, t]; it lands in the reservoir when below its size
+            slots = self._rng.random(len(rest)) * (rest + 1)
+            hit = slots < OUTLIER_SAMPLE_SIZE
+            sample[slots[hit].astype(np.int64)] = data[fill:][hit]
+        self.samples[i] = sample
+        self.numeric_seen[i] += len(data)
+
+    def _check_constant(self, i: int, values: pa.Array) -> None:
+        if values.null_count == len(values):
+            return
+        try:
+            if pa.types.is_dictionary(values.type):
+                # Dictionary entries are distinct, so equal min and max index means one value
+                bounds = pc.min_max(values.indices)
+                low, high = bounds["min"].as_py(), bounds["max"].as_py()
+                value = values.dictionary[low].as_py() if low == high else None
+            else:
+                bounds = pc.min_max(values)
+                low, high = bounds["min"].as_py(), bounds["max"].as_py()
+                value = low if low == high else None
+        except pa.ArrowNotImplementedError:
+            self.constant[i] = None  # lists: not checked
+            return
+        if low != high:
+            self.constant[i] = False
+        elif self._constant_value[i] is None:
+            self._constant_value[i] = value
+        elif value != self._constant_value[i]:
+            self.constant[i] = False
+
+    def distinct_rows(self) -> tuple[int, bool]:
+        """``(count, estimated)``: exact while the sketch is not full."""
+        if len(self._kmv) < DISTINCT_SKETCH_SIZE:
+            return len(self._kmv), False
+        kth = float(self._kmv[DISTINCT_SKETCH_SIZE - 1]) / 2.0**64
+        return min(self.rows, round((DISTINCT_SKETCH_SIZE - 1) / kth)), True
+
+    def report(self, names: list[str], conformance: list[float]) -> tuple[int | None, dict]:
+        """``(quality_score, quality_details)``; the score is None for an empty dataset."""
+        columns = {}
+        for i, name in enumerate(names):
+            columns[name] = {
+                "null_rate": round(self.null_counts[i] / self.rows, 4) if self.rows else 0.0,
+                "type_conformance": round(conformance[i], 4),
+                "outlier_rate": None if self.samples[i] is None else _round(outlier_rate(self.samples[i])),
+                "constant": bool(self.constant[i]) and self.rows > 1,
+            }
+        distinct, estimated = self.distinct_rows()
+        duplicate_rate = round(1 - distinct / self.rows, 4) if self.rows else 0.0
+        details = {
+            "row_count": self.rows,
+            "duplicate_row_rate": duplicate_rate,
+            "duplicate_rate_estimated": estimated,
+            "constant_columns": [name for name, c in columns.items() if c["constant"]],
+            "columns": columns,
+        }
+        if not self.rows or not names:
+            return None, details
+
+        outlier_rates = [c["outlier_rate"] for c in columns.values() if c["outlier_rate"] is not None]
+        components = {
+            "completeness": 1 - sum(c["null_rate"] for c in columns.values()) / len(columns),
+            "validity": sum(c["type_conformance"] for c in columns.values()) / len(columns),
+            "uniqueness": 1 - duplicate_rate,
+            "outliers": 1 - sum(outlier_rates) / len(outlier_rates) if outlier_rates else 1.0,
+            "informativeness": 1 - len(details["constant_columns"]) / len(columns),
+        }
+        details["components"] = {k: round(v, 4) for k, v in components.items()}
+        score = round(100 * sum(SCORE_WEIGHTS[k] * v for k, v in components.items()))
+        return score, details
@@ -0,0 +1,594 @@
+"""
+Schema inference — sample-based column types with in-stream promotion.
+
+Engines feed ``SchemaInferringWriter`` record batches of raw text. Column
+types are inferred from a reservoir sample of the first ``sample_rows`` rows,
+so inference costs the same on a 10 MB file as on a 10 GB one. Every later
+batch is then checked with vectorized pattern tests; a value that does not
+fit promotes its column along the lattice
+
+    null → boolean
+    null → integer → float → decimal
+    null → datetime
+    any two branches → string
+
+Batches are parsed and written as they arrive. The text of every column that
+could still be widened is also spilled to local disk, and a column that was
+widened is converted again from that text at close, so a column promoted to
+string keeps "001" and "yes" as written. Files whose sample held are written
+in a single pass; the source itself is only ever read once.
+"""
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from app.extraction.parquet import DICTIONARY_MAX_RATIO, RowGroupWriter
+from app.extraction.quality import QualityAccumulator
+from app.extraction.sketches import TableProfiler
+
+BOOLEAN_TRUE = ["true", "t", "yes"]
+BOOLEAN_FALSE = ["false", "f", "no"]
+
+# Beyond ~15 significant digits float64 stops round-tripping; beyond 18 int64 may overflow
+FLOAT_DIGITS = 15
+DECIMAL_PRECISION = 38
+
+_INTEGER = r"^[+-]?\d{1,18}$"
+_FLOAT = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d{1,3})?$"
+_DECIMAL = r"^[+-]?(\d+\.?\d*|\.\d+)$"
+_ISO_DATETIME = r"^\d{4}-\d{2}-\d{2}([T ]\d{2}(:\d{2}(:\d{2}(\.\d{1,9})?)?)?)?$"
+
+# Tried in order when values are not ISO 8601; day-first wins ties
+DATETIME_FORMATS = [
+    "%d/%m/%Y", "%m/%d/%Y", "%Y/%m/%d", "%d.%m.%Y",
+    "%d/%m/%Y %H:%M", "%m/%d/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S", "%m/%d/%Y %H:%M:%S",
+]
+
+# A text column is categorical when the sample repeats a small set of values
+CATEGORICAL_MIN_VALUES = 50
+CATEGORICAL_MAX_DISTINCT = 1000
+CATEGORICAL_MAX_RATIO = 0.1
+
+_NUMERIC = ("integer", "float", "decimal")
+
+# The text spill is only read back when a column is widened; favour speed
+SPILL_COMPRESSION = "lz4"
+
+
+class ColumnType:
+    """One point of the lattice. ``scale`` applies to decimals, ``format`` to datetimes."""
+
+    def __init__(self, kind: str, *, scale: int = 0, format: str | None = None, categorical: bool = False):
+        self.kind = kind
+        self.scale = scale
+        self.format = format
+        self.categorical = categorical
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, ColumnType)
+            and (self.kind, self.scale, self.format, self.categorical)
+            == (other.kind, other.scale, other.format, other.categorical)
+        )
+
+    def __repr__(self) -> str:
+        return f"ColumnType({self.name!r})"
+
+    @property
+    def name(self) -> str:
+        if self.kind == "null":
+            return "string"
+        if self.categorical:
+            return "categorical"
+        return self.kind
+
+    def arrow_type(self) -> pa.DataType:
+        if self.kind == "boolean":
+            return pa.bool_()
+        if self.kind == "integer":
+            return pa.int64()
+        if self.kind == "float":
+            return pa.float64()
+        if self.kind == "decimal":
+            return pa.decimal128(DECIMAL_PRECISION, self.scale)
+        if self.kind == "datetime":
+            return pa.timestamp("us")
+        if self.categorical:
+            return pa.dictionary(pa.int32(), pa.string())
+        return pa.string()
+
+
+NULL = ColumnType("null")
+STRING = ColumnType("string")
+
+
+def unique_names(names: list[str]) -> list[str]:
+    """Fill blank header cells and suffix duplicates so every column is addressable."""
+    seen: dict[str, int] = {}
+    unique = []
+    for i, name in enumerate(names):
+        name = name.strip() or f"column_{i + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        seen.setdefault(name, 1)
+        unique.append(name)
+    return unique
+
+
+# ─── Vectorized checks ──────────────────────────────────────────
+
+def _all(mask: pa.Array) -> bool:
+    return pc.all(mask).as_py() is not False
+
+
+def _max_length(values: pa.Array, strip_pattern: str) -> int:
+    return pc.max(pc.utf8_length(pc.replace_substring_regex(values, strip_pattern, ""))).as_py() or 0
+
+
+def _decimal_shape(values: pa.Array) -> tuple[int, int]:
+    """``(integer_digits, scale)`` needed to hold every value exactly."""
+    return _max_length(values, r"^[+-]?0*|\..*$"), _max_length(values, r"^[^.]*\.?")
+
+
+def _significant_digits(values: pa.Array) -> int:
+    return _max_length(values, r"[eE].*$|[^0-9]|^[^1-9]*")
+
+
+def _parse_iso(values: pa.Array) -> pa.Array:
+    masked = pc.if_else(pc.match_substring_regex(values, _ISO_DATETIME), values, None)
+    try:
+        return pc.cast(masked, pa.timestamp("us"))
+    except pa.ArrowInvalid:
+        # Out-of-range fields (month 13, …); coalesce the strict formats instead
+        return pc.coalesce(*(
+            pc.strptime(values, format=fmt, unit="us", error_is_null=True)
+            for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S")
+        ))
+
+
+def infer_type(values: pa.Array) -> ColumnType:
+    """Narrowest lattice type that holds every non-null value of a text array."""
+    values = pc.utf8_trim_whitespace(values.drop_null())
+    if len(values) == 0:
+        return NULL
+
+    if _all(pc.is_in(pc.utf8_lower(values), value_set=pa.array(BOOLEAN_TRUE + BOOLEAN_FALSE))):
+        return ColumnType("boolean")
+    if _all(pc.match_substring_regex(values, _INTEGER)):
+        return ColumnType("integer")
+    if _all(pc.match_substring_regex(values, _DECIMAL)):
+        integer_digits, scale = _decimal_shape(values)
+        if integer_digits + scale <= FLOAT_DIGITS:
+            return ColumnType("float")
+        if integer_digits + scale <= DECIMAL_PRECISION:
+            return ColumnType("decimal", scale=scale)
+        return STRING
+    if _all(pc.match_substring_regex(values, _FLOAT)) and _significant_digits(values) <= FLOAT_DIGITS:
+        return ColumnType("float")
+
+    if _all(pc.is_valid(_parse_iso(values))):
+        return ColumnType("datetime", format="iso")
+    for fmt in DATETIME_FORMATS:
+        if _all(pc.is_valid(pc.strptime(values, format=fmt, unit="us", error_is_null=True))):
+            return ColumnType("datetime", format=fmt)
+    return STRING
+
+
+def parse(values: pa.Array, ctype: ColumnType) -> pa.Array:
+    """Convert a text array to ``ctype``; values that do not fit become null."""
+    if ctype.kind == "string":
+        return pc.dictionary_encode(values) if ctype.categorical else values
+    if ctype.kind == "null":
+        return values if values.null_count == len(values) else pa.nulls(len(values), pa.string())
+
+    trimmed = pc.utf8_trim_whitespace(values)
+    if ctype.kind == "boolean":
+        lowered = pc.utf8_lower(trimmed)
+        return pc.if_else(
+            pc.is_in(lowered, value_set=pa.array(BOOLEAN_TRUE)),
+            True,
+            pc.if_else(pc.is_in(lowered, value_set=pa.array(BOOLEAN_FALSE)), False, None),
+        )
+    if ctype.kind == "datetime":
+        if ctype.format == "iso":
+            return _parse_iso(trimmed)
+        return pc.strptime(trimmed, format=ctype.format, unit="us", error_is_null=True)
+
+    if ctype.kind == "integer":
+        fits = pc.match_substring_regex(trimmed, _INTEGER)
+    elif ctype.kind == "float":
+        fits = pc.match_substring_regex(trimmed, _FLOAT)
+    else:
+        integer_digits = DECIMAL_PRECISION - ctype.scale
+        fraction = rf"(\.\d{{0,{ctype.scale}}})?|\.\d{{1,{ctype.scale}}}" if ctype.scale else r"\.?"
+        fits = pc.match_substring_regex(trimmed, rf"^[+-]?0*(\d{{1,{integer_digits}}}{fraction})$")
+    return pc.cast(pc.if_else(fits, trimmed, None), ctype.arrow_type())
+
+
+def join(a: ColumnType, b: ColumnType) -> ColumnType:
+    """Least upper bound of two lattice points."""
+    if a == b:
+        return a
+    if a.kind == "null":
+        return b
+    if b.kind == "null":
+        return a
+    if a.kind in _NUMERIC and b.kind in _NUMERIC:
+        if "decimal" in (a.kind, b.kind):
+            return ColumnType("decimal", scale=max(a.scale, b.scale))
+        return ColumnType("float")
+    return STRING
+
+
+def _widen(ctype: ColumnType, values: pa.Array) -> ColumnType:
+    """Narrowest type at or above ``ctype`` that holds every value of a text array."""
+    found = infer_type(values)
+    if ctype.kind == "decimal" and found.kind in ("integer", "float"):
+        # Integers and floats carry no scale; a decimal needs the one these values have
+        _, scale = _decimal_shape(pc.utf8_trim_whitespace(values.drop_null()))
+        found = ColumnType("decimal", scale=scale)
+    wider = join(ctype, found)
+    return wider if parse(values, wider).null_count == values.null_count else STRING
+
+
+def _mark_categorical(values: pa.Array, ctype: ColumnType) -> ColumnType:
+    if ctype.kind != "string":
+        return ctype
+    present = len(values) - values.null_count
+    if present < CATEGORICAL_MIN_VALUES:
+        return ctype
+    distinct = pc.count_distinct(values).as_py()
+    if distinct <= CATEGORICAL_MAX_DISTINCT and distinct <= present * CATEGORICAL_MAX_RATIO:
+        return ColumnType("string", categorical=True)
+    return ctype
+
+
+def _low_cardinality(values: pa.Array) -> bool:
+    """Whether the sample repeats values enough for dictionary encoding to pay off."""
+    present = len(values) - values.null_count
+    return present > 0 and pc.count_distinct(values).as_py() <= present * DICTIONARY_MAX_RATIO
+
+
+def _arrow_type_name(arrow_type: pa.DataType) -> str:
+    if pa.types.is_boolean(arrow_type):
+        return "boolean"
+    if pa.types.is_integer(arrow_type):
+        return "integer"
+    if pa.types.is_floating(arrow_type):
+        return "float"
+    if pa.types.is_decimal(arrow_type):
+        return "decimal"
+    if pa.types.is_temporal(arrow_type):
+        return "datetime"
+    if pa.types.is_dictionary(arrow_type):
+        return "categorical"
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        return "list"
+    return "string"
+
+
+def describe_fixed(schema: pa.Schema, null_counts: list[int]) -> dict[str, dict]:
+    """``column_schema`` entries for engines whose output types are known up front."""
+    return {
+        field.name: {
+            "type": _arrow_type_name(field.type),
+            "nullable": nulls > 0,
+            "null_count": nulls,
+            "confidence": 1.0,
+        }
+        for field, nulls in zip(schema, null_counts)
+    }
+
+
+# ─── Streaming writer ───────────────────────────────────────────
+
+class SchemaInferringWriter:
+    """
+    Write all-text record batches to Parquet with inferred column types.
+
+    Batches are held back until ``sample_rows`` rows have arrived (or the
+    input ends) while a reservoir of ``reservoir_size`` row positions is
+    drawn over them with Algorithm R. Types come from that sample, and from
+    then on batches are parsed and written as they arrive. The text of the
+    columns that may still be widened (every type but string) is spilled
+    next to ``dest_path``; ``close`` rewrites the file from it only when
+    some column was widened, replaying just those columns.
+    """
+
+    def __init__(
+        self,
+        dest_path: str,
+        names: list[str],
+        *,
+        row_group_rows: int,
+        sample_rows: int,
+        reservoir_size: int,
+    ):
+        self.dest_path = dest_path
+        self.names = list(names)
+        self.row_group_rows = row_group_rows
+        self.sample_rows = sample_rows
+        self.reservoir_size = reservoir_size
+        self.types: list[ColumnType] | None = None
+        self.sampled: list[ColumnType] = []
+        self._text_schema = pa.schema([pa.field(name, pa.string()) for name in names])
+        self._buffer: list[pa.RecordBatch] = []
+        self._buffered_rows = 0
+        self._reservoir = np.empty(0, dtype=np.int64)
+        self._rng = np.random.default_rng()
+        self._dictionary_columns: list[str] = []
+        # Types the Parquet file is being written with; columns added later are not in it
+        self._written: list[ColumnType] = []
+        self._writer: RowGroupWriter | None = None
+        self._quality: QualityAccumulator | None = None
+        self._profile: TableProfiler | None = None
+        # One spill file per column set, with the positions of the columns it holds
+        self._spill_files: list[tuple[str, list[int]]] = []
+        self._spill: pa.ipc.RecordBatchStreamWriter | None = None
+        # Columns widened after earlier values were accepted under a narrower type
+        self._unverified: set[int] = set()
+        self._present = [0] * len(names)
+        self._matched = [0] * len(names)
+        self._rows = 0
+
+    def _schema(self) -> pa.Schema:
+        return pa.schema([pa.field(name, t.arrow_type()) for name, t in zip(self.names, self.types)])
+
+    def write_batch(self, batch: pa.RecordBatch) -> None:
+        if batch.num_rows == 0:
+            return
+        if self.types is not None:
+            self._check(batch)
+            self._emit(batch)
+            return
+        self._sample(batch)
+        self._buffer.append(batch)
+        self._buffered_rows += batch.num_rows
+        if self._buffered_rows >= self.sample_rows:
+            self._start()
+
+    def add_columns(self, names: list[str]) -> None:
+        """
+        Append columns first seen mid-stream (e.g. a JSON key that only shows
+        up late). Earlier rows read as null.
+        """
+        self.names.extend(names)
+        self._text_schema = pa.schema([pa.field(name, pa.string()) for name in self.names])
+        self._present.extend([0] * len(names))
+        self._matched.extend([0] * len(names))
+        if self.types is None:
+            self._buffer = [
+                pa.RecordBatch.from_arrays(
+                    batch.columns + [pa.nulls(batch.num_rows, pa.string()) for _ in names],
+                    schema=self._text_schema,
+                )
+                for batch in self._buffer
+            ]
+            return
+        self.types.extend([NULL] * len(names))
+        self.sampled.extend([NULL] * len(names))
+        self._close_spill()
+
+    def _sample(self, batch: pa.RecordBatch) -> None:
+        # Algorithm R, vectorized: row t replaces a random slot j ∈ [0, t] when j < k
+        positions = self._buffered_rows + np.arange(batch.num_rows, dtype=np.int64)
+        fill = max(0, min(self.reservoir_size - len(self._reservoir), batch.num_rows))
+        self._reservoir = np.concatenate([self._reservoir, positions[:fill]])
+        rest = positions[fill:]
+        if len(rest):
+            slots = self._rng.integers(0, rest + 1)
+            hit = slots < self.reservoir_size
+            self._reservoir[slots[hit]] = rest[hit]
+
+    def _start(self) -> None:
+        sample = pa.Table.from_batches(self._buffer, schema=self._text_schema).take(np.sort(self._reservoir))
+        self.types = [_mark_categorical(col, infer_type(col)) for col in sample.columns]
+        self.sampled = list(self.types)
+        self._dictionary_columns = [name for name, col in zip(self.names, sample.columns) if _low_cardinality(col)]
+        buffered, self._buffer = self._buffer, []
+        # Types settled by the held-back rows are written as such, with nothing to replay
+        for batch in buffered:
+            self._check(batch)
+        self._written = list(self.types)
+        self._writer = RowGroupWriter(
+            self.dest_path, self._schema(), self.row_group_rows, dictionary_columns=self._dictionary_columns
+        )
+        self._quality = QualityAccumulator(len(self.names))
+        self._profile = TableProfiler(self.names)
+        for batch in buffered:
+            self._emit(batch)
+
+    def _check(self, batch: pa.RecordBatch) -> None:
+        """Widen the type of every column with a value in ``batch`` that does not fit it."""
+        for i, values in enumerate(batch.columns):
+            ctype = self.types[i]
+            if ctype.kind == "string" or values.null_count == len(values):
+                continue
+            # Floats are matched by pattern only; past FLOAT_DIGITS they would be rounded
+            fits = parse(values, ctype).null_count == values.null_count
+            if fits and not (ctype.kind == "float" and _significant_digits(values) > FLOAT_DIGITS):
+                continue
+            wider = _widen(ctype, values)
+            if ctype.kind == "null":
+                # A column the sample saw only nulls in has not really been promoted
+                self.sampled[i] = wider
+            elif wider.kind != "string":
+                self._unverified.add(i)
+            self.types[i] = wider
+
+    def _emit(self, batch: pa.RecordBatch) -> None:
+        """Count, spill and write one checked batch."""
+        for i, values in enumerate(batch.columns):
+            present = len(values) - values.null_count
+            self._present[i] += present
+            if self.types[i] == self.sampled[i]:
+                self._matched[i] += present
+            else:
+                fits = parse(values, self.sampled[i])
+                self._matched[i] += len(fits) - fits.null_count
+        self._rows += batch.num_rows
+        self._spill_batch(batch)
+
+        # Written with the types the file was opened with; widened columns are replayed at close
+        parsed = [parse(values, t) for values, t in zip(batch.columns, self._written)]
+        typed = pa.RecordBatch.from_arrays(parsed, schema=self._writer.schema)
+        self._quality.update(typed)
+        self._profile.update(typed)
+        self._writer.write_batch(typed)
+
+    def _spill_batch(self, batch: pa.RecordBatch) -> None:
+        if self._spill is None:
+            # String columns are never widened, so their text is never needed again
+            columns = [
+                i for i in range(len(self.names)) if i >= len(self._written) or self._written[i].kind != "string"
+            ]
+            if not columns:
+                return
+            path = f"{self.dest_path}.text{len(self._spill_files)}"
+            self._spill_files.append((path, columns))
+            schema = pa.schema([self._text_schema.field(i) for i in columns])
+            options = pa.ipc.IpcWriteOptions(compression=SPILL_COMPRESSION)
+            self._spill = pa.ipc.new_stream(path, schema, options=options)
+        self._spill.write_batch(batch.select(self._spill_files[-1][1]))
+
+    def _close_spill(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _spilled(self, columns: list[int]):
+        """Read ``columns`` back from the spill, as null in batches written before a column existed."""
+        for path, held in self._spill_files:
+            positions = {i: k for k, i in enumerate(held)}
+            with pa.OSFile(path) as source, pa.ipc.open_stream(source) as reader:
+                for batch in reader:
+                    yield pa.RecordBatch.from_arrays(
+                        [
+                            batch.column(positions[i]) if i in positions else pa.nulls(batch.num_rows, pa.string())
+                            for i in columns
+                        ],
+                        names=[self.names[i] for i in columns],
+                    )
+
+    def _verify(self) -> None:
+        """Widen again the widened columns whose earlier values do not fit their final type."""
+        # Widening a decimal's scale narrows its integer part, so a change means another pass
+        changed = True
+        while changed and self._unverified:
+            changed = False
+            columns = sorted(self._unverified)
+            for batch in self._spilled(columns):
+                for values, i in zip(batch.columns, columns):
+                    # e.g. a float with more decimals than the decimal it became, or an exponent
+                    if i in self._unverified and parse(values, self.types[i]).null_count != values.null_count:
+                        self.types[i] = _widen(self.types[i], values)
+                        changed = True
+                        if self.types[i].kind == "string":
+                            self._unverified.discard(i)
+                if not self._unverified:
+                    break
+        self._unverified = set()
+
+    def _rewrite(self, replay: list[int]) -> None:
+        """Write the file again with the final types: ``replay`` columns from the spill, the rest as written."""
+        schema = self._schema()
+        kept = [name for i, name in enumerate(self.names) if i not in replay]
+        written = pq.ParquetFile(self.dest_path)
+        source = written.iter_batches(batch_size=self.row_group_rows, columns=kept) if kept else iter(())
+        kept_schema = pa.schema([written.schema_arrow.field(name) for name in kept])
+        pending: list[pa.RecordBatch] = []
+        pending_rows = 0
+
+        self._quality = QualityAccumulator(len(self.names))
+        self._profile = TableProfiler(self.names)
+        path = f"{self.dest_path}.rewrite"
+        with RowGroupWriter(path, schema, self.row_group_rows, dictionary_columns=self._dictionary_columns) as writer:
+            for text in self._spilled(replay):
+                # Line the rows already written up with the spilled batch
+                while kept and pending_rows < text.num_rows:
+                    batch = next(source)
+                    pending.append(batch)
+                    pending_rows += batch.num_rows
+                rows = pa.Table.from_batches(pending, schema=kept_schema)
+                rest = rows.slice(text.num_rows)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+
+                replayed = dict(zip(replay, text.columns))
+                columns = [
+                    parse(replayed[i], t) if i in replayed else rows.column(name).slice(0, text.num_rows)
+                    for i, (name, t) in enumerate(zip(self.names, self.types))
+                ]
+                for typed in pa.Table.from_arrays(columns, schema=schema).to_batches():
+                    self._quality.update(typed)
+                    self._profile.update(typed)
+                    writer.write_batch(typed)
+        written.close()
+        os.replace(path, self.dest_path)
+
+    def _remove_spill(self) -> None:
+        self._close_spill()
+        for path in [path for path, _ in self._spill_files] + [f"{self.dest_path}.rewrite"]:
+            if os.path.exists(path):
+                os.remove(path)
+        self._spill_files = []
+
+    def close(self) -> dict:
+        """
+        Write the Parquet file and return ``{"row_count", "column_schema",
+        "quality_score", "quality_details", "column_profile"}``.
+        """
+        if self.types is None:
+            self._start()
+        self._close_spill()
+        self._writer.close()
+        try:
+            if self._unverified:
+                self._verify()
+            replay = [
+                i for i, t in enumerate(self.types) if i >= len(self._written) or t != self._written[i]
+            ]
+            if replay:
+                self._rewrite(replay)
+        finally:
+            self._remove_spill()
+
+        # An all-null column has nothing that fails its type
+        conformance = [m / p if p else 1.0 for m, p in zip(self._matched, self._present)]
+        score, details = self._quality.report(self.names, conformance)
+        return {
+            "row_count": self._rows,
+            "column_schema": self.describe(),
+            "quality_score": score,
+            "quality_details": details,
+            "column_profile": self._profile.to_dict(),
+        }
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.abort()
+        self._remove_spill()
+
+    def describe(self) -> dict[str, dict]:
+        schema = {}
+        for i, (name, ctype) in enumerate(zip(self.names, self.types)):
+            nulls = self._rows - self._present[i]
+            entry = {
+                "type": ctype.name,
+                "nullable": nulls > 0,
+                "null_count": nulls,
+                # Share of values that fit the type the sample predicted
+                "confidence": round(self._matched[i] / self._present[i], 4) if self._present[i] else 0.0,
+            }
+            if ctype.kind == "decimal":
+                entry["scale"] = ctype.scale
+            if ctype.kind == "datetime":
+                entry["format"] = ctype.format
+            if ctype != self.sampled[i]:
+                entry["promoted_from"] = self.sampled[i].name
+            schema[name] = entry
+        return schema
@@ -0,0 +1,132 @@
+"""
+Full-text index segments — per-dataset postings for project search.
+
+Every dataset with extracted text (the ``text`` column of PDFs,
+``extracted_text`` of images) gets one immutable segment, written once at
+extraction time and stored next to its Parquet file (``segment_key``). A
+project's index is simply the set of its segments, so indexing a new file
+never rewrites what is already there.
+
+A segment is itself a Parquet file in the dataset layout, one posting per
+(term, row): ``term``, ``row`` (row number in the dataset), ``page``,
+``tf`` (term frequency in the row) and ``length`` (tokens in the row), the
+last two being what BM25 needs. Postings are sorted by term, so the ``term``
+min/max in the row index tells a reader which few row groups can hold a
+query term.
+"""
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from app.extraction.parquet import RowGroupWriter
+
+# Columns whose text is indexed, in the order they are looked for
+TEXT_COLUMNS = ("text", "extracted_text")
+
+SEGMENT_SCHEMA = pa.schema([
+    pa.field("term", pa.string(), nullable=False),
+    pa.field("row", pa.int64(), nullable=False),
+    pa.field("page", pa.int32()),
+    pa.field("tf", pa.int32(), nullable=False),
+    pa.field("length", pa.int32(), nullable=False),
+])
+
+# Longer "words" are hashes, encoded blobs and the like; nobody searches for them
+MAX_TERM_LENGTH = 64
+
+# A token is a run of letters, digits and underscores
+_SEPARATOR = r"[^\p{L}\p{N}_]+"
+
+
+def _words(text: pa.Array | pa.ChunkedArray) -> tuple[pa.Array, pa.Array]:
+    """Lower-cased tokens of each value of ``text``, and the position of the value each came from."""
+    words = pc.split_pattern_regex(pc.utf8_lower(text), _SEPARATOR)
+    flat = pc.list_flatten(words)
+    size = pc.utf8_length(flat)
+    keep = pc.and_(pc.greater(size, 0), pc.less_equal(size, MAX_TERM_LENGTH))
+    return pc.filter(flat, keep), pc.filter(pc.list_parent_indices(words), keep)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Tokens of a query.
+
+    Goes through the same Arrow kernels as the documents in ``build_segment``:
+    Python's ``str.lower`` and ``\\w`` disagree with them on some letters
+    (``"İ".lower()`` is two code points, Arrow's lower case is ``"i"``).
+    """
+    terms, _ = _words(pa.array([text]))
+    return terms.to_pylist()
+
+
+def segment_key(parquet_key: str) -> str:
+    """Storage key of the search segment that belongs to ``parquet_key``."""
+    return f"{parquet_key.removesuffix('.parquet')}.search.parquet"
+
+
+def _postings(table: pa.Table, text_columns: list[str], first_row: int) -> pa.Table:
+    """Postings of one row group, tokenized and counted in Arrow rather than row by row."""
+    if len(text_columns) == 1:
+        text = table.column(text_columns[0])
+    else:
+        text = pc.binary_join_element_wise(
+            *(table.column(name) for name in text_columns), " ", null_handling="skip"
+        )
+    terms, rows = _words(text)
+    tokens = pa.table({"row": rows, "term": terms})
+
+    counts = tokens.group_by(["row", "term"]).aggregate([([], "count_all")])
+    lengths = tokens.group_by("row").aggregate([([], "count_all")]).rename_columns(["row", "length"])
+    postings = counts.join(lengths, "row")
+    rows = postings.column("row")
+    pages = pc.take(table.column("page"), rows) if "page" in table.column_names else pa.nulls(len(rows))
+    return pa.Table.from_arrays(
+        [
+            postings.column("term"),
+            pc.add(pc.cast(rows, pa.int64()), first_row),
+            pc.cast(pages, pa.int32()),
+            pc.cast(postings.column("count_all"), pa.int32()),
+            pc.cast(postings.column("length"), pa.int32()),
+        ],
+        schema=SEGMENT_SCHEMA,
+    )
+
+
+def build_segment(path: str, segment_path: str, *, row_group_rows: int) -> dict | None:
+    """
+    Index the text columns of the dataset file at ``path`` into ``segment_path``.
+
+    Returns ``{doc_count, total_length, term_count}`` (rows with any text,
+    their tokens in total, distinct terms) for the project's BM25
+    statistics, or None (nothing written) when the file has no text.
+    """
+    source = pq.ParquetFile(path)
+    names = source.schema_arrow.names
+    text_columns = [name for name in TEXT_COLUMNS if name in names]
+    if not text_columns:
+        return None
+    read_columns = text_columns + (["page"] if "page" in names else [])
+
+    parts = []
+    first_row = 0
+    for g in range(source.metadata.num_row_groups):
+        parts.append(_postings(source.read_row_group(g, columns=read_columns), text_columns, first_row))
+        first_row += source.metadata.row_group(g).num_rows
+    postings = pa.concat_tables(parts) if parts else SEGMENT_SCHEMA.empty_table()
+    if not postings.num_rows:
+        return None
+
+    documents = postings.group_by("row").aggregate([("length", "max")])
+    # Sorting by each term's rank among the distinct terms compares integers, not strings
+    vocabulary = pc.unique(postings.column("term"))
+    vocabulary = pc.take(vocabulary, pc.sort_indices(vocabulary))
+    keys = pa.table({"rank": pc.index_in(postings.column("term"), vocabulary), "row": postings.column("row")})
+    postings = postings.take(pc.sort_indices(keys, sort_keys=[("rank", "ascending"), ("row", "ascending")]))
+    with RowGroupWriter(segment_path, SEGMENT_SCHEMA, row_group_rows) as writer:
+        for batch in postings.to_batches():
+            writer.write_batch(batch)
+    return {
+        "doc_count": documents.num_rows,
+        "total_length": pc.sum(documents.column("length_max")).as_py(),
+        "term_count": len(vocabulary),
+    }
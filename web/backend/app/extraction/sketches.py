@@ -0,0 +1,482 @@
+"""
+Mergeable column sketches, filled in the extraction pass.
+
+- ``HyperLogLog``   distinct count, ~1.6% error with 4096 registers
+- ``TDigest``       quantiles, most accurate in the tails
+- ``MisraGries``    top-k values with a known worst-case undercount
+- ``Histogram``     fixed bin count; bin width is a power of two that doubles
+                    (merging neighbour bins exactly) when the range grows
+
+Every sketch updates from a whole batch with numpy / Arrow kernels, merges
+with another sketch of its kind (so per-chunk or per-worker sketches combine
+into the same result as one sequential pass) and round-trips through a
+JSON-safe dict. ``TableProfiler`` keeps one set per column.
+"""
+import base64
+import datetime
+import decimal
+import math
+import zlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+HLL_PRECISION = 12
+TDIGEST_COMPRESSION = 200
+TOP_K = 10
+TOP_K_CAPACITY = 64
+HISTOGRAM_BINS = 64
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+def hash_values(values: pa.Array) -> np.ndarray:
+    """64-bit hash per value (nulls hash to a fixed value)."""
+    if pa.types.is_dictionary(values.type):
+        # Hash each distinct value once
+        table = hash_values(values.dictionary)
+        indices = values.indices.fill_null(0).to_numpy(zero_copy_only=False)
+        hashes = table[indices] if len(table) else np.zeros(len(values), dtype=np.uint64)
+        return np.where(values.is_null().to_numpy(zero_copy_only=False), np.uint64(0), hashes)
+    if pa.types.is_list(values.type) or pa.types.is_large_list(values.type):
+        # Join each list into one string; slicing-safe since offsets are rebuilt
+        lengths = pc.fill_null(pc.list_value_length(values), 0).to_numpy(zero_copy_only=False)
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32)
+        flat = pc.fill_null(pc.cast(pc.list_flatten(values), pa.string()), "\x00")
+        values = pc.binary_join(pa.ListArray.from_arrays(pa.array(offsets), flat), "\x1f")
+    return pd.util.hash_array(values.to_numpy(zero_copy_only=False), categorize=False)
+
+
+def is_numeric(data_type: pa.DataType) -> bool:
+    return pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_decimal(data_type)
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return str(value)
+
+
+def _pack(array: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(array.tobytes())).decode("ascii")
+
+
+def _unpack(text: str, dtype) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype=dtype).copy()
+
+
+# ─── HyperLogLog ───────────────────────────────────────────────
+
+class HyperLogLog:
+    def __init__(self, precision: int = HLL_PRECISION, registers: np.ndarray | None = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        if not len(hashes):
+            return
+        tail_bits = 64 - self.precision
+        index = (hashes >> np.uint64(tail_bits)).astype(np.int64)
+        tail = hashes & np.uint64((1 << tail_bits) - 1)
+        # frexp's exponent is the bit length; exact because the tail fits a double's mantissa
+        _, bit_length = np.frexp(tail.astype(np.float64))
+        rank = (tail_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # linear counting for small cardinalities
+        return round(raw)
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "registers": _pack(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        return cls(data["precision"], _unpack(data["registers"], np.uint8))
+
+
+# ─── t-digest ──────────────────────────────────────────────────
+
+class TDigest:
+    """
+    Merging t-digest with the arcsine scale function. Compression is one
+    vectorized pass: points sorted by mean are grouped by the integer part of
+    their scale value, so each centroid spans at most one unit of the scale.
+    """
+
+    def __init__(self, compression: int = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def update(self, values: np.ndarray) -> None:
+        # Sorted first, the stable sort in _compress only has two runs to merge
+        values = np.sort(values[np.isfinite(values)])
+        if not len(values):
+            return
+        self.min = min(self.min, float(values[0]))
+        self.max = max(self.max, float(values[-1]))
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other: "TDigest") -> None:
+        if not len(other.means):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        scale = np.floor(self.compression / (2 * math.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.concatenate([[True], scale[1:] != scale[:-1]]))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(weights * means, starts) / self.weights
+
+    def quantile(self, q: float) -> float | None:
+        if not len(self.means):
+            return None
+        cumulative = np.cumsum(self.weights)
+        centers = cumulative - self.weights / 2
+        xs = np.concatenate([[0.0], centers, [cumulative[-1]]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * cumulative[-1], xs, ys))
+
+    def to_dict(self) -> dict:
+        return {
+            "compression": self.compression,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min if len(self.means) else None,
+            "max": self.max if len(self.means) else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TDigest":
+        digest = cls(data["compression"])
+        digest.means = np.array(data["means"], dtype=np.float64)
+        digest.weights = np.array(data["weights"], dtype=np.float64)
+        if len(digest.means):
+            digest.min, digest.max = data["min"], data["max"]
+        return digest
+
+
+# ─── Misra-Gries ───────────────────────────────────────────────
+
+class MisraGries:
+    """
+    Heavy hitters with ``capacity`` counters. Each reported count is at most
+    ``error`` below the true count; any value occurring more than
+    ``total / (capacity + 1)`` times is guaranteed to be kept.
+    """
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counters: dict = {}
+        self.error = 0
+        self.total = 0
+
+    def add_counts(self, values: pa.Array, counts: np.ndarray) -> None:
+        """Absorb exact counts of distinct ``values`` (e.g. one batch's ``value_counts``)."""
+        self.total += int(counts.sum())
+        # Reduce to a summary first, vectorized, so only ``capacity`` values reach Python
+        if len(counts) > self.capacity:
+            cut = np.partition(counts, len(counts) - self.capacity - 1)[len(counts) - self.capacity - 1]
+            keep = np.flatnonzero(counts > cut)
+            self.error += int(cut)
+            counts = counts[keep] - cut
+            values = values.take(pa.array(keep))
+        self._absorb(dict(zip(values.to_pylist(), counts.tolist())), 0)
+
+    def merge(self, other: "MisraGries") -> None:
+        self.total += other.total
+        self._absorb(other.counters, other.error)
+
+    def _absorb(self, counters: dict, error: int) -> None:
+        for key, count in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + count
+        self.error += error
+        if len(self.counters) > self.capacity:
+            cut = sorted(self.counters.values(), reverse=True)[self.capacity]
+            self.counters = {k: c - cut for k, c in self.counters.items() if c > cut}
+            self.error += cut
+
+    def top(self, k: int = TOP_K) -> list[dict]:
+        ranked = sorted(self.counters.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            # Numbers are counted as float64; show whole ones as integers
+            {"value": int(value) if isinstance(value, float) and value.is_integer() else _json_value(value), "count": count}
+            for value, count in ranked
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "counters": [[_json_value(k), c] for k, c in self.counters.items()],
+            "error": self.error,
+            "total": self.total,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MisraGries":
+        sketch = cls(data["capacity"])
+        sketch.counters = {k: c for k, c in data["counters"]}
+        sketch.error = data["error"]
+        sketch.total = data["total"]
+        return sketch
+
+
+# ─── Histogram ─────────────────────────────────────────────────
+
+class Histogram:
+    """
+    At most ``bins`` equal-width bins. Bin ``i`` covers ``[i·w, (i+1)·w)``
+    with ``w`` a power of two, so two histograms always align after the
+    finer one is coarsened, and coarsening just adds neighbour pairs.
+    """
+
+    def __init__(self, bins: int = HISTOGRAM_BINS):
+        self.bins = bins
+        self.exponent: int | None = None  # bin width is 2 ** exponent
+        self.start = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def width(self) -> float:
+        return math.ldexp(1.0, self.exponent)
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        low, high = float(values.min()), float(values.max())
+        if self.exponent is None:
+            span = high - low
+            self.exponent = math.ceil(math.log2(span / self.bins)) if span > 0 else math.frexp(abs(low) or 1.0)[1] - 6
+            self.start = math.floor(low / self.width)
+        self._cover(math.floor(low / self.width), math.floor(high / self.width))
+        index = np.floor(values / self.width).astype(np.int64) - self.start
+        self.counts += np.bincount(index, minlength=len(self.counts))[:len(self.counts)]
+
+    def _coarsen(self, steps: int) -> None:
+        for _ in range(steps):
+            index = np.arange(self.start, self.start + len(self.counts)) // 2
+            self.start = int(index[0]) if len(index) else self.start // 2
+            self.counts = np.bincount(index - self.start, weights=self.counts).astype(np.int64)
+            self.exponent += 1
+
+    def _cover(self, low: int, high: int) -> None:
+        """Extend (and coarsen as needed) so bins ``low..high`` at the current width exist."""
+        low, high = min(low, self.start), max(high, self.start + len(self.counts) - 1)
+        while high - low + 1 > self.bins:
+            self._coarsen(1)
+            low, high = low // 2, high // 2
+        grown = np.zeros(high - low + 1, dtype=np.int64)
+        grown[self.start - low:self.start - low + len(self.counts)] = self.counts
+        self.start, self.counts = low, grown
+
+    def merge(self, other: "Histogram") -> None:
+        if other.exponent is None:
+            return
+        other = Histogram.from_dict(other.to_dict())
+        if self.exponent is None:
+            self.exponent, self.start, self.counts = other.exponent, other.start, other.counts
+            return
+        if other.exponent < self.exponent:
+            other._coarsen(self.exponent - other.exponent)
+        elif self.exponent < other.exponent:
+            self._coarsen(other.exponent - self.exponent)
+        # Coarsen both in step until the union of their ranges fits
+        while (
+            max(self.start + len(self.counts), other.start + len(other.counts)) - min(self.start, other.start)
+            > self.bins
+        ):
+            self._coarsen(1)
+            other._coarsen(1)
+        self._cover(other.start, other.start + len(other.counts) - 1)
+        offset = other.start - self.start
+        self.counts[offset:offset + len(other.counts)] += other.counts
+
+    def summary(self) -> dict | None:
+        if self.exponent is None:
+            return None
+        return {
+            "bin_width": self.width,
+            "bins": [
+                {"lower": (self.start + i) * self.width, "upper": (self.start + i + 1) * self.width, "count": int(c)}
+                for i, c in enumerate(self.counts)
+            ],
+        }
+
+    def to_dict(self) -> dict:
+        return {"bins": self.bins, "exponent": self.exponent, "start": self.start, "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        histogram = cls(data["bins"])
+        histogram.exponent = data["exponent"]
+        histogram.start = data["start"]
+        histogram.counts = np.array(data["counts"], dtype=np.int64)
+        return histogram
+
+
+# ─── Table profiling ───────────────────────────────────────────
+
+class ColumnProfile:
+    def __init__(self):
+        self.count = 0
+        self.distinct = HyperLogLog()
+        self.top = MisraGries()
+        self.digest: TDigest | None = None
+        self.histogram: Histogram | None = None
+        self.min = None
+        self.max = None
+
+    def update(self, values: pa.Array) -> None:
+        present = len(values) - values.null_count
+        if not present:
+            return
+        self.count += present
+        numbers = None
+        if is_numeric(values.type):
+            # One key space for integer, float and decimal, so widening keeps counts together
+            numbers = pc.cast(values.drop_null(), pa.float64())
+        # One hash-table pass gives both sketches their input: only distinct values get hashed
+        try:
+            counted = pc.value_counts(numbers if numbers is not None else values.drop_null())
+        except pa.ArrowNotImplementedError:
+            # Lists have no value counts: distinct count only
+            self.distinct.add_hashes(hash_values(values.drop_null()))
+        else:
+            distinct = counted.field("values")
+            self.distinct.add_hashes(hash_values(distinct))
+            self.top.add_counts(distinct, counted.field("counts").to_numpy(zero_copy_only=False))
+        if numbers is not None:
+            numbers = numbers.to_numpy(zero_copy_only=False)
+            if self.digest is None:
+                self.digest, self.histogram = TDigest(), Histogram()
+            self.digest.update(numbers)
+            self.histogram.update(numbers)
+        elif pa.types.is_temporal(values.type):
+            # Kept as ISO text, which orders like the values and serializes as is
+            bounds = pc.min_max(values)
+            low, high = _json_value(bounds["min"].as_py()), _json_value(bounds["max"].as_py())
+            if low is not None:
+                self.min = low if self.min is None else min(self.min, low)
+                self.max = high if self.max is None else max(self.max, high)
+
+    def merge(self, other: "ColumnProfile") -> None:
+        self.count += other.count
+        self.distinct.merge(other.distinct)
+        self.top.merge(other.top)
+        if other.digest is not None:
+            if self.digest is None:
+                self.digest, self.histogram = TDigest(), Histogram()
+            self.digest.merge(other.digest)
+            self.histogram.merge(other.histogram)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def summary(self) -> dict:
+        summary = {
+            "count": self.count,
+            "distinct_count": min(self.distinct.estimate(), self.count),
+            "top_k": self.top.top(),
+            "top_k_max_error": self.top.error,
+        }
+        if self.digest is not None and len(self.digest.means):
+            summary["min"] = self.digest.min
+            summary["max"] = self.digest.max
+            summary["quantiles"] = {f"p{round(q * 100):02d}": self.digest.quantile(q) for q in QUANTILES}
+            summary["histogram"] = self.histogram.summary()
+        elif self.min is not None:
+            summary["min"] = self.min
+            summary["max"] = self.max
+        return summary
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "distinct": self.distinct.to_dict(),
+            "top": self.top.to_dict(),
+            "digest": self.digest.to_dict() if self.digest is not None else None,
+            "histogram": self.histogram.to_dict() if self.histogram is not None else None,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ColumnProfile":
+        profile = cls()
+        profile.count = data["count"]
+        profile.distinct = HyperLogLog.from_dict(data["distinct"])
+        profile.top = MisraGries.from_dict(data["top"])
+        if data["digest"] is not None:
+            profile.digest = TDigest.from_dict(data["digest"])
+            profile.histogram = Histogram.from_dict(data["histogram"])
+        profile.min, profile.max = data["min"], data["max"]
+        return profile
+
+
+class TableProfiler:
+    """One ``ColumnProfile`` per column, updated with each typed batch as it is written."""
+
+    def __init__(self, names: list[str]):
+        self.names = list(names)
+        self.columns = [ColumnProfile() for _ in names]
+
+    def add_columns(self, names: list[str]) -> None:
+        self.names.extend(names)
+        self.columns.extend(ColumnProfile() for _ in names)
+
+    def update(self, batch: pa.RecordBatch) -> None:
+        for column, values in zip(self.columns, batch.columns):
+            column.update(values)
+
+    def merge(self, other: "TableProfiler") -> None:
+        """Combine with a profile of other rows of the same table (columns matched by name)."""
+        index = {name: i for i, name in enumerate(self.names)}
+        for name, column in zip(other.names, other.columns):
+            if name not in index:
+                self.add_columns([name])
+                index[name] = len(self.names) - 1
+            self.columns[index[name]].merge(column)
+
+    def to_dict(self) -> dict:
+        """``column_profile`` as stored on the dataset: summaries plus the sketches to merge later."""
+        return {
+            "columns": {name: column.summary() for name, column in zip(self.names, self.columns)},
+            "sketches": {name: column.to_dict() for name, column in zip(self.names, self.columns)},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TableProfiler":
+        profiler = cls([])
+        for name, sketch in data["sketches"].items():
+            profiler.names.append(name)
+            profiler.columns.append(ColumnProfile.from_dict(sketch))
+        return profiler
@@ -1,17 +1,30 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.config import settings
 from app.api.router import api_router
+from app.core.storage import shutdown_storage
+from app.core.redis import close_redis
 from app.core.exceptions import (
     NotFoundError, ForbiddenError, BadRequestError,
     UnauthorizedError, ConflictError, StorageLimitError,
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shutdown_storage()
+    await close_redis()
+
+
 app = FastAPI(
     title="DataMorph API",
     version="0.1.0",
     description="Universal data interpreter — drop anything, know everything.",
+    lifespan=lifespan,
 )
 
 # ─── CORS ───────────────────────────────────────────────────────
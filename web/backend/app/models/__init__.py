@@ -4,6 +4,9 @@ from app.models.project import Project
 from app.models.file import File
 from app.models.dataset import Dataset, CleaningOperation
 from app.models.prediction import Prediction, Visualization, AuditLog
+from app.models.extraction_run import ExtractionRun
+from app.models.extraction_cache import ExtractionCacheEntry
+from app.models.search import SearchSegment
 
 __all__ = [
     "User",
@@ -14,4 +17,7 @@ __all__ = [
     "Prediction",
     "Visualization",
     "AuditLog",
+    "ExtractionRun",
+    "ExtractionCacheEntry",
+    "SearchSegment",
 ]
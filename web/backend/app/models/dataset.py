@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import String, Integer, DateTime, Text, ForeignKey
+from sqlalchemy import String, Integer, DateTime, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.database import Base
@@ -8,6 +8,9 @@ from app.core.database import Base
 
 class Dataset(Base):
     __tablename__ = "datasets"
+    __table_args__ = (
+        Index("ix_datasets_project_created", "project_id", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     file_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("files.id", ondelete="CASCADE"), nullable=False)
@@ -25,9 +28,14 @@ class Dataset(Base):
     quality_score: Mapped[int | None] = mapped_column(Integer)
     quality_details: Mapped[dict | None] = mapped_column(JSONB)
 
+    # Column statistics: summaries plus the mergeable sketches they came from. Sketches
+    # run to ~10 KB per column, so the column is only loaded when asked for (``undefer``)
+    column_profile: Mapped[dict | None] = mapped_column(JSONB, deferred=True)
+
     # Storage
     storage_key_parquet: Mapped[str | None] = mapped_column(Text)
     storage_key_csv: Mapped[str | None] = mapped_column(Text)
+    storage_key_sample: Mapped[str | None] = mapped_column(Text)  # stratified sample of large datasets
 
     # Versioning
     version: Mapped[int] = mapped_column(Integer, default=1)
@@ -0,0 +1,38 @@
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import String, Integer, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.database import Base
+
+
+class ExtractionCacheEntry(Base):
+    """Outputs of one extraction, reusable by any later file with the same content and options."""
+
+    __tablename__ = "extraction_cache"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "content_sha256", "detected_format", "extractor_version", "options_hash",
+            name="uq_extraction_cache_key",
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    # Cache key
+    content_sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+    detected_format: Mapped[str] = mapped_column(String(50), nullable=False)
+    extractor_version: Mapped[int] = mapped_column(Integer, nullable=False)
+    options_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    # Cached artifacts; ``outputs`` holds one entry per dataset (Parquet key, schema, counts, quality)
+    storage_bucket: Mapped[str] = mapped_column(String(255), nullable=False)
+    outputs: Mapped[list] = mapped_column(JSONB, nullable=False)
+    extracted_schema: Mapped[dict | None] = mapped_column(JSONB)
+    extraction_metadata: Mapped[dict | None] = mapped_column(JSONB)
+    source_file_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("files.id", ondelete="SET NULL"))
+
+    hit_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    last_hit_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import String, BigInteger, Integer, DateTime, Text, ForeignKey
+from sqlalchemy import String, BigInteger, Integer, DateTime, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.database import Base
@@ -8,6 +8,10 @@ from app.core.database import Base
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        Index("ix_files_user_content_sha256", "user_id", "content_sha256"),
+        Index("ix_files_project_created", "project_id", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     project_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
@@ -18,6 +22,8 @@ class File(Base):
     file_size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
     mime_type: Mapped[str | None] = mapped_column(String(255))
     detected_format: Mapped[str | None] = mapped_column(String(50))
+    content_sha256: Mapped[str | None] = mapped_column(String(64))
+    format_hints: Mapped[dict | None] = mapped_column(JSONB)
 
     # Storage locations
     storage_bucket: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -0,0 +1,28 @@
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import BigInteger, Integer, DateTime, Text, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.database import Base
+
+
+class SearchSegment(Base):
+    """One dataset's slice of its project's full-text index; the stored postings are immutable."""
+
+    __tablename__ = "search_segments"
+    __table_args__ = (
+        Index("ix_search_segments_project", "project_id"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    project_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    file_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("files.id", ondelete="CASCADE"), nullable=False)
+    dataset_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("datasets.id", ondelete="CASCADE"), nullable=False)
+
+    storage_key: Mapped[str] = mapped_column(Text, nullable=False)
+
+    # BM25 corpus statistics, summed over a project's segments at query time
+    doc_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_length: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    term_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -8,13 +8,18 @@ from app.schemas.project import (
     ProjectResponse, ProjectListResponse, ProjectDetailResponse,
 )
 from app.schemas.upload import (
+    UploadSessionCreateRequest, UploadSessionResponse, UploadChunkResponse,
+    DirectUploadRequest, DirectUploadCompleteRequest, DirectUploadResponse,
+    BulkUploadFile, BulkUploadResponse, BulkUploadProgressResponse,
     UploadResponse, FileProgressResponse, FileResponse, FileListResponse,
 )
 from app.schemas.dataset import (
     CleaningOperationSchema, CleaningPreview, CleaningResult,
     VisualizationConfig, VisualizationResponse,
-    DatasetResponse, DatasetListResponse, DatasetPreviewResponse,
+    DatasetResponse, DatasetListResponse, DatasetPreviewResponse, DatasetProfileResponse, DatasetCacheStats,
+    QueryCondition, QueryAggregate, QueryOrder, DatasetQueryRequest, DatasetQueryResponse,
 )
+from app.schemas.search import SearchHit, SearchResponse
 from app.schemas.prediction import (
     PredictionCreateRequest, PredictionResponse, PredictionListResponse,
 )
@@ -25,9 +30,14 @@ __all__ = [
     "TokenResponse", "UserResponse", "AuthResponse",
     "ProjectCreateRequest", "ProjectUpdateRequest",
     "ProjectResponse", "ProjectListResponse", "ProjectDetailResponse",
+    "UploadSessionCreateRequest", "UploadSessionResponse", "UploadChunkResponse",
+    "DirectUploadRequest", "DirectUploadCompleteRequest", "DirectUploadResponse",
+    "BulkUploadFile", "BulkUploadResponse", "BulkUploadProgressResponse",
     "UploadResponse", "FileProgressResponse", "FileResponse", "FileListResponse",
     "CleaningOperationSchema", "CleaningPreview", "CleaningResult",
     "VisualizationConfig", "VisualizationResponse",
-    "DatasetResponse", "DatasetListResponse", "DatasetPreviewResponse",
+    "DatasetResponse", "DatasetListResponse", "DatasetPreviewResponse", "DatasetProfileResponse", "DatasetCacheStats",
+    "QueryCondition", "QueryAggregate", "QueryOrder", "DatasetQueryRequest", "DatasetQueryResponse",
+    "SearchHit", "SearchResponse",
     "PredictionCreateRequest", "PredictionResponse", "PredictionListResponse",
 ]
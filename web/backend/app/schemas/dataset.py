@@ -1,5 +1,6 @@
 import uuid
 from datetime import datetime
+from typing import Any, Literal
 from pydantic import BaseModel, Field
 
 
@@ -33,6 +34,7 @@ class VisualizationConfig(BaseModel):
     title: str | None = None
     auto_suggest: bool = False
     intent: str | None = None
+    sample: bool = Field(False, description="Render from the dataset's stored sample rather than every row")
 
 
 class VisualizationResponse(BaseModel):
@@ -71,7 +73,15 @@ class DatasetResponse(BaseModel):
 
 class DatasetListResponse(BaseModel):
     datasets: list[DatasetResponse]
-    total: int
+    total: int | None = None
+    total_estimated: bool = False
+    next_cursor: str | None = None
+
+
+class DatasetProfileResponse(BaseModel):
+    dataset_id: uuid.UUID
+    row_count: int | None
+    columns: dict = Field(..., description="Per column: count, distinct_count, top_k, min/max, quantiles, histogram")
 
 
 class DatasetPreviewResponse(BaseModel):
@@ -80,3 +90,56 @@ class DatasetPreviewResponse(BaseModel):
     total_rows: int
     page: int
     page_size: int
+    sampled: bool = False  # rows come from the stored sample; total_rows counts the sample
+    sample_fraction: float | None = None
+
+
+class DatasetCacheStats(BaseModel):
+    local_hits: int
+    shared_hits: int
+    misses: int
+    hit_rate: float | None
+    local_entries: int
+    local_bytes: int
+
+
+# ─── Query ─────────────────────────────────────────────────────
+
+class QueryCondition(BaseModel):
+    column: str
+    op: Literal["=", "!=", "<", "<=", ">", ">=", "in", "not_in", "is_null", "not_null", "contains"]
+    value: Any = Field(None, description="A list for in / not_in; unused for is_null / not_null")
+
+
+class QueryAggregate(BaseModel):
+    fn: Literal["count", "sum", "mean", "min", "max"]
+    column: str | None = Field(None, description="Omit with count to count rows")
+    alias: str | None = None
+
+
+class QueryOrder(BaseModel):
+    column: str = Field(..., description="A column, or for grouped queries a group key or aggregate alias")
+    descending: bool = False
+
+
+class DatasetQueryRequest(BaseModel):
+    select: list[str] | None = Field(None, description="Columns to return when not aggregating; all by default")
+    where: list[QueryCondition] = Field(default_factory=list, description="Conditions, all of which must hold")
+    group_by: list[str] = Field(default_factory=list)
+    aggregates: list[QueryAggregate] = Field(default_factory=list)
+    order_by: list[QueryOrder] = Field(default_factory=list)
+    limit: int = Field(1000, ge=1, le=10_000)
+    sample: bool = Field(
+        False,
+        description="Run over the stored sample; counts and sums are scaled up and get <alias>_error 95% bounds",
+    )
+
+
+class DatasetQueryResponse(BaseModel):
+    columns: list[str]
+    rows: list[dict]
+    row_count: int
+    row_groups_scanned: int
+    row_groups_total: int
+    sampled: bool = False
+    sample_fraction: float | None = None
@@ -38,4 +38,6 @@ class PredictionResponse(BaseModel):
 
 class PredictionListResponse(BaseModel):
     predictions: list[PredictionResponse]
-    total: int
+    total: int | None = None
+    total_estimated: bool = False
+    next_cursor: str | None = None
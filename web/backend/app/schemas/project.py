@@ -35,7 +35,9 @@ class ProjectResponse(BaseModel):
 
 class ProjectListResponse(BaseModel):
     projects: list[ProjectResponse]
-    total: int
+    total: int | None = None
+    total_estimated: bool = False
+    next_cursor: str | None = None
 
 
 class ProjectDetailResponse(ProjectResponse):
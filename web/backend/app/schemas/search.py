@@ -0,0 +1,20 @@
+import uuid
+from pydantic import BaseModel
+
+
+class SearchHit(BaseModel):
+    file_id: uuid.UUID
+    dataset_id: uuid.UUID
+    dataset_name: str
+    page: int | None  # PDF page; None for sources without pages
+    row: int  # row number in the dataset, as used by the preview
+    score: float
+    text: str | None
+
+
+class SearchResponse(BaseModel):
+    query: str
+    terms: list[str]
+    hits: list[SearchHit]
+    total_hits: int  # matching rows, of which ``hits`` are the best ranked
+    segments_searched: int
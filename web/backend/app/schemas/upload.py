@@ -2,15 +2,101 @@ import uuid
 from datetime import datetime
 from pydantic import BaseModel, Field
 
+from app.config import settings
+
 
 # ─── Request Schemas ───────────────────────────────────────────
 
+class UploadSessionCreateRequest(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=500)
+    size: int = Field(..., gt=0, description="Total file size in bytes")
+    project_id: uuid.UUID | None = None
+    chunk_size: int | None = Field(
+        None, gt=0, le=settings.UPLOAD_MAX_CHUNK_BYTES, description="Bytes per chunk; server default if omitted"
+    )
+
+
+class DirectUploadRequest(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=500)
+    size: int = Field(..., gt=0, description="Exact file size in bytes")
+    project_id: uuid.UUID | None = None
+
+
+class CompletedPart(BaseModel):
+    part_number: int = Field(..., ge=1)
+    etag: str
+
+
+class DirectUploadCompleteRequest(BaseModel):
+    etag: str | None = Field(None, description="ETag returned by S3 for a single POST upload")
+    parts: list[CompletedPart] | None = Field(None, description="Part ETags for a multipart upload")
+
+
+# ─── Response Schemas ──────────────────────────────────────────
+
+class DirectUploadPart(BaseModel):
+    part_number: int
+    url: str
+
+
+class DirectUploadResponse(BaseModel):
+    upload_id: str
+    method: str = Field(..., description="post | multipart")
+    url: str | None = None
+    fields: dict | None = None
+    part_size: int | None = None
+    parts: list[DirectUploadPart] | None = None
+    expires_in: int
+
+
+class UploadSessionResponse(BaseModel):
+    session_id: str
+    chunk_size: int
+    total_chunks: int
+    received_chunks: list[int]
+    expires_in: int
+
+
+class UploadChunkResponse(BaseModel):
+    session_id: str
+    chunk_index: int
+    received_chunks: int
+    total_chunks: int
+
+
 class UploadResponse(BaseModel):
     file_id: uuid.UUID
     status: str
     detected_format: str | None
     progress_url: str
+    events_url: str | None = None
     estimated_seconds: int | None
+    poll_interval_seconds: int | None = None
+    deduplicated: bool = False
+
+
+class BulkUploadFile(BaseModel):
+    file_id: uuid.UUID
+    filename: str
+    detected_format: str | None
+    deduplicated: bool = False
+
+
+class BulkUploadResponse(BaseModel):
+    batch_id: str
+    project_id: uuid.UUID
+    files: list[BulkUploadFile]
+    progress_url: str
+
+
+class BulkUploadProgressResponse(BaseModel):
+    batch_id: str
+    status: str
+    total: int
+    completed: int
+    failed: int
+    progress: int
+    file_ids: list[uuid.UUID]
 
 
 class FileProgressResponse(BaseModel):
@@ -29,6 +115,8 @@ class FileResponse(BaseModel):
     file_size_bytes: int
     mime_type: str | None
     detected_format: str | None
+    content_sha256: str | None = None
+    format_hints: dict | None = None
     status: str
     processing_progress: int
     extraction_metadata: dict | None
@@ -42,4 +130,6 @@ class FileResponse(BaseModel):
 
 class FileListResponse(BaseModel):
     files: list[FileResponse]
-    total: int
+    total: int | None = None
+    total_estimated: bool = False
+    next_cursor: str | None = None
@@ -0,0 +1,248 @@
+"""
+Bulk upload service — many files or a ZIP archive in one request.
+
+Archive members are streamed out of the ZIP (never extracted to disk) and all
+members are written to S3 concurrently. Members whose bytes the user already
+has are deduplicated as single uploads are: one stored object, and a copy of
+the extraction when it is ready. The ``File`` rows go in with a single
+transaction and extraction runs as one Celery group whose progress is
+aggregated in a Redis hash keyed by batch id.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import uuid
+import zipfile
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.redis import get_redis, get_sync_redis
+from app.core.storage import upload_stream_to_s3, delete_file_from_s3
+from app.core.exceptions import BadRequestError, NotFoundError, StorageLimitError
+from app.models.user import User
+from app.services.file_service import (
+    check_storage_limits, detect_file_type, create_file_records, find_duplicate_files, reuse_extraction,
+)
+from app.services.file_detector import SNIFF_BYTES, ZIP_MIME
+
+BATCH_TTL_SECONDS = 7 * 24 * 3600
+
+
+def _batch_key(batch_id: str) -> str:
+    return f"bulk_upload:{batch_id}"
+
+
+class _AsyncReader:
+    """Async ``read(n)`` over a blocking file object, replaying a sniffed prefix first."""
+
+    def __init__(self, fileobj, prefix: bytes = b""):
+        self._fileobj = fileobj
+        self._prefix = prefix
+
+    async def read(self, size: int) -> bytes:
+        if self._prefix:
+            head, self._prefix = self._prefix[:size], self._prefix[size:]
+            if len(head) == size:
+                return head
+            return head + await asyncio.to_thread(self._fileobj.read, size - len(head))
+        return await asyncio.to_thread(self._fileobj.read, size)
+
+
+def _is_archive(upload: UploadFile, head: bytes) -> bool:
+    return head.startswith(b"PK\x03\x04") and detect_file_type(head, upload.filename or "")["mime_type"] == ZIP_MIME
+
+
+def _archive_members(archive: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    # Skip folders and OS metadata (__MACOSX/, .DS_Store, dotfiles)
+    return [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith(".")
+    ]
+
+
+async def _store_member(
+    open_member, filename: str, key_prefix: str, slots: asyncio.Semaphore
+) -> dict:
+    # Members are opened only once a slot is free, bounding live decompressors
+    async with slots:
+        fileobj = open_member()
+        try:
+            head = await asyncio.to_thread(fileobj.read, SNIFF_BYTES)
+            detection = detect_file_type(head, filename)
+            storage_key = f"{key_prefix}/{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+            hasher = hashlib.sha256()
+            size = await upload_stream_to_s3(
+                _AsyncReader(fileobj, head),
+                storage_key,
+                content_type=detection["mime_type"],
+                concurrency=1,  # parallelism comes from the members themselves
+                on_chunk=hasher.update,
+            )
+        finally:
+            fileobj.close()
+        return {
+            "filename": filename,
+            "size": size,
+            "detected_format": detection["format"],
+            "mime_type": detection["mime_type"],
+            "storage_key": storage_key,
+            "content_sha256": hasher.hexdigest(),
+            "format_hints": detection["hints"],
+        }
+
+
+async def _deduplicate(db: AsyncSession, user_id: uuid.UUID, stored: list[dict]) -> dict:
+    """
+    Point entries whose bytes the user already stored (earlier, or earlier
+    in this batch) at the existing object, deleting the new copy; sets each
+    entry's ``charge_storage``. Returns the existing file of each digest.
+    """
+    sources = await find_duplicate_files(
+        db, user_id=user_id, content_sha256s=list({e["content_sha256"] for e in stored})
+    )
+    keys = {digest: file.storage_key_original for digest, file in sources.items()}
+    duplicates = []
+    for entry in stored:
+        existing = keys.setdefault(entry["content_sha256"], entry["storage_key"])
+        entry["charge_storage"] = existing == entry["storage_key"]
+        if not entry["charge_storage"]:
+            duplicates.append(entry["storage_key"])
+            entry["storage_key"] = existing
+    await asyncio.gather(*(delete_file_from_s3(key) for key in duplicates), return_exceptions=True)
+    return sources
+
+
+async def ingest_bulk_upload(
+    db: AsyncSession,
+    *,
+    user: User,
+    uploads: list[UploadFile],
+    project_id: uuid.UUID | None = None,
+) -> dict:
+    """Store every file / archive member and queue one extraction group."""
+    sources: list[tuple[object, str]] = []  # (opener, filename)
+    archives: list[zipfile.ZipFile] = []
+    declared = 0
+    try:
+        for upload in uploads:
+            head = await upload.read(SNIFF_BYTES)
+            await upload.seek(0)
+            if _is_archive(upload, head):
+                try:
+                    archive = zipfile.ZipFile(upload.file)
+                except zipfile.BadZipFile:
+                    raise BadRequestError(f"{upload.filename} is not a valid ZIP archive")
+                archives.append(archive)
+                for info in _archive_members(archive):
+                    sources.append((functools.partial(archive.open, info), os.path.basename(info.filename)))
+                    declared += info.file_size
+            else:
+                sources.append((lambda f=upload.file: f, upload.filename or "file"))
+                declared += upload.size or 0
+
+        if not sources:
+            raise BadRequestError("No files to upload")
+        if len(sources) > settings.BULK_UPLOAD_MAX_FILES:
+            raise BadRequestError(f"At most {settings.BULK_UPLOAD_MAX_FILES} files per bulk upload")
+        # Uncompressed sizes from the central directory guard against zip bombs
+        await check_storage_limits(user, declared)
+
+        if project_id is None:
+            from app.services.project_service import create_project
+            name = uploads[0].filename if len(uploads) == 1 else f"Bulk upload ({len(sources)} files)"
+            project = await create_project(db, user_id=user.id, name=name or "Bulk upload")
+            project_id = project.id
+
+        key_prefix = f"{user.id}/{project_id}"
+        slots = asyncio.Semaphore(settings.BULK_UPLOAD_CONCURRENCY)
+        results = await asyncio.gather(
+            *(_store_member(opener, filename, key_prefix, slots) for opener, filename in sources),
+            return_exceptions=True,
+        )
+    finally:
+        for archive in archives:
+            archive.close()
+
+    stored = [r for r in results if isinstance(r, dict)]
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if not failed:
+        # Declared sizes may be missing or wrong; enforce limits on what was received
+        try:
+            sources = await _deduplicate(db, user.id, stored)
+            await check_storage_limits(user, sum(e["size"] for e in stored if e["charge_storage"]))
+        except StorageLimitError as exc:
+            failed.append(exc)
+    if failed:
+        # All-or-nothing: drop what did get written
+        await asyncio.gather(
+            *(delete_file_from_s3(e["storage_key"]) for e in stored if e.get("charge_storage", True)),
+            return_exceptions=True,
+        )
+        raise failed[0]
+
+    files = await create_file_records(
+        db,
+        user_id=user.id,
+        project_id=project_id,
+        storage_bucket=settings.S3_BUCKET_NAME,
+        entries=stored,
+    )
+    # Copies of files the user already has extracted take over the extraction
+    reused = []
+    for file, entry in zip(files, stored):
+        source = sources.get(entry["content_sha256"])
+        if source is not None and source.status == "ready":
+            await reuse_extraction(db, source=source, target=file)
+            reused.append(file)
+    queued = [f for f in files if f not in reused]
+
+    batch_id = uuid.uuid4().hex
+    redis = get_redis()
+    await redis.hset(_batch_key(batch_id), mapping={
+        "user_id": str(user.id),
+        "project_id": str(project_id),
+        "total": len(files),
+        "completed": len(reused),
+        "failed": 0,
+        "file_ids": json.dumps([str(f.id) for f in files]),
+    })
+    await redis.expire(_batch_key(batch_id), BATCH_TTL_SECONDS)
+
+    try:
+        from celery import group
+        from app.tasks.extraction import process_file_extraction
+        if queued:
+            group(process_file_extraction.s(str(f.id), batch_id=batch_id) for f in queued).apply_async()
+    except Exception:
+        pass  # Celery may not be running in dev
+
+    return {"batch_id": batch_id, "project_id": project_id, "files": files, "deduplicated": reused}
+
+
+async def get_bulk_progress(*, batch_id: str, user_id: uuid.UUID) -> dict:
+    batch = await get_redis().hgetall(_batch_key(batch_id))
+    if not batch or batch.get("user_id") != str(user_id):
+        raise NotFoundError("Bulk upload not found or expired")
+    total = int(batch["total"])
+    completed = int(batch["completed"])
+    failed = int(batch["failed"])
+    done = completed + failed
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if done >= total else "processing",
+        "total": total,
+        "completed": completed,
+        "failed": failed,
+        "progress": round(done * 100 / total) if total else 100,
+        "file_ids": json.loads(batch["file_ids"]),
+    }
+
+
+def record_batch_result(batch_id: str, succeeded: bool) -> None:
+    """Called from the extraction worker when one member reaches a final state."""
+    get_sync_redis().hincrby(_batch_key(batch_id), "completed" if succeeded else "failed", 1)
@@ -1,12 +1,29 @@
 """
 Dataset service — CRUD, cleaning operations, data loading.
 """
+import asyncio
+import functools
+import hashlib
+import json
 import uuid
-from sqlalchemy import select, func
+from dataclasses import dataclass
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 
+from app.config import settings
 from app.models.dataset import Dataset, CleaningOperation
-from app.core.exceptions import NotFoundError
+from app.core.cache import ByteLRU, TwoTierCache
+from app.core.exceptions import BadRequestError, NotFoundError
+from app.core.pagination import Page, paginate
+from app.core.streaming import ROW_ENCODERS
+from app.core.storage import get_object_range, head_object, read_object, read_object_range
+from app.extraction.parquet import (
+    TAIL_READ_BYTES, SparseFile, chunk_ranges, index_key, locate_row, row_index_from_metadata, tail_range,
+)
 
 
 async def create_dataset(
@@ -20,8 +37,10 @@ async def create_dataset(
     column_count: int | None = None,
     quality_score: int | None = None,
     quality_details: dict | None = None,
+    column_profile: dict | None = None,
     storage_key_parquet: str | None = None,
     storage_key_csv: str | None = None,
+    storage_key_sample: str | None = None,
 ) -> Dataset:
     dataset = Dataset(
         id=uuid.uuid4(),
@@ -33,8 +52,10 @@ async def create_dataset(
         column_count=column_count,
         quality_score=quality_score,
         quality_details=quality_details,
+        column_profile=column_profile,
         storage_key_parquet=storage_key_parquet,
         storage_key_csv=storage_key_csv,
+        storage_key_sample=storage_key_sample,
     )
     db.add(dataset)
     await db.commit()
@@ -43,16 +64,19 @@ async def create_dataset(
 
 
 async def get_dataset(
-    db: AsyncSession, *, dataset_id: uuid.UUID, user_id: uuid.UUID
+    db: AsyncSession, *, dataset_id: uuid.UUID, user_id: uuid.UUID, with_profile: bool = False
 ) -> Dataset:
-    """Fetch dataset ensuring the user owns the parent project."""
+    """Fetch dataset ensuring the user owns the parent project; ``column_profile`` only with ``with_profile``."""
     from app.models.project import Project
 
-    result = await db.execute(
+    query = (
         select(Dataset)
         .join(Project, Dataset.project_id == Project.id)
         .where(Dataset.id == dataset_id, Project.user_id == user_id)
     )
+    if with_profile:
+        query = query.options(undefer(Dataset.column_profile))
+    result = await db.execute(query)
     dataset = result.scalar_one_or_none()
     if dataset is None:
         raise NotFoundError("Dataset not found")
@@ -60,27 +84,29 @@ async def get_dataset(
 
 
 async def list_datasets(
-    db: AsyncSession, *, project_id: uuid.UUID, user_id: uuid.UUID, offset: int = 0, limit: int = 50
-) -> tuple[list[Dataset], int]:
+    db: AsyncSession,
+    *,
+    project_id: uuid.UUID,
+    user_id: uuid.UUID,
+    limit: int = 50,
+    cursor: str | None = None,
+    offset: int = 0,
+    count: str = "exact",
+) -> Page:
     from app.models.project import Project
 
-    count_result = await db.execute(
-        select(func.count())
-        .select_from(Dataset)
-        .join(Project, Dataset.project_id == Project.id)
-        .where(Dataset.project_id == project_id, Project.user_id == user_id)
-    )
-    total = count_result.scalar() or 0
-
-    result = await db.execute(
+    return await paginate(
+        db,
         select(Dataset)
         .join(Project, Dataset.project_id == Project.id)
-        .where(Dataset.project_id == project_id, Project.user_id == user_id)
-        .order_by(Dataset.created_at.desc())
-        .offset(offset)
-        .limit(limit)
+        .where(Dataset.project_id == project_id, Project.user_id == user_id),
+        sort_column=Dataset.created_at,
+        id_column=Dataset.id,
+        limit=limit,
+        cursor=cursor,
+        offset=offset,
+        count=count,
     )
-    return list(result.scalars().all()), total
 
 
 async def log_cleaning_operation(
@@ -112,3 +138,256 @@ async def log_cleaning_operation(
     await db.commit()
     await db.refresh(op)
     return op
+
+
+# ─── Data loading ───────────────────────────────────────────────
+
+def _table_bytes(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _table_from_bytes(data: bytes) -> pa.Table:
+    return pa.ipc.open_stream(data).read_all()
+
+
+# Row index and footer of each dataset version; small, and needed before anything else
+_layout_cache = ByteLRU(settings.DATASET_LAYOUT_CACHE_BYTES)
+
+# One decoded column of one row group per entry, so overlapping column selections share them
+row_group_cache = TwoTierCache(
+    "row_groups",
+    max_bytes=settings.ROW_GROUP_CACHE_BYTES,
+    ttl_seconds=settings.DATASET_CACHE_TTL_SECONDS,
+    max_entry_bytes=settings.DATASET_CACHE_MAX_ENTRY_BYTES,
+    dumps=_table_bytes,
+    loads=_table_from_bytes,
+    sizeof=lambda table: table.nbytes,
+)
+
+preview_cache = TwoTierCache(
+    "preview_pages",
+    max_bytes=settings.PREVIEW_PAGE_CACHE_BYTES,
+    ttl_seconds=settings.DATASET_CACHE_TTL_SECONDS,
+    max_entry_bytes=settings.DATASET_CACHE_MAX_ENTRY_BYTES,
+    dumps=lambda payload: json.dumps(payload).encode(),
+    loads=json.loads,
+)
+
+query_cache = TwoTierCache(
+    "query_results",
+    max_bytes=settings.QUERY_RESULT_CACHE_BYTES,
+    ttl_seconds=settings.DATASET_CACHE_TTL_SECONDS,
+    max_entry_bytes=settings.DATASET_CACHE_MAX_ENTRY_BYTES,
+    dumps=_table_bytes,
+    loads=_table_from_bytes,
+    sizeof=lambda table: table.nbytes,
+)
+
+# Which row groups of a search segment hold each term, per segment and per project
+search_directory_cache = TwoTierCache(
+    "search_directories",
+    max_bytes=settings.SEARCH_DIRECTORY_CACHE_BYTES,
+    ttl_seconds=settings.DATASET_CACHE_TTL_SECONDS,
+    max_entry_bytes=settings.DATASET_CACHE_MAX_ENTRY_BYTES,
+    dumps=_table_bytes,
+    loads=_table_from_bytes,
+    sizeof=lambda table: table.nbytes,
+)
+
+
+def cache_key(dataset: Dataset, *parts) -> str:
+    """Cache key scoped to one dataset version; a new version never sees older entries."""
+    return ":".join([str(dataset.id), str(dataset.version), *map(str, parts)])
+
+
+def _columns_key(columns: list[str] | None) -> str:
+    if not columns:
+        return "*"
+    return hashlib.sha1(json.dumps(columns).encode()).hexdigest()[:16]
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the dataset read caches in this process."""
+    caches = (preview_cache, row_group_cache, query_cache, search_directory_cache)
+    return {cache.name: cache.stats() for cache in caches}
+
+
+@dataclass(frozen=True)
+class StoredTable:
+    """
+    A stored Parquet file in the dataset layout that is not itself a dataset
+    (a sample, a search segment), readable wherever a dataset is.
+    """
+    id: str
+    version: int
+    storage_key_parquet: str
+
+
+def sample_view(dataset: Dataset) -> StoredTable | None:
+    """The sample to read in place of ``dataset``; None for datasets small enough to read whole."""
+    if not dataset.storage_key_sample:
+        return None
+    return StoredTable(
+        id=f"{dataset.id}.sample", version=dataset.version, storage_key_parquet=dataset.storage_key_sample
+    )
+
+
+def _open_parquet(key: str, size: int, spans: dict[int, bytes], metadata=None) -> pq.ParquetFile:
+    # Blocking: misses fall through to ranged GETs, so call it off the event loop
+    return pq.ParquetFile(SparseFile(size, spans, functools.partial(get_object_range, key)), metadata=metadata)
+
+
+async def load_row_index(parquet_key: str) -> dict:
+    """Row index of a dataset file; rebuilt from its footer for files stored without a sidecar."""
+    body = await read_object(index_key(parquet_key))
+    if body is not None:
+        return json.loads(body)
+    head = await head_object(parquet_key)
+    if head is None:
+        raise NotFoundError("Dataset data not found")
+    size = head["ContentLength"]
+    start = max(0, size - TAIL_READ_BYTES)
+    tail = await read_object_range(parquet_key, start, size - start)
+    parquet = await asyncio.to_thread(_open_parquet, parquet_key, size, {start: tail})
+    return row_index_from_metadata(parquet.metadata, size)
+
+
+async def load_layout(dataset: Dataset) -> tuple[dict, pq.FileMetaData]:
+    """Row index and parsed footer of a dataset version, cached in-process."""
+    key = cache_key(dataset, "layout")
+    layout = _layout_cache.get(key)
+    if layout is None:
+        parquet_key = dataset.storage_key_parquet
+        index = await load_row_index(parquet_key)
+        tail_start, tail_length = tail_range(index)
+        tail = await read_object_range(parquet_key, tail_start, tail_length)
+        parquet = await asyncio.to_thread(_open_parquet, parquet_key, index["file_size"], {tail_start: tail})
+        layout = (index, parquet.metadata)
+        _layout_cache.put(key, layout, index["footer_length"] + len(json.dumps(index)))
+    return layout
+
+
+async def sample_fraction(dataset: Dataset | StoredTable) -> float | None:
+    """Share of the dataset's rows that ``dataset`` holds when it is a sample; None for full data."""
+    index, _ = await load_layout(dataset)
+    sample = index.get("sample")
+    return sample["fraction"] if sample else None
+
+
+async def _read_row_groups(
+    dataset: Dataset, index: dict, metadata: pq.FileMetaData, wanted: dict[int, list[str]]
+) -> dict[tuple[int, str], pa.Table]:
+    """Fetch and decode ``{row_group: columns}``; one single-column table per pair."""
+    parquet_key = dataset.storage_key_parquet
+    schema = metadata.schema.to_arrow_schema()
+    ranges = [r for g, names in wanted.items() for r in chunk_ranges(metadata, schema, [g], names)]
+    chunks = await asyncio.gather(*(read_object_range(parquet_key, start, length) for start, length in ranges))
+    spans = dict(zip((start for start, _ in ranges), chunks))
+
+    def read() -> dict[tuple[int, str], pa.Table]:
+        reader = _open_parquet(parquet_key, index["file_size"], spans, metadata=metadata)
+        pieces = {}
+        for g, names in wanted.items():
+            table = reader.read_row_group(g, columns=names)
+            for name in names:
+                pieces[g, name] = table.select([name])
+        return pieces
+
+    return await asyncio.to_thread(read)
+
+
+async def load_row_groups(
+    dataset: Dataset,
+    groups: list[int],
+    columns: list[str],
+    *,
+    layout: tuple[dict, pq.FileMetaData] | None = None,
+    shared: bool = True,
+) -> dict[int, pa.Table]:
+    """
+    ``columns`` of each row group in ``groups``, through the row-group cache.
+
+    Only the missing (row group, column) chunks are fetched. ``shared=False``
+    keeps newly read chunks out of Redis, so large scans do not flood it.
+    """
+    index, metadata = layout or await load_layout(dataset)
+    keys = {(g, name): cache_key(dataset, "rg", g, name) for g in groups for name in columns}
+    cached = await row_group_cache.get_many(list(keys.values()))
+    pieces = {pair: cached[key] for pair, key in keys.items() if cached[key] is not None}
+
+    wanted: dict[int, list[str]] = {}
+    for g, name in keys:
+        if (g, name) not in pieces:
+            wanted.setdefault(g, []).append(name)
+    if wanted:
+        fetched = await _read_row_groups(dataset, index, metadata, wanted)
+        await row_group_cache.set_many({keys[pair]: table for pair, table in fetched.items()}, shared=shared)
+        pieces.update(fetched)
+
+    return {
+        g: pa.Table.from_arrays([pieces[g, name].column(0) for name in columns], names=columns)
+        for g in groups
+    }
+
+
+async def read_rows(
+    dataset: Dataset, *, offset: int, limit: int, columns: list[str] | None = None
+) -> tuple[pa.Table, int]:
+    """
+    Rows ``[offset, offset + limit)`` of a dataset and its total row count.
+
+    Only the row groups that cover the range are loaded (see
+    ``load_row_groups``), so the cost does not depend on how deep into the
+    file the range starts.
+    """
+    index, metadata = await load_layout(dataset)
+    schema = metadata.schema.to_arrow_schema()
+    if columns:
+        unknown = [name for name in columns if name not in schema.names]
+        if unknown:
+            raise BadRequestError(f"Unknown columns: {', '.join(unknown)}")
+    else:
+        columns = schema.names
+
+    stop = min(offset + limit, index["row_count"])
+    if offset >= stop:
+        return schema.empty_table().select(columns), index["row_count"]
+
+    first, skip = locate_row(index, offset)
+    last, _ = locate_row(index, stop - 1)
+    groups = list(range(first, last + 1))
+    tables = await load_row_groups(dataset, groups, columns, layout=(index, metadata))
+    table = pa.concat_tables([tables[g] for g in groups])
+    return table.slice(skip, stop - offset), index["row_count"]
+
+
+async def get_preview(
+    dataset: Dataset, *, page: int, page_size: int, columns: list[str] | None = None
+) -> dict:
+    """
+    One preview page as a JSON-ready payload, cached per dataset version, page and columns.
+
+    ``dataset`` may be a ``sample_view``; the payload then pages through the
+    sample and says so.
+    """
+    key = cache_key(dataset, "page", page, page_size, _columns_key(columns))
+    payload = await preview_cache.get(key)
+    if payload is not None:
+        return payload
+
+    table, total_rows = await read_rows(dataset, offset=(page - 1) * page_size, limit=page_size, columns=columns)
+    fraction = await sample_fraction(dataset)
+    payload = jsonable_encoder({
+        "columns": table.column_names,
+        "rows": table.to_pylist(),
+        "total_rows": total_rows,
+        "page": page,
+        "page_size": page_size,
+        "sampled": fraction is not None,
+        "sample_fraction": fraction,
+    }, custom_encoder=ROW_ENCODERS)
+    await preview_cache.set(key, payload)
+    return payload
@@ -0,0 +1,195 @@
+"""
+Direct-to-storage uploads — the client PUTs/POSTs bytes straight to S3.
+
+The API only reserves a key, signs URLs and, on completion, checks the stored
+object's size and ETag with a HEAD request. It never reads the payload;
+content sniffing happens in the extraction worker.
+
+The bucket's CORS rules must expose the ``ETag`` header to browsers.
+"""
+import math
+import os
+import uuid
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.redis import get_redis
+from app.core.storage import (
+    MIN_PART_SIZE, create_multipart_upload, complete_multipart_upload,
+    abort_multipart_upload, generate_presigned_post, generate_presigned_part_urls,
+    head_object, delete_file_from_s3,
+)
+from app.core.exceptions import NotFoundError, BadRequestError, ConflictError
+from app.models.file import File
+from app.models.user import User
+from app.services.file_service import check_storage_limits, detect_file_type, create_file_record
+from app.services.upload_session_service import MAX_PARTS
+
+
+def _reservation_key(upload_id: str) -> str:
+    return f"direct_upload:{upload_id}"
+
+
+def _lock_key(upload_id: str) -> str:
+    return f"direct_upload:{upload_id}:lock"
+
+
+def _normalize_etag(etag: str | None) -> str:
+    return (etag or "").strip().strip('"')
+
+
+async def reserve_direct_upload(
+    db: AsyncSession,
+    *,
+    user: User,
+    filename: str,
+    size: int,
+    project_id: uuid.UUID | None = None,
+) -> dict:
+    """Reserve a storage key and sign the URLs the client uploads to."""
+    await check_storage_limits(user, size)
+    detection = detect_file_type(b"", filename)
+
+    if project_id is None:
+        from app.services.project_service import create_project
+        project = await create_project(db, user_id=user.id, name=filename)
+        project_id = project.id
+
+    storage_key = f"{user.id}/{project_id}/{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+    expires_in = settings.DIRECT_UPLOAD_URL_EXPIRE_SECONDS
+    upload_id = uuid.uuid4().hex
+    reservation = {
+        "user_id": str(user.id),
+        "project_id": str(project_id),
+        "filename": filename,
+        "size": str(size),
+        "storage_key": storage_key,
+        "detected_format": detection["format"],
+        "mime_type": detection["mime_type"],
+    }
+    response = {"upload_id": upload_id, "expires_in": expires_in}
+
+    if size <= settings.DIRECT_UPLOAD_SINGLE_PART_MAX_BYTES:
+        post = await generate_presigned_post(storage_key, detection["mime_type"], size, expires_in)
+        reservation["method"] = "post"
+        response.update(method="post", url=post["url"], fields=post["fields"])
+    else:
+        part_size = max(settings.UPLOAD_PART_SIZE_BYTES, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+        part_count = math.ceil(size / part_size)
+        s3_upload_id = await create_multipart_upload(storage_key, detection["mime_type"])
+        urls = await generate_presigned_part_urls(storage_key, s3_upload_id, part_count, expires_in)
+        reservation.update(method="multipart", s3_upload_id=s3_upload_id, part_count=str(part_count))
+        response.update(
+            method="multipart",
+            part_size=part_size,
+            parts=[{"part_number": n, "url": url} for n, url in enumerate(urls, start=1)],
+        )
+
+    redis = get_redis()
+    await redis.hset(_reservation_key(upload_id), mapping=reservation)
+    # Outlive the signed URLs so a slow upload can still be completed
+    await redis.expire(_reservation_key(upload_id), expires_in + settings.UPLOAD_SESSION_TTL_SECONDS)
+    return response
+
+
+async def _get_reservation(upload_id: str, user_id: uuid.UUID) -> dict:
+    reservation = await get_redis().hgetall(_reservation_key(upload_id))
+    if not reservation or reservation.get("user_id") != str(user_id):
+        raise NotFoundError("Upload reservation not found or expired")
+    return reservation
+
+
+async def complete_direct_upload(
+    db: AsyncSession,
+    *,
+    upload_id: str,
+    user_id: uuid.UUID,
+    etag: str | None = None,
+    parts: list[dict] | None = None,
+) -> tuple[File, bool]:
+    """
+    Verify the uploaded object and create its ``File`` row; returns the row
+    and whether this call created it.
+
+    Safe to repeat: the reservation records ``completed`` and ``file_id``
+    as each step succeeds and is kept until it expires, so a retry after a
+    failure picks up where it stopped and a repeat after success returns
+    the same file.
+    """
+    await _get_reservation(upload_id, user_id)
+    redis = get_redis()
+    if not await redis.set(_lock_key(upload_id), "1", nx=True, ex=300):
+        raise ConflictError("Upload is already being completed")
+
+    try:
+        # Re-read under the lock: a complete that held it before us may have finished
+        reservation = await _get_reservation(upload_id, user_id)
+        storage_key = reservation["storage_key"]
+        size = int(reservation["size"])
+
+        if reservation.get("completed") != "1":
+            if reservation["method"] == "multipart" and "etag" not in reservation:
+                if not parts or len(parts) != int(reservation["part_count"]):
+                    raise BadRequestError(f"Expected {reservation['part_count']} part ETags")
+                try:
+                    etag = await complete_multipart_upload(
+                        storage_key,
+                        reservation["s3_upload_id"],
+                        [{"PartNumber": p["part_number"], "ETag": p["etag"]} for p in parts],
+                    )
+                except Exception:
+                    raise BadRequestError("Multipart upload could not be completed; check part ETags")
+                # The upload id is spent now; a retry must not complete it again
+                await redis.hset(_reservation_key(upload_id), "etag", _normalize_etag(etag))
+                reservation["etag"] = _normalize_etag(etag)
+
+            head = await head_object(storage_key)
+            if head is None:
+                raise BadRequestError("Upload not found in storage")
+            if head["ContentLength"] != size:
+                await delete_file_from_s3(storage_key)
+                await redis.delete(_reservation_key(upload_id))
+                raise BadRequestError(f"Uploaded {head['ContentLength']} bytes, expected {size}")
+            if _normalize_etag(head["ETag"]) != _normalize_etag(reservation.get("etag", etag)):
+                raise BadRequestError("ETag mismatch")
+            await redis.hset(_reservation_key(upload_id), "completed", "1")
+
+        # The row's id is fixed before it is created, so a retry finds it instead of adding another
+        if "file_id" not in reservation:
+            reservation["file_id"] = str(uuid.uuid4())
+            await redis.hset(_reservation_key(upload_id), "file_id", reservation["file_id"])
+        file_id = uuid.UUID(reservation["file_id"])
+        file_record = await db.get(File, file_id)
+        created = file_record is None
+
+        if created:
+            file_record = await create_file_record(
+                db,
+                user_id=user_id,
+                project_id=uuid.UUID(reservation["project_id"]),
+                filename=reservation["filename"],
+                size=size,
+                detected_format=reservation["detected_format"],
+                mime_type=reservation["mime_type"],
+                storage_bucket=settings.S3_BUCKET_NAME,
+                storage_key=storage_key,
+                file_id=file_id,
+            )
+    finally:
+        await redis.delete(_lock_key(upload_id))
+
+    return file_record, created
+
+
+async def cancel_direct_upload(*, upload_id: str, user_id: uuid.UUID) -> None:
+    reservation = await _get_reservation(upload_id, user_id)
+    if reservation.get("completed") == "1":
+        raise ConflictError("Upload is already completed")
+    try:
+        if reservation["method"] == "multipart":
+            await abort_multipart_upload(reservation["storage_key"], reservation["s3_upload_id"])
+        else:
+            await delete_file_from_s3(reservation["storage_key"])
+    except Exception:
+        pass  # Best-effort; nothing may have been uploaded yet
+    await get_redis().delete(_reservation_key(upload_id))
@@ -0,0 +1,127 @@
+"""
+Processing-time estimator — fitted from measured extraction runs.
+
+Each finished extraction records its stage durations (``ExtractionRun``).
+The estimator fits, per format, ``seconds = intercept + slope * bytes`` with
+Postgres' ``regr_*`` aggregates and keeps a median per (format, size bucket)
+for buckets with enough history. The fit is cached in-process and refreshed
+every ``ESTIMATOR_REFRESH_SECONDS``; until a format has data, the static
+table in ``file_service.estimate_processing_time`` is used.
+"""
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.extraction_run import ExtractionRun
+from app.services.file_service import estimate_processing_time
+
+ESTIMATOR_REFRESH_SECONDS = 300
+HISTORY_DAYS = 30
+MIN_SAMPLES = 20
+TOTAL_STAGE = "total"
+
+# Poll roughly ten times over the expected run, within sane bounds
+MIN_POLL_SECONDS = 1
+MAX_POLL_SECONDS = 30
+
+
+def size_bucket(size_bytes: int) -> int:
+    """Power-of-two size bucket in MB: <2 MB → 0, 2–4 MB → 1, 4–8 MB → 2, …"""
+    mb = size_bytes / (1024 * 1024)
+    return int(math.log2(mb)) if mb >= 1 else 0
+
+
+class ProcessingTimeEstimator:
+    def __init__(self, linear: dict[str, tuple[float, float]], buckets: dict[tuple[str, int], float]):
+        self.linear = linear
+        self.buckets = buckets
+        self.fitted_at = time.monotonic()
+
+    def estimate(self, fmt: str, size_bytes: int) -> int:
+        median = self.buckets.get((fmt, size_bucket(size_bytes)))
+        if median is not None:
+            return max(1, round(median))
+        fit = self.linear.get(fmt)
+        if fit is not None:
+            intercept, slope = fit
+            return max(1, round(intercept + slope * size_bytes))
+        return estimate_processing_time(fmt, size_bytes)
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.fitted_at > ESTIMATOR_REFRESH_SECONDS
+
+
+_estimator: ProcessingTimeEstimator | None = None
+_refresh_lock = asyncio.Lock()
+
+
+async def _fit(db: AsyncSession) -> ProcessingTimeEstimator:
+    since = datetime.now(timezone.utc) - timedelta(days=HISTORY_DAYS)
+    recent = (ExtractionRun.stage == TOTAL_STAGE, ExtractionRun.created_at >= since)
+    seconds = ExtractionRun.duration_ms / 1000.0
+
+    linear_result = await db.execute(
+        select(
+            ExtractionRun.detected_format,
+            func.regr_intercept(seconds, ExtractionRun.file_size_bytes),
+            func.regr_slope(seconds, ExtractionRun.file_size_bytes),
+            func.count(),
+        )
+        .where(*recent)
+        .group_by(ExtractionRun.detected_format)
+    )
+    linear = {
+        fmt: (intercept, slope)
+        for fmt, intercept, slope, n in linear_result.all()
+        if n >= MIN_SAMPLES and intercept is not None and slope is not None
+    }
+
+    bucket_result = await db.execute(
+        select(
+            ExtractionRun.detected_format,
+            ExtractionRun.size_bucket,
+            func.percentile_cont(0.5).within_group(seconds),
+            func.count(),
+        )
+        .where(*recent)
+        .group_by(ExtractionRun.detected_format, ExtractionRun.size_bucket)
+    )
+    buckets = {
+        (fmt, bucket): median
+        for fmt, bucket, median, n in bucket_result.all()
+        if n >= MIN_SAMPLES
+    }
+    return ProcessingTimeEstimator(linear, buckets)
+
+
+async def get_processing_estimator(db: AsyncSession) -> ProcessingTimeEstimator:
+    """Return the cached estimator, refitting it when stale."""
+    global _estimator
+    if _estimator is None or _estimator.is_stale():
+        async with _refresh_lock:
+            if _estimator is None or _estimator.is_stale():
+                try:
+                    _estimator = await _fit(db)
+                except Exception:
+                    # The failed query leaves the caller's transaction aborted; reset it
+                    await db.rollback()
+                    # Keep serving the previous fit (or the static table) on DB trouble
+                    if _estimator is None:
+                        _estimator = ProcessingTimeEstimator({}, {})
+                    else:
+                        _estimator.fitted_at = time.monotonic()
+    return _estimator
+
+
+def suggest_poll_interval(estimated_seconds: int) -> int:
+    return min(MAX_POLL_SECONDS, max(MIN_POLL_SECONDS, round(estimated_seconds / 10)))
+
+
+async def estimate_upload_timing(db: AsyncSession, fmt: str, size_bytes: int) -> tuple[int, int]:
+    """Return ``(estimated_seconds, poll_interval_seconds)`` for a new upload."""
+    estimator = await get_processing_estimator(db)
+    seconds = estimator.estimate(fmt, size_bytes)
+    return seconds, suggest_poll_interval(seconds)
@@ -0,0 +1,171 @@
+"""
+Extraction cache — reuse the outputs of an earlier extraction of the same bytes.
+
+Entries are keyed by (user, content hash, format, engine version, options
+hash). ``options`` are the inputs besides the bytes that shape the output:
+the sniffed format hints and the engine settings in effect. Bumping a
+format's entry in ``app.extraction.ENGINE_VERSIONS`` makes older entries
+unreachable. Entries are scoped to the user, as upload deduplication is, so
+timing never reveals whether someone else uploaded the same content.
+
+A hit clones the cached dataset rows onto the new file, and adds them to the
+new file's project search index; the Parquet objects and search segments
+themselves are shared, never copied.
+"""
+import hashlib
+import json
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.extraction import ENGINE_VERSIONS
+from app.models.dataset import Dataset
+from app.models.extraction_cache import ExtractionCacheEntry
+from app.models.file import File
+from app.services.search_service import add_segment
+
+# Settings that change what an engine produces, per format
+_ENGINE_SETTINGS = {
+    "csv": ("SCHEMA_SAMPLE_ROWS", "SCHEMA_RESERVOIR_SIZE"),
+    "tsv": ("SCHEMA_SAMPLE_ROWS", "SCHEMA_RESERVOIR_SIZE"),
+    "excel": ("SCHEMA_SAMPLE_ROWS", "SCHEMA_RESERVOIR_SIZE"),
+    "pdf": (),
+    "json": (
+        "SCHEMA_SAMPLE_ROWS", "SCHEMA_RESERVOIR_SIZE",
+        "JSON_MAX_DEPTH", "JSON_ARRAY_MODE", "JSON_EXPLODE_PATH",
+    ),
+}
+
+# Per-run details that must not be replayed onto a cache hit
+_RUN_METADATA = ("timings_ms", "deduplicated_from", "cache_hit")
+
+
+def options_hash(file: File) -> str:
+    options = {
+        "hints": file.format_hints or {},
+        "settings": {name: getattr(settings, name) for name in _ENGINE_SETTINGS[file.detected_format]},
+    }
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _key(file: File) -> dict | None:
+    """Cache key columns for ``file``, or None when it can't be cached (no hash, no real engine)."""
+    if not file.content_sha256 or file.detected_format not in ENGINE_VERSIONS:
+        return None
+    return {
+        "user_id": file.user_id,
+        "content_sha256": file.content_sha256,
+        "detected_format": file.detected_format,
+        "extractor_version": ENGINE_VERSIONS[file.detected_format],
+        "options_hash": options_hash(file),
+    }
+
+
+async def attach_cached_extraction(db: AsyncSession, *, file: File) -> list[Dataset] | None:
+    """
+    On a hit, add dataset rows for ``file`` pointing at the cached Parquet
+    objects and fill in its extraction fields (not committed). None on a miss.
+    """
+    key = _key(file)
+    if key is None:
+        return None
+    result = await db.execute(
+        select(ExtractionCacheEntry).where(
+            *(getattr(ExtractionCacheEntry, column) == value for column, value in key.items()),
+            ExtractionCacheEntry.storage_bucket == file.storage_bucket,
+        )
+    )
+    entry = result.scalar_one_or_none()
+    if entry is None:
+        return None
+
+    # Dataset ids recorded in the metadata (workbook sheets) move to the new rows
+    new_ids = {output["id"]: uuid.uuid4() for output in entry.outputs}
+    metadata = dict(entry.extraction_metadata or {})
+    if "sheets" in metadata:
+        metadata["sheets"] = [
+            {**sheet, "dataset_id": str(new_ids.get(sheet["dataset_id"], sheet["dataset_id"]))}
+            for sheet in metadata["sheets"]
+        ]
+
+    datasets = [
+        Dataset(
+            id=new_ids[output["id"]],
+            file_id=file.id,
+            project_id=file.project_id,
+            name=file.original_filename + output["name_suffix"],
+            column_schema=output["column_schema"],
+            row_count=output["row_count"],
+            column_count=output["column_count"],
+            quality_score=output.get("quality_score"),
+            quality_details=output.get("quality_details"),
+            column_profile=output.get("column_profile"),
+            storage_key_parquet=output["storage_key_parquet"],
+            storage_key_sample=output.get("storage_key_sample"),
+            version=1,
+        )
+        for output in entry.outputs
+    ]
+    db.add_all(datasets)
+    for dataset, output in zip(datasets, entry.outputs):
+        if output.get("search_segment"):
+            add_segment(db, dataset=dataset, segment=output["search_segment"])
+
+    file.extracted_schema = entry.extracted_schema
+    file.extraction_metadata = {**metadata, "cache_hit": True}
+    await db.execute(
+        update(ExtractionCacheEntry)
+        .where(ExtractionCacheEntry.id == entry.id)
+        .values(hit_count=ExtractionCacheEntry.hit_count + 1, last_hit_at=datetime.now(timezone.utc))
+    )
+    return datasets
+
+
+async def store_extraction(
+    db: AsyncSession, *, file: File, datasets: list[Dataset], search_segments: dict[uuid.UUID, dict] | None = None
+) -> None:
+    """
+    Record a finished extraction (not committed). A concurrent insert of the same key wins.
+
+    ``search_segments`` maps dataset ids to their full-text segments, as
+    given to ``search_service.add_segment``.
+    """
+    key = _key(file)
+    if key is None:
+        return
+    outputs = [
+        {
+            "id": str(d.id),
+            # Names are derived from the upload's filename; keep only what follows it
+            "name_suffix": d.name.removeprefix(file.original_filename),
+            "column_schema": d.column_schema,
+            "row_count": d.row_count,
+            "column_count": d.column_count,
+            "quality_score": d.quality_score,
+            "quality_details": d.quality_details,
+            "column_profile": d.column_profile,
+            "storage_key_parquet": d.storage_key_parquet,
+            "storage_key_sample": d.storage_key_sample,
+            "search_segment": (search_segments or {}).get(d.id),
+        }
+        for d in datasets
+    ]
+    metadata = {k: v for k, v in (file.extraction_metadata or {}).items() if k not in _RUN_METADATA}
+    await db.execute(
+        insert(ExtractionCacheEntry)
+        .values(
+            id=uuid.uuid4(),
+            **key,
+            storage_bucket=file.storage_bucket,
+            outputs=outputs,
+            extracted_schema=file.extracted_schema,
+            extraction_metadata=metadata,
+            source_file_id=file.id,
+            hit_count=0,
+            created_at=datetime.now(timezone.utc),
+        )
+        .on_conflict_do_nothing(constraint="uq_extraction_cache_key")
+    )
@@ -0,0 +1,197 @@
+"""
+Content-sniffing file detector — magic bytes first, then text analysis.
+
+Only the first ``SNIFF_BYTES`` of a file are inspected. For delimited text the
+detector also works out the encoding, delimiter, quote character and whether
+the first row is a header, and returns them as ``hints`` so the extractor can
+open the file with the right options instead of re-detecting them.
+"""
+import codecs
+import csv
+import json
+import os
+from collections import Counter
+
+SNIFF_BYTES = 16 * 1024
+
+# (signature, offset, format, mime type). Containers that no extractor reads
+# are recognized for their mime type but get no format of their own.
+_MAGIC = [
+    (b"%PDF-", 0, "pdf", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", 0, "image", "image/png"),
+    (b"\xff\xd8\xff", 0, "image", "image/jpeg"),
+    (b"GIF87a", 0, "image", "image/gif"),
+    (b"GIF89a", 0, "image", "image/gif"),
+    (b"WEBP", 8, "image", "image/webp"),
+    (b"PAR1", 0, "unknown", "application/vnd.apache.parquet"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", 0, "excel", "application/vnd.ms-excel"),
+    (b"\x1f\x8b", 0, "unknown", "application/gzip"),
+]
+
+_XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MIME = "application/zip"
+
+# Extension fallback when the content is inconclusive
+_EXTENSIONS = {
+    ".csv": ("csv", "text/csv"),
+    ".tsv": ("tsv", "text/tab-separated-values"),
+    ".xls": ("excel", "application/vnd.ms-excel"),
+    ".xlsx": ("excel", _XLSX_MIME),
+    ".pdf": ("pdf", "application/pdf"),
+    ".json": ("json", "application/json"),
+    ".ndjson": ("json", "application/x-ndjson"),
+    ".jsonl": ("json", "application/x-ndjson"),
+    ".png": ("image", "image/png"),
+    ".jpg": ("image", "image/jpeg"),
+    ".jpeg": ("image", "image/jpeg"),
+    ".webp": ("image", "image/webp"),
+}
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+_DELIMITERS = ",\t;|"
+
+
+def _result(fmt: str, mime: str, confidence: float, hints: dict | None = None) -> dict:
+    return {"format": fmt, "confidence": round(confidence, 2), "mime_type": mime, "hints": hints or {}}
+
+
+def _by_extension(filename: str, confidence: float = 0.5) -> dict:
+    ext = os.path.splitext(filename)[1].lower()
+    fmt, mime = _EXTENSIONS.get(ext, ("unknown", "application/octet-stream"))
+    return _result(fmt, mime, confidence if fmt != "unknown" else 0.0)
+
+
+def _sniff_zip(head: bytes, filename: str) -> dict:
+    # OOXML workbooks carry xl/ parts; the local headers near the start name them
+    if b"xl/" in head or os.path.splitext(filename)[1].lower() == ".xlsx":
+        return _result("excel", _XLSX_MIME, 0.95 if b"xl/" in head else 0.8)
+    return _result("unknown", ZIP_MIME, 0.95)
+
+
+def _detect_encoding(head: bytes) -> tuple[str, str] | None:
+    """Return ``(encoding, decoded_text)`` or None if the bytes look binary."""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(head, final=False)
+            return encoding, text
+
+    if b"\x00" in head:
+        return None
+
+    # Incremental decode so a multi-byte character cut off at the sniff boundary is fine
+    try:
+        return "utf-8", codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        pass
+    try:
+        return "cp1252", head.decode("cp1252")
+    except UnicodeDecodeError:
+        return "latin-1", head.decode("latin-1")
+
+
+def _complete_lines(text: str, truncated: bool) -> list[str]:
+    lines = text.splitlines()
+    # The last line is probably cut off at the sniff boundary
+    if truncated and len(lines) > 1:
+        lines = lines[:-1]
+    return [line for line in lines if line.strip()]
+
+
+def _sniff_json(lines: list[str], stripped: str) -> dict | None:
+    if stripped.startswith("["):
+        return {"json_layout": "array"}
+    if not stripped.startswith("{"):
+        return None
+    if len(lines) > 1 and all(line.lstrip().startswith("{") for line in lines[:20]):
+        try:
+            json.loads(lines[0])
+            return {"json_layout": "ndjson"}
+        except ValueError:
+            pass
+    return {"json_layout": "object"}
+
+
+def _sniff_delimited(lines: list[str]) -> dict | None:
+    sample = "\n".join(lines[:200])
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=_DELIMITERS)
+    except csv.Error:
+        return None
+
+    rows = list(csv.reader(lines[:200], delimiter=dialect.delimiter, quotechar=dialect.quotechar))
+    widths = Counter(len(r) for r in rows)
+    width, hits = widths.most_common(1)[0]
+    if width < 2:
+        return None
+    try:
+        has_header = csv.Sniffer().has_header(sample)
+    except csv.Error:
+        has_header = True
+
+    return {
+        "delimiter": dialect.delimiter,
+        "quotechar": dialect.quotechar,
+        "has_header": has_header,
+        "column_count": width,
+        # Share of sampled rows that agree on the column count
+        "consistency": hits / len(rows),
+    }
+
+
+def sniff(head: bytes, filename: str) -> dict:
+    """
+    Classify a file from its first bytes.
+
+    Returns ``{"format", "confidence", "mime_type", "hints"}`` where ``hints``
+    holds reader options (encoding, delimiter, quotechar, has_header,
+    json_layout) when they could be determined.
+    """
+    if not head:
+        return _by_extension(filename)
+
+    for signature, offset, fmt, mime in _MAGIC:
+        if head[offset:offset + len(signature)] == signature:
+            if signature == b"WEBP" and not head.startswith(b"RIFF"):
+                continue
+            return _result(fmt, mime, 0.99)
+    if head.startswith(b"PK\x03\x04"):
+        return _sniff_zip(head, filename)
+
+    decoded = _detect_encoding(head)
+    if decoded is None:
+        return _by_extension(filename, confidence=0.3)
+    encoding, text = decoded
+
+    truncated = len(head) >= SNIFF_BYTES
+    lines = _complete_lines(text, truncated)
+    stripped = text.lstrip("\ufeff \t\r\n")
+
+    json_hints = _sniff_json(lines, stripped)
+    if json_hints is not None:
+        mime = "application/x-ndjson" if json_hints["json_layout"] == "ndjson" else "application/json"
+        return _result("json", mime, 0.9, {"encoding": encoding, **json_hints})
+
+    delimited = _sniff_delimited(lines)
+    if delimited is not None:
+        fmt, mime = ("tsv", "text/tab-separated-values") if delimited["delimiter"] == "\t" else ("csv", "text/csv")
+        confidence = 0.6 + 0.35 * delimited.pop("consistency")
+        return _result(fmt, mime, confidence, {"encoding": encoding, **delimited})
+
+    # Single-column text: readable as a one-column CSV if the name says so
+    fallback = _by_extension(filename, confidence=0.4)
+    if fallback["format"] in ("csv", "tsv"):
+        fallback["hints"] = {
+            "encoding": encoding,
+            "delimiter": "\t" if fallback["format"] == "tsv" else ",",
+            "quotechar": '"',
+            "has_header": True,
+            "column_count": 1,
+        }
+    return fallback
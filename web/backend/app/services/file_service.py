@@ -2,17 +2,18 @@
 File upload service — storage, detection, record management.
 """
 import uuid
-import os
-import tempfile
-import shutil
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import UploadFile
+from sqlalchemy.orm import undefer
 
 from app.models.file import File
+from app.models.dataset import Dataset
 from app.models.user import User
-from app.core.storage import upload_file_to_s3, delete_file_from_s3
+from app.core.storage import delete_file_from_s3
 from app.core.exceptions import NotFoundError, ForbiddenError, StorageLimitError
+from app.core.pagination import Page, paginate
+from app.services.file_detector import sniff
+from app.services.search_service import copy_segments
 
 # Tier storage limits (bytes)
 TIER_LIMITS = {
@@ -32,35 +33,9 @@ async def check_storage_limits(user: User, file_size: int) -> None:
         )
 
 
-async def stream_to_temp(upload: UploadFile) -> str:
-    """Stream uploaded file to a temporary location."""
-    suffix = os.path.splitext(upload.filename or "file")[1]
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    try:
-        shutil.copyfileobj(upload.file, tmp)
-    finally:
-        tmp.close()
-    return tmp.name
-
-
-def detect_file_type(file_path: str, filename: str) -> dict:
-    """Basic file-type detection by extension (placeholder for magic-byte detection)."""
-    ext = os.path.splitext(filename)[1].lower()
-    format_map = {
-        ".csv": ("csv", "text/csv"),
-        ".tsv": ("tsv", "text/tab-separated-values"),
-        ".xls": ("excel", "application/vnd.ms-excel"),
-        ".xlsx": ("excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
-        ".pdf": ("pdf", "application/pdf"),
-        ".json": ("json", "application/json"),
-        ".png": ("image", "image/png"),
-        ".jpg": ("image", "image/jpeg"),
-        ".jpeg": ("image", "image/jpeg"),
-        ".webp": ("image", "image/webp"),
-        ".parquet": ("parquet", "application/octet-stream"),
-    }
-    fmt, mime = format_map.get(ext, ("unknown", "application/octet-stream"))
-    return {"format": fmt, "confidence": 0.95, "mime_type": mime}
+def detect_file_type(head: bytes, filename: str) -> dict:
+    """Sniff the first bytes of a file (magic bytes, encoding, CSV dialect)."""
+    return sniff(head, filename)
 
 
 def estimate_processing_time(fmt: str, size: int) -> int:
@@ -83,15 +58,28 @@ async def create_file_record(
     mime_type: str,
     storage_bucket: str,
     storage_key: str,
+    content_sha256: str | None = None,
+    format_hints: dict | None = None,
+    charge_storage: bool = True,
+    file_id: uuid.UUID | None = None,
 ) -> File:
+    """
+    Create the ``File`` row and charge its bytes to the user's quota.
+
+    Pass ``charge_storage=False`` when the row points at an object the user
+    already owns (deduplicated upload) — the bytes are only counted once.
+    ``file_id`` lets a retried caller create the same row at most once.
+    """
     file = File(
-        id=uuid.uuid4(),
+        id=file_id or uuid.uuid4(),
         project_id=project_id,
         user_id=user_id,
         original_filename=filename,
         file_size_bytes=size,
         mime_type=mime_type,
         detected_format=detected_format,
+        content_sha256=content_sha256,
+        format_hints=format_hints,
         storage_bucket=storage_bucket,
         storage_key_original=storage_key,
         status="uploaded",
@@ -99,15 +87,123 @@ async def create_file_record(
     db.add(file)
 
     # Update user storage used
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one()
-    user.storage_used_bytes += size
+    if charge_storage:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one()
+        user.storage_used_bytes += size
 
     await db.commit()
     await db.refresh(file)
     return file
 
 
+async def create_file_records(
+    db: AsyncSession,
+    *,
+    user_id: uuid.UUID,
+    project_id: uuid.UUID,
+    storage_bucket: str,
+    entries: list[dict],
+) -> list[File]:
+    """
+    Insert many ``File`` rows and charge their bytes in one transaction.
+
+    Each entry carries ``filename``, ``size``, ``detected_format``,
+    ``mime_type``, ``storage_key`` and optionally ``content_sha256``,
+    ``format_hints`` and ``charge_storage`` (see ``create_file_record``).
+    """
+    files = [
+        File(
+            id=uuid.uuid4(),
+            project_id=project_id,
+            user_id=user_id,
+            original_filename=e["filename"],
+            file_size_bytes=e["size"],
+            mime_type=e["mime_type"],
+            detected_format=e["detected_format"],
+            content_sha256=e.get("content_sha256"),
+            format_hints=e.get("format_hints"),
+            storage_bucket=storage_bucket,
+            storage_key_original=e["storage_key"],
+            status="uploaded",
+        )
+        for e in entries
+    ]
+    db.add_all(files)
+
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one()
+    user.storage_used_bytes += sum(e["size"] for e in entries if e.get("charge_storage", True))
+
+    await db.commit()
+    return files
+
+
+async def find_duplicate_file(
+    db: AsyncSession, *, user_id: uuid.UUID, content_sha256: str
+) -> File | None:
+    """Return the user's best existing copy of this content, preferring extracted ones."""
+    result = await db.execute(
+        select(File)
+        .where(File.user_id == user_id, File.content_sha256 == content_sha256)
+        .order_by((File.status == "ready").desc(), File.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def find_duplicate_files(
+    db: AsyncSession, *, user_id: uuid.UUID, content_sha256s: list[str]
+) -> dict[str, File]:
+    """``find_duplicate_file`` for many digests in one query, keyed by digest."""
+    result = await db.execute(
+        select(File)
+        .where(File.user_id == user_id, File.content_sha256.in_(content_sha256s))
+        .order_by((File.status == "ready").desc(), File.created_at.desc())
+    )
+    best: dict[str, File] = {}
+    for file in result.scalars().all():
+        best.setdefault(file.content_sha256, file)
+    return best
+
+
+async def reuse_extraction(db: AsyncSession, *, source: File, target: File) -> list[Dataset]:
+    """Attach copies of ``source``'s datasets (same Parquet objects and search segments) to ``target``."""
+    result = await db.execute(
+        select(Dataset).where(Dataset.file_id == source.id).options(undefer(Dataset.column_profile))
+    )
+    clones = {
+        d.id: Dataset(
+            id=uuid.uuid4(),
+            file_id=target.id,
+            project_id=target.project_id,
+            name=d.name,
+            description=d.description,
+            row_count=d.row_count,
+            column_count=d.column_count,
+            column_schema=d.column_schema,
+            quality_score=d.quality_score,
+            quality_details=d.quality_details,
+            column_profile=d.column_profile,
+            storage_key_parquet=d.storage_key_parquet,
+            storage_key_csv=d.storage_key_csv,
+            storage_key_sample=d.storage_key_sample,
+        )
+        for d in result.scalars().all()
+    }
+    db.add_all(clones.values())
+    await copy_segments(db, clones=clones)
+
+    target.status = "ready"
+    target.processing_progress = 100
+    target.storage_key_processed = source.storage_key_processed
+    target.format_hints = source.format_hints
+    target.extracted_schema = source.extracted_schema
+    target.extraction_metadata = {**(source.extraction_metadata or {}), "deduplicated_from": str(source.id)}
+    await db.commit()
+    return list(clones.values())
+
+
 async def get_file(
     db: AsyncSession, *, file_id: uuid.UUID, user_id: uuid.UUID
 ) -> File:
@@ -121,23 +217,25 @@ async def get_file(
 
 
 async def list_project_files(
-    db: AsyncSession, *, project_id: uuid.UUID, user_id: uuid.UUID, offset: int = 0, limit: int = 50
-) -> tuple[list[File], int]:
-    count_result = await db.execute(
-        select(func.count()).select_from(File).where(
-            File.project_id == project_id, File.user_id == user_id
-        )
-    )
-    total = count_result.scalar() or 0
-
-    result = await db.execute(
-        select(File)
-        .where(File.project_id == project_id, File.user_id == user_id)
-        .order_by(File.created_at.desc())
-        .offset(offset)
-        .limit(limit)
+    db: AsyncSession,
+    *,
+    project_id: uuid.UUID,
+    user_id: uuid.UUID,
+    limit: int = 50,
+    cursor: str | None = None,
+    offset: int = 0,
+    count: str = "exact",
+) -> Page:
+    return await paginate(
+        db,
+        select(File).where(File.project_id == project_id, File.user_id == user_id),
+        sort_column=File.created_at,
+        id_column=File.id,
+        limit=limit,
+        cursor=cursor,
+        offset=offset,
+        count=count,
     )
-    return list(result.scalars().all()), total
 
 
 async def delete_file_record(
@@ -145,11 +243,22 @@ async def delete_file_record(
 ) -> None:
     file = await get_file(db, file_id=file_id, user_id=user_id)
 
+    # Deduplicated uploads share one object; only the last reference frees it
+    shared_result = await db.execute(
+        select(func.count()).select_from(File).where(
+            File.storage_key_original == file.storage_key_original, File.id != file.id
+        )
+    )
+    if shared_result.scalar():
+        await db.delete(file)
+        await db.commit()
+        return
+
     # Clean up S3
     try:
-        await delete_file_from_s3(file.storage_bucket, file.storage_key_original)
+        await delete_file_from_s3(file.storage_key_original, bucket=file.storage_bucket)
         if file.storage_key_processed:
-            await delete_file_from_s3(file.storage_bucket, file.storage_key_processed)
+            await delete_file_from_s3(file.storage_key_processed, bucket=file.storage_bucket)
     except Exception:
         pass  # Best-effort cleanup
 
@@ -0,0 +1,95 @@
+"""
+Extraction progress events — published by workers, streamed to clients.
+
+Workers publish every progress step to a per-file Redis channel and keep the
+latest event under a snapshot key, so a client that connects mid-run (or
+after a reconnect) starts from the current state. Postgres is only written
+on state transitions (processing, ready, error); the snapshot is what the
+polling and streaming endpoints read in between.
+"""
+import asyncio
+import json
+import uuid
+from typing import AsyncIterator
+
+from app.config import settings
+from app.core.redis import get_redis, get_sync_redis
+
+FINAL_STATUSES = ("ready", "error")
+
+
+def _channel(file_id) -> str:
+    return f"progress:file:{file_id}"
+
+
+def _snapshot_key(file_id) -> str:
+    return f"progress:file:{file_id}:last"
+
+
+def publish_progress(
+    file_id: uuid.UUID,
+    *,
+    status: str,
+    progress: int,
+    error: str | None = None,
+    extraction_metadata: dict | None = None,
+) -> None:
+    """Called from the extraction worker. Best effort: a Redis outage never fails extraction."""
+    event = json.dumps({
+        "status": status,
+        "progress": progress,
+        "error": error,
+        "extraction_metadata": extraction_metadata,
+    })
+    try:
+        pipe = get_sync_redis().pipeline(transaction=False)
+        pipe.set(_snapshot_key(file_id), event, ex=settings.PROGRESS_EVENT_TTL_SECONDS)
+        pipe.publish(_channel(file_id), event)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+async def get_last_progress(file_id: uuid.UUID) -> dict | None:
+    """Latest published event, or None when the file has no live (or recent) run."""
+    event = await get_redis().get(_snapshot_key(file_id))
+    return json.loads(event) if event else None
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def stream_progress(file_id: uuid.UUID, initial: dict) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one file until it reaches a final status.
+
+    ``initial`` is the state read from Postgres when the stream was opened;
+    it is replaced by the Redis snapshot when a run has published since.
+    Heartbeat comments keep idle proxies from closing the connection.
+    """
+    pubsub = get_redis().pubsub()
+    # Subscribe before reading the snapshot so no event falls in between
+    await pubsub.subscribe(_channel(file_id))
+    try:
+        current = await get_last_progress(file_id) or initial
+        yield _sse("progress", json.dumps(current, default=str))
+        if current["status"] in FINAL_STATUSES:
+            return
+
+        loop = asyncio.get_running_loop()
+        last_sent = loop.time()
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None:
+                if loop.time() - last_sent >= settings.PROGRESS_HEARTBEAT_SECONDS:
+                    yield ": keep-alive\n\n"
+                    last_sent = loop.time()
+                continue
+            yield _sse("progress", message["data"])
+            last_sent = loop.time()
+            if json.loads(message["data"])["status"] in FINAL_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
@@ -9,6 +9,7 @@ from app.models.project import Project
 from app.models.file import File
 from app.models.dataset import Dataset
 from app.core.exceptions import NotFoundError, ForbiddenError
+from app.core.pagination import Page, paginate
 
 
 async def create_project(
@@ -38,24 +39,25 @@ async def get_project(db: AsyncSession, *, project_id: uuid.UUID, user_id: uuid.
 
 
 async def list_projects(
-    db: AsyncSession, *, user_id: uuid.UUID, offset: int = 0, limit: int = 20
-) -> tuple[list[Project], int]:
-    # Count
-    count_result = await db.execute(
-        select(func.count()).select_from(Project).where(Project.user_id == user_id)
+    db: AsyncSession,
+    *,
+    user_id: uuid.UUID,
+    limit: int = 20,
+    cursor: str | None = None,
+    offset: int = 0,
+    count: str = "exact",
+) -> Page:
+    """Most recently updated first."""
+    return await paginate(
+        db,
+        select(Project).where(Project.user_id == user_id),
+        sort_column=Project.updated_at,
+        id_column=Project.id,
+        limit=limit,
+        cursor=cursor,
+        offset=offset,
+        count=count,
     )
-    total = count_result.scalar() or 0
-
-    # Fetch
-    result = await db.execute(
-        select(Project)
-        .where(Project.user_id == user_id)
-        .order_by(Project.updated_at.desc())
-        .offset(offset)
-        .limit(limit)
-    )
-    projects = list(result.scalars().all())
-    return projects, total
 
 
 async def update_project(
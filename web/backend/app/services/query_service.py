@@ -0,0 +1,447 @@
+"""
+Dataset query service — filter, group, aggregate and sort over stored Parquet.
+
+A small JSON spec (``DatasetQueryRequest``) runs on pyarrow compute over row
+groups loaded through the dataset reader, never over the whole file:
+
+- ``where`` conditions are first checked against each row group's min/max
+  and null-count statistics; row groups that cannot match are not fetched;
+- only the columns the spec touches are read;
+- row groups are processed a window at a time, the next window downloading
+  while the current one is reduced. Aggregates are kept as mergeable
+  partials (sums, counts, minima, maxima), sorted selects as a running top
+  ``limit`` and unsorted selects stop once ``limit`` rows have matched, so
+  memory follows the window size and the result, not the dataset.
+
+With ``sample`` set the spec runs over the dataset's stored stratified
+sample instead (when it has one): counts and sums are scaled up to the full
+dataset and, like means, come with a 95% error bound in an ``<alias>_error``
+column.
+
+Results are cached per dataset version and spec.
+"""
+import asyncio
+import functools
+import hashlib
+import operator
+from dataclasses import dataclass
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from fastapi.encoders import jsonable_encoder
+
+from app.config import settings
+from app.core.exceptions import BadRequestError
+from app.core.streaming import ROW_ENCODERS
+from app.extraction.parquet import leaf_columns
+from app.models.dataset import Dataset
+from app.schemas.dataset import DatasetQueryRequest, QueryCondition
+from app.services.dataset_service import (
+    cache_key, load_layout, load_row_groups, query_cache, sample_view,
+)
+
+_COMPARISONS = {
+    "=": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+}
+
+# Partial aggregates kept per window for each function, and how partials merge
+_PARTIALS = {"count": ["count"], "sum": ["sum"], "mean": ["sum", "count"], "min": ["min"], "max": ["max"]}
+_MERGE = {"count": "sum", "count_all": "sum", "sum": "sum", "min": "min", "max": "max"}
+
+# Partial tables are merged once this many have piled up
+_MERGE_EVERY = 8
+
+# Normal quantile of the two-sided 95% interval reported for sampled estimates
+_Z_95 = 1.96
+
+
+def _value_type(data_type: pa.DataType) -> pa.DataType:
+    return data_type.value_type if pa.types.is_dictionary(data_type) else data_type
+
+
+def _typed(value, data_type: pa.DataType, column: str):
+    """``value`` converted to the column's type, as a Python object."""
+    if value is None:
+        raise BadRequestError(f"Condition on '{column}' needs a value")
+    try:
+        return pa.scalar(value).cast(_value_type(data_type)).as_py()
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        raise BadRequestError(f"Value {value!r} does not fit column '{column}'")
+
+
+def _decoded(table: pa.Table, columns) -> pa.Table:
+    """Dictionary-encoded ``columns`` cast to their value type (sorting and min/max need plain arrays)."""
+    for name in columns:
+        i = table.schema.get_field_index(name)
+        if pa.types.is_dictionary(table.schema.field(i).type):
+            table = table.set_column(i, name, pc.cast(table.column(i), table.schema.field(i).type.value_type))
+    return table
+
+
+class _Condition:
+    """One ``where`` entry, as a filter expression and as a row-group test."""
+
+    def __init__(self, spec: QueryCondition, data_type: pa.DataType):
+        self.op = spec.op
+        self.column = spec.column
+        field = pc.field(spec.column)
+        self.values: list = []
+        if spec.op == "is_null":
+            self.expression = field.is_null()
+        elif spec.op == "not_null":
+            self.expression = field.is_valid()
+        elif spec.op in ("in", "not_in"):
+            if not isinstance(spec.value, list):
+                raise BadRequestError(f"'{spec.op}' on '{spec.column}' needs a list of values")
+            self.values = [_typed(v, data_type, spec.column) for v in spec.value]
+            member = field.isin(pa.array(self.values, _value_type(data_type)))
+            self.expression = member if spec.op == "in" else ~member
+        elif spec.op == "contains":
+            if not pa.types.is_string(_value_type(data_type)):
+                raise BadRequestError(f"'contains' needs a text column; '{spec.column}' is not one")
+            if pa.types.is_dictionary(data_type):
+                field = field.cast(data_type.value_type)
+            self.expression = pc.match_substring(field, str(spec.value))
+        else:
+            self.values = [_typed(spec.value, data_type, spec.column)]
+            self.expression = _COMPARISONS[spec.op](field, pa.scalar(self.values[0], _value_type(data_type)))
+
+    def may_match(self, stats, num_rows: int) -> bool:
+        """Whether a row group with these column statistics can hold a matching row."""
+        if stats is None or self.op == "not_in":
+            return True
+        if self.op == "is_null":
+            return not stats.has_null_count or stats.null_count > 0
+        if stats.has_null_count and stats.null_count == num_rows:
+            return False  # all null: no comparison can hold
+        if not stats.has_min_max or self.op not in ("=", "<", "<=", ">", ">=", "in"):
+            return True
+        low, high = stats.min, stats.max
+        try:
+            if self.op == "<":
+                return low < self.values[0]
+            if self.op == "<=":
+                return low <= self.values[0]
+            if self.op == ">":
+                return high > self.values[0]
+            if self.op == ">=":
+                return high >= self.values[0]
+            return any(low <= v <= high for v in self.values)
+        except TypeError:
+            return True
+
+
+class _Rows:
+    """Plain selects: the first ``limit`` matches or, when sorted, the top ``limit``."""
+
+    def __init__(self, empty: pa.Table, columns: list[str], order: list[tuple[str, str]], limit: int):
+        self.empty = empty
+        self.columns = columns
+        self.order = order
+        self.limit = limit
+        self.kept: list[pa.Table] = []
+        self.matched = 0
+        self.best: pa.Table | None = None
+
+    def add(self, table: pa.Table) -> bool:
+        """Take one window of filtered rows; True once no later row can change the result."""
+        if not self.order:
+            self.kept.append(table.select(self.columns))
+            self.matched += table.num_rows
+            return self.matched >= self.limit
+        table = _decoded(table, [name for name, _ in self.order])
+        if self.best is not None:
+            table = pa.concat_tables([self.best, table])
+        if table.num_rows > self.limit:
+            table = table.take(pc.select_k_unstable(table, k=self.limit, sort_keys=self.order))
+        self.best = table
+        return False
+
+    def finish(self) -> pa.Table:
+        if self.order:
+            best = self.best if self.best is not None else _decoded(self.empty, [n for n, _ in self.order])
+            return best.sort_by(self.order).select(self.columns)
+        if not self.kept:
+            return self.empty.select(self.columns)
+        return pa.concat_tables(self.kept).slice(0, self.limit)
+
+
+def _float(array) -> pa.ChunkedArray:
+    return pc.cast(array, pa.float64())
+
+
+class _Estimator:
+    """
+    Scale-up and 95% error bounds for aggregates over a uniform sample.
+
+    ``n`` sample rows stand for ``total`` dataset rows. Counts and sums are
+    scaled by ``total / n``; their variance treats each sampled row's
+    contribution (0 outside the group) as a draw without replacement, and
+    means use the within-group variance.
+    """
+
+    def __init__(self, sample: dict):
+        self.total = sample["source_rows"]
+        self.n = sample["rows"]
+        self.fpc = max(0.0, 1 - self.n / self.total)  # finite population correction
+
+    def count(self, count) -> tuple:
+        share = pc.divide(_float(count), self.n)
+        variance = pc.multiply(share, pc.subtract(1.0, share))
+        error = pc.multiply(pc.sqrt(pc.multiply(variance, self.fpc / self.n)), self.total * _Z_95)
+        return pc.cast(pc.round(pc.multiply(_float(count), self.total / self.n)), pa.int64()), error
+
+    def sum(self, total, squares) -> tuple:
+        mean = pc.divide(_float(total), self.n)
+        variance = pc.max_element_wise(pc.subtract(pc.divide(squares, self.n), pc.multiply(mean, mean)), 0.0)
+        error = pc.multiply(pc.sqrt(pc.multiply(variance, self.fpc / self.n)), self.total * _Z_95)
+        return pc.multiply(mean, self.total), error
+
+    def mean(self, total, count, squares) -> tuple:
+        count = _float(count)
+        mean = pc.divide(_float(total), count)
+        variance = pc.max_element_wise(pc.subtract(pc.divide(squares, count), pc.multiply(mean, mean)), 0.0)
+        error = pc.multiply(pc.sqrt(pc.divide(pc.multiply(variance, self.fpc), count)), _Z_95)
+        return mean, error
+
+
+class _Aggregation:
+    """Grouped queries: per-window partial aggregates, merged as they accumulate."""
+
+    def __init__(
+        self,
+        empty: pa.Table,
+        keys: list[str],
+        aggregates: list[tuple[str, str | None, str]],
+        estimator: _Estimator | None = None,
+    ):
+        self.empty = empty
+        self.keys = keys
+        self.aggregates = aggregates
+        self.estimator = estimator
+        self.partials: dict[str, tuple] = {}  # partial column name -> (input column or [], function)
+        self.squared: list[str] = []
+        for fn, column, _ in aggregates:
+            if column is None:
+                self.partials["count_all"] = ([], "count_all")
+                continue
+            for partial in _PARTIALS[fn]:
+                self.partials[f"{column}_{partial}"] = (column, partial)
+            if estimator is not None and fn in ("sum", "mean"):
+                # Sums of squares, for the variance behind the error bounds
+                self.partials[f"__sq_{column}_sum"] = (f"__sq_{column}", "sum")
+                self.squared.append(column)
+        self.values = list(dict.fromkeys(column for _, column, _ in aggregates if column is not None))
+        self.parts: list[pa.Table] = []
+
+    def _partial(self, table: pa.Table) -> pa.Table:
+        # Keys too: each row group has its own dictionary, and partials are concatenated to merge
+        table = _decoded(table, self.keys + self.values)
+        for column in dict.fromkeys(self.squared):
+            values = _float(table.column(column))
+            table = table.append_column(f"__sq_{column}", pc.multiply(values, values))
+        part = table.group_by(self.keys).aggregate(list(self.partials.values()))
+        return part.select(self.keys + list(self.partials))
+
+    def add(self, table: pa.Table) -> bool:
+        if table.num_rows:
+            self.parts.append(self._partial(table))
+            if len(self.parts) >= _MERGE_EVERY:
+                self._merge()
+        return False
+
+    def _merge(self) -> None:
+        combined = pa.concat_tables(self.parts)
+        specs = [(name, _MERGE[partial]) for name, (_, partial) in self.partials.items()]
+        merged = combined.group_by(self.keys).aggregate(specs)
+        merged = merged.select(self.keys + [f"{name}_{fn}" for name, fn in specs])
+        self.parts = [merged.rename_columns(self.keys + list(self.partials))]
+
+    def finish(self) -> pa.Table:
+        if not self.parts:
+            # No matching rows; a query without keys still returns its one row of zero counts
+            self.parts = [self._partial(self.empty)]
+        self._merge()
+        merged = self.parts[0]
+        columns = {key: merged.column(key) for key in self.keys}
+        for fn, column, alias in self.aggregates:
+            partial = (lambda name: merged.column(f"{column}_{name}")) if column else None
+            if self.estimator is not None and fn in ("count", "sum", "mean"):
+                if fn == "count":
+                    value, error = self.estimator.count(partial("count") if column else merged.column("count_all"))
+                elif fn == "sum":
+                    value, error = self.estimator.sum(partial("sum"), merged.column(f"__sq_{column}_sum"))
+                else:
+                    value, error = self.estimator.mean(
+                        partial("sum"), partial("count"), merged.column(f"__sq_{column}_sum")
+                    )
+                columns[alias], columns[f"{alias}_error"] = value, error
+            elif column is None:
+                columns[alias] = merged.column("count_all")
+            elif fn == "mean":
+                columns[alias] = pc.divide(_float(partial("sum")), _float(partial("count")))
+            else:
+                columns[alias] = partial(_PARTIALS[fn][0])
+        return pa.Table.from_arrays(list(columns.values()), names=list(columns))
+
+
+def _aggregates(spec: DatasetQueryRequest, schema: pa.Schema) -> list[tuple[str, str | None, str]]:
+    aggregates = []
+    for agg in spec.aggregates:
+        if agg.column is None and agg.fn != "count":
+            raise BadRequestError(f"'{agg.fn}' needs a column")
+        if agg.fn in ("sum", "mean"):
+            data_type = _value_type(schema.field(agg.column).type)
+            if not (pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_decimal(data_type)):
+                raise BadRequestError(f"'{agg.fn}' needs a numeric column; '{agg.column}' is not one")
+        alias = agg.alias or (f"{agg.fn}_{agg.column}" if agg.column else "count")
+        aggregates.append((agg.fn, agg.column, alias))
+    aliases = [alias for _, _, alias in aggregates]
+    if len(set(aliases + spec.group_by)) != len(aliases) + len(spec.group_by):
+        raise BadRequestError("Aggregate aliases must be unique and differ from the group keys")
+    return aggregates
+
+
+def _check_columns(spec: DatasetQueryRequest, schema: pa.Schema) -> None:
+    referenced = [
+        *(spec.select or []),
+        *(c.column for c in spec.where),
+        *spec.group_by,
+        *(a.column for a in spec.aggregates if a.column is not None),
+    ]
+    if not (spec.group_by or spec.aggregates):
+        referenced += [o.column for o in spec.order_by]
+    unknown = [name for name in dict.fromkeys(referenced) if name not in schema.names]
+    if unknown:
+        raise BadRequestError(f"Unknown columns: {', '.join(unknown)}")
+
+
+@dataclass
+class QueryResult:
+    table: pa.Table
+    row_groups_scanned: int
+    row_groups_total: int
+    sample_fraction: float | None = None  # set when the query ran over the dataset's sample
+
+    def metadata(self) -> dict[str, str]:
+        meta = {"scanned": str(self.row_groups_scanned), "total": str(self.row_groups_total)}
+        if self.sample_fraction is not None:
+            meta["sample_fraction"] = repr(self.sample_fraction)
+        return meta
+
+    @classmethod
+    def from_cached(cls, table: pa.Table) -> "QueryResult":
+        meta = table.schema.metadata
+        fraction = meta.get(b"sample_fraction")
+        return cls(
+            table=table.replace_schema_metadata(None),
+            row_groups_scanned=int(meta[b"scanned"]),
+            row_groups_total=int(meta[b"total"]),
+            sample_fraction=float(fraction) if fraction is not None else None,
+        )
+
+
+async def execute_query(dataset: Dataset, spec: DatasetQueryRequest) -> QueryResult:
+    """
+    Run ``spec`` over the dataset, or over its sample when ``spec.sample`` is set.
+
+    Results are cached per dataset version and spec, with the scan counts
+    carried in the cached table's schema metadata.
+    """
+    if spec.sample:
+        # Small datasets have no sample; they are read whole
+        dataset = sample_view(dataset) or dataset
+    key = cache_key(dataset, "query", hashlib.sha1(spec.model_dump_json().encode()).hexdigest())
+    cached = await query_cache.get(key)
+    if cached is not None:
+        return QueryResult.from_cached(cached)
+
+    layout = await load_layout(dataset)
+    index, metadata = layout
+    sample = index.get("sample")
+    schema = metadata.schema.to_arrow_schema()
+    _check_columns(spec, schema)
+    conditions = [_Condition(c, schema.field(c.column).type) for c in spec.where]
+    expression = functools.reduce(operator.and_, [c.expression for c in conditions]) if conditions else None
+    order = [(o.column, "descending" if o.descending else "ascending") for o in spec.order_by]
+
+    if spec.group_by or spec.aggregates:
+        if spec.select:
+            raise BadRequestError("select does not apply to grouped queries; use group_by and aggregates")
+        aggregates = _aggregates(spec, schema)
+        outputs = spec.group_by + [alias for _, _, alias in aggregates]
+        unknown = [name for name, _ in order if name not in outputs]
+        if unknown:
+            raise BadRequestError(f"Grouped queries can only be ordered by their outputs: {', '.join(unknown)}")
+        values = [column for _, column, _ in aggregates if column is not None]
+        needed = list(dict.fromkeys(spec.group_by + values + [c.column for c in conditions]))
+        estimator = _Estimator(sample) if sample else None
+        reducer = _Aggregation(schema.empty_table().select(needed), spec.group_by, aggregates, estimator)
+    else:
+        columns = spec.select or schema.names
+        needed = list(dict.fromkeys(columns + [name for name, _ in order] + [c.column for c in conditions]))
+        reducer = _Rows(schema.empty_table().select(needed), columns, order, spec.limit)
+
+    leaves = leaf_columns(schema)
+
+    def may_match(g: int) -> bool:
+        group = metadata.row_group(g)
+        for condition in conditions:
+            positions = leaves[condition.column]
+            stats = group.column(positions[0]).statistics if len(positions) == 1 else None
+            if not condition.may_match(stats, group.num_rows):
+                return False
+        return True
+
+    groups = [g for g in range(metadata.num_row_groups) if may_match(g)]
+    size = max(1, settings.QUERY_WINDOW_ROW_GROUPS)
+    windows = [groups[i:i + size] for i in range(0, len(groups), size)]
+
+    def reduce(tables: dict[int, pa.Table]) -> bool:
+        table = pa.concat_tables(tables.values())
+        if expression is not None:
+            table = table.filter(expression)
+        return reducer.add(table)
+
+    async def load(window: list[int]) -> dict[int, pa.Table]:
+        # Scans fill only the local cache tier, so one large query cannot flood Redis
+        return await load_row_groups(dataset, window, needed, layout=layout, shared=False)
+
+    scanned = 0
+    pending = asyncio.ensure_future(load(windows[0])) if windows else None
+    try:
+        for i, window in enumerate(windows):
+            tables = await pending
+            pending = asyncio.ensure_future(load(windows[i + 1])) if i + 1 < len(windows) else None
+            scanned += len(window)
+            if await asyncio.to_thread(reduce, tables):
+                break
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+    result = await asyncio.to_thread(reducer.finish)
+    if isinstance(reducer, _Aggregation):
+        if order:
+            result = _decoded(result, [name for name, _ in order]).sort_by(order)
+        result = result.slice(0, spec.limit)
+
+    query = QueryResult(result, scanned, metadata.num_row_groups, sample["fraction"] if sample else None)
+    await query_cache.set(key, result.replace_schema_metadata(query.metadata()))
+    return query
+
+
+async def run_query(dataset: Dataset, spec: DatasetQueryRequest) -> dict:
+    """Run ``spec`` over the dataset; returns a JSON-ready ``DatasetQueryResponse`` payload."""
+    result = await execute_query(dataset, spec)
+    return jsonable_encoder({
+        "columns": result.table.column_names,
+        "rows": result.table.to_pylist(),
+        "row_count": result.table.num_rows,
+        "row_groups_scanned": result.row_groups_scanned,
+        "row_groups_total": result.row_groups_total,
+        "sampled": result.sample_fraction is not None,
+        "sample_fraction": result.sample_fraction,
+    }, custom_encoder=ROW_ENCODERS)
@@ -0,0 +1,254 @@
+"""
+Project search — BM25 ranking over the full-text index segments of a project.
+
+Every dataset with extracted text has one segment of postings sorted by
+term (see ``app.extraction.search_index``), registered as a
+``SearchSegment`` row. A project's term directory lists, for every term,
+the segments and row groups holding its postings; it is built once per set
+of segments (each segment's part once, ever) and cached, so a query opens
+only the segments that contain its terms and reads only those row groups.
+The datasets themselves are never scanned. Postings are scored with BM25
+over corpus statistics summed across the project's segments, and the top
+hits point back to their file, dataset, page and row.
+"""
+import asyncio
+import hashlib
+import math
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import BadRequestError
+from app.extraction.search_index import SEGMENT_SCHEMA, TEXT_COLUMNS, tokenize
+from app.models.dataset import Dataset
+from app.models.search import SearchSegment
+from app.services.dataset_service import (
+    StoredTable, load_layout, load_row_groups, read_rows, search_directory_cache,
+)
+from app.services.project_service import get_project
+
+# BM25 term-frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+# Hit text is cut to this many characters
+HIT_TEXT_CHARS = 500
+
+# Term directory of one segment; a project's adds the segment's position
+_TERMS_SCHEMA = pa.schema([pa.field("term", pa.string()), pa.field("row_group", pa.int32())])
+_DIRECTORY_SCHEMA = _TERMS_SCHEMA.append(pa.field("segment", pa.int32()))
+
+
+def add_segment(db: AsyncSession, *, dataset: Dataset, segment: dict) -> SearchSegment:
+    """
+    Add ``dataset``'s stored segment to its project's index (not committed).
+
+    ``segment`` is what extraction recorded: ``storage_key`` plus the
+    ``doc_count`` / ``total_length`` / ``term_count`` statistics.
+    """
+    row = SearchSegment(
+        id=uuid.uuid4(),
+        project_id=dataset.project_id,
+        file_id=dataset.file_id,
+        dataset_id=dataset.id,
+        storage_key=segment["storage_key"],
+        doc_count=segment["doc_count"],
+        total_length=segment["total_length"],
+        term_count=segment["term_count"],
+    )
+    db.add(row)
+    return row
+
+
+def segment_info(segment: SearchSegment) -> dict:
+    """The ``segment`` dict of ``add_segment`` for an existing row."""
+    return {
+        "storage_key": segment.storage_key,
+        "doc_count": segment.doc_count,
+        "total_length": segment.total_length,
+        "term_count": segment.term_count,
+    }
+
+
+async def copy_segments(db: AsyncSession, *, clones: dict[uuid.UUID, Dataset]) -> None:
+    """Index copies of datasets (``{source_id: clone}``) with their sources' segments (not committed)."""
+    if not clones:
+        return
+    result = await db.execute(select(SearchSegment).where(SearchSegment.dataset_id.in_(list(clones))))
+    for segment in result.scalars().all():
+        add_segment(db, dataset=clones[segment.dataset_id], segment=segment_info(segment))
+
+
+async def load_segments(
+    db: AsyncSession, *, project_id: uuid.UUID, user_id: uuid.UUID
+) -> list[tuple[SearchSegment, Dataset]]:
+    """The project's index: each segment with the dataset it indexes."""
+    await get_project(db, project_id=project_id, user_id=user_id)
+    result = await db.execute(
+        select(SearchSegment, Dataset)
+        .join(Dataset, SearchSegment.dataset_id == Dataset.id)
+        .where(SearchSegment.project_id == project_id)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+def _stored(segment: SearchSegment) -> StoredTable:
+    # Segments never change, so their version is fixed
+    return StoredTable(id=f"segment:{segment.id}", version=1, storage_key_parquet=segment.storage_key)
+
+
+def _distinct_terms(tables: dict[int, pa.Table]) -> pa.Table:
+    parts = []
+    for g, table in tables.items():
+        terms = pc.unique(table.column("term"))
+        parts.append(pa.table({"term": terms, "row_group": pa.repeat(pa.scalar(g, pa.int32()), len(terms))}))
+    return pa.concat_tables(parts) if parts else _TERMS_SCHEMA.empty_table()
+
+
+async def _segment_terms(segment: SearchSegment) -> pa.Table:
+    """Distinct terms of each row group of one segment (``term``, ``row_group``)."""
+    stored = _stored(segment)
+    layout = await load_layout(stored)
+    groups = list(range(len(layout[0]["row_groups"])))
+    # Read once per segment; the postings themselves are cached when a query needs them
+    tables = await load_row_groups(stored, groups, ["term"], layout=layout, shared=False)
+    return await asyncio.to_thread(_distinct_terms, tables)
+
+
+def _join_directory(parts: list[pa.Table]) -> pa.Table:
+    tables = [
+        table.append_column("segment", pa.repeat(pa.scalar(i, pa.int32()), table.num_rows))
+        for i, table in enumerate(parts)
+    ]
+    return pa.concat_tables(tables) if tables else _DIRECTORY_SCHEMA.empty_table()
+
+
+async def load_directory(segments: list[SearchSegment]) -> pa.Table:
+    """
+    Term directory of ``segments``: ``term``, ``row_group`` and ``segment``
+    (position in ``segments``) for every row group that holds the term.
+
+    Cached under the ids of the segments, which never change: a segment
+    added or removed makes a new entry, assembled from the per-segment parts
+    already cached, and only a new segment's terms are read from storage.
+    """
+    digest = hashlib.sha1(",".join(str(segment.id) for segment in segments).encode()).hexdigest()[:16]
+    key = f"project:{segments[0].project_id}:{digest}"
+    directory = await search_directory_cache.get(key)
+    if directory is not None:
+        return directory
+
+    keys = [f"segment:{segment.id}" for segment in segments]
+    parts = await search_directory_cache.get_many(keys)
+    missing = [(segment, k) for segment, k in zip(segments, keys) if parts[k] is None]
+    if missing:
+        built = await asyncio.gather(*(_segment_terms(segment) for segment, _ in missing))
+        built = {k: table for (_, k), table in zip(missing, built)}
+        await search_directory_cache.set_many(built)
+        parts.update(built)
+    directory = await asyncio.to_thread(_join_directory, [parts[k] for k in keys])
+    await search_directory_cache.set(key, directory)
+    return directory
+
+
+def _locate(directory: pa.Table, terms: list[str]) -> dict[int, list[int]]:
+    """``{segment: row_groups}`` holding any of ``terms``."""
+    found = directory.filter(pc.is_in(directory.column("term"), pa.array(terms)))
+    pairs = found.group_by(["segment", "row_group"]).aggregate([])
+    located: dict[int, list[int]] = {}
+    for segment, group in zip(pairs.column("segment").to_pylist(), pairs.column("row_group").to_pylist()):
+        located.setdefault(segment, []).append(group)
+    return {segment: sorted(groups) for segment, groups in located.items()}
+
+
+async def _postings(segment: SearchSegment, groups: list[int], terms: list[str]) -> pa.Table:
+    """Postings of ``terms`` in row groups ``groups`` of one segment."""
+    stored = _stored(segment)
+    tables = await load_row_groups(stored, groups, SEGMENT_SCHEMA.names)
+    table = pa.concat_tables([tables[g] for g in groups])
+    return table.filter(pc.is_in(table.column("term"), pa.array(terms)))
+
+
+def _rank(postings: dict[int, pa.Table], terms: list[str], doc_count: int, avg_length: float, limit: int):
+    """Top ``limit`` (segment, row, page, score) by BM25, and the number of matching rows."""
+    tables = [
+        table.append_column("segment", pa.repeat(pa.scalar(i, pa.int32()), table.num_rows))
+        for i, table in postings.items()
+    ]
+    if not tables:
+        return [], 0
+    # Postings read back from storage lose the schema's not-null flags
+    table = pa.concat_tables(tables, promote_options="permissive")
+    if not table.num_rows:
+        return [], 0
+
+    # Document frequency of each term across the whole project
+    counts = table.group_by("term").aggregate([("term", "count")])
+    frequencies = dict(zip(counts.column("term").to_pylist(), counts.column("term_count").to_pylist()))
+    idf = pa.array([
+        math.log(1 + (doc_count - frequencies.get(term, 0) + 0.5) / (frequencies.get(term, 0) + 0.5))
+        for term in terms
+    ])
+    weight = pc.take(idf, pc.index_in(table.column("term"), pa.array(terms)))
+    tf = pc.cast(table.column("tf"), pa.float64())
+    norm = pc.add(K1 * (1 - B), pc.multiply(pc.cast(table.column("length"), pa.float64()), K1 * B / avg_length))
+    scores = pc.multiply(weight, pc.divide(pc.multiply(tf, K1 + 1), pc.add(tf, norm)))
+
+    rows = (
+        table.select(["segment", "row", "page"])
+        .append_column("score", scores)
+        .group_by(["segment", "row"])
+        .aggregate([("score", "sum"), ("page", "min")])
+    )
+    order = [("score_sum", "descending")]
+    top = rows.take(pc.select_k_unstable(rows, k=min(limit, rows.num_rows), sort_keys=order)).sort_by(order)
+    return top.to_pylist(), rows.num_rows
+
+
+async def _hit_text(dataset: Dataset, row: int) -> str | None:
+    column = next((name for name in TEXT_COLUMNS if name in dataset.column_schema), None)
+    if column is None:
+        return None
+    table, _ = await read_rows(dataset, offset=row, limit=1, columns=[column])
+    text = table.column(0)[0].as_py() if table.num_rows else None
+    return text[:HIT_TEXT_CHARS] if text else text
+
+
+async def search_segments(segments: list[tuple[SearchSegment, Dataset]], query: str, *, limit: int) -> dict:
+    """Rank the rows of ``segments`` against ``query``; returns a JSON-ready ``SearchResponse`` payload."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        raise BadRequestError("Query has no searchable words")
+    payload = {"query": query, "terms": terms, "hits": [], "total_hits": 0, "segments_searched": len(segments)}
+    doc_count = sum(segment.doc_count for segment, _ in segments)
+    if not doc_count:
+        return payload
+    avg_length = sum(segment.total_length for segment, _ in segments) / doc_count
+
+    # Ordered by id, so the same set of segments always has the same directory
+    segments = sorted(segments, key=lambda pair: str(pair[0].id))
+    directory = await load_directory([segment for segment, _ in segments])
+    located = await asyncio.to_thread(_locate, directory, terms)
+    tables = await asyncio.gather(*(
+        _postings(segments[i][0], groups, terms) for i, groups in located.items()
+    ))
+    postings = dict(zip(located, tables))
+    top, total = await asyncio.to_thread(_rank, postings, terms, doc_count, avg_length, limit)
+    texts = await asyncio.gather(*(_hit_text(segments[hit["segment"]][1], hit["row"]) for hit in top))
+
+    payload["total_hits"] = total
+    for hit, text in zip(top, texts):
+        segment, dataset = segments[hit["segment"]]
+        payload["hits"].append({
+            "file_id": segment.file_id,
+            "dataset_id": dataset.id,
+            "dataset_name": dataset.name,
+            "page": hit["page_min"],
+            "row": hit["row"],
+            "score": hit["score_sum"],
+            "text": text,
+        })
+    return payload
@@ -0,0 +1,215 @@
+"""
+Resumable upload service — chunked sessions backed by Redis and S3 multipart.
+
+Each chunk maps 1:1 onto an S3 multipart part, so chunks can arrive in any
+order (or in parallel) and a client can resume by asking which chunks the
+server already holds. Session state lives in Redis and expires on its own.
+"""
+import hashlib
+import json
+import math
+import os
+import uuid
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.redis import get_redis
+from app.core.storage import (
+    MAX_PART_SIZE, MIN_PART_SIZE, create_multipart_upload, upload_part,
+    complete_multipart_upload, abort_multipart_upload, read_object_range,
+)
+from app.core.exceptions import NotFoundError, BadRequestError, ConflictError
+from app.models.file import File
+from app.models.user import User
+from app.services.file_service import check_storage_limits, detect_file_type, create_file_record
+from app.services.file_detector import SNIFF_BYTES
+
+# S3 allows at most 10,000 parts per multipart upload
+MAX_PARTS = 10_000
+
+
+def _session_key(session_id: str) -> str:
+    return f"upload_session:{session_id}"
+
+
+def _parts_key(session_id: str) -> str:
+    return f"upload_session:{session_id}:parts"
+
+
+def _lock_key(session_id: str) -> str:
+    return f"upload_session:{session_id}:lock"
+
+
+def _total_chunks(session: dict) -> int:
+    return max(1, math.ceil(int(session["size"]) / int(session["chunk_size"])))
+
+
+async def create_upload_session(
+    db: AsyncSession,
+    *,
+    user: User,
+    filename: str,
+    size: int,
+    project_id: uuid.UUID | None = None,
+    chunk_size: int | None = None,
+) -> dict:
+    await check_storage_limits(user, size)
+
+    # Each chunk is held in memory while it is received, and is one S3 part
+    max_chunk_size = min(settings.UPLOAD_MAX_CHUNK_BYTES, MAX_PART_SIZE)
+    if math.ceil(size / MAX_PARTS) > max_chunk_size:
+        raise BadRequestError("File is too large for a resumable upload; use a direct upload")
+    chunk_size = min(
+        max(chunk_size or settings.UPLOAD_PART_SIZE_BYTES, MIN_PART_SIZE, math.ceil(size / MAX_PARTS)),
+        max_chunk_size,
+    )
+    # Provisional, from the name only; finalize re-sniffs the assembled content
+    detection = detect_file_type(b"", filename)
+
+    if project_id is None:
+        from app.services.project_service import create_project
+        project = await create_project(db, user_id=user.id, name=filename)
+        project_id = project.id
+
+    storage_key = f"{user.id}/{project_id}/{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+    upload_id = await create_multipart_upload(storage_key, detection["mime_type"])
+
+    session_id = uuid.uuid4().hex
+    session = {
+        "session_id": session_id,
+        "user_id": str(user.id),
+        "project_id": str(project_id),
+        "filename": filename,
+        "size": str(size),
+        "chunk_size": str(chunk_size),
+        "storage_key": storage_key,
+        "upload_id": upload_id,
+        "mime_type": detection["mime_type"],
+    }
+    redis = get_redis()
+    await redis.hset(_session_key(session_id), mapping=session)
+    await redis.expire(_session_key(session_id), settings.UPLOAD_SESSION_TTL_SECONDS)
+    return session
+
+
+async def get_upload_session(*, session_id: str, user_id: uuid.UUID) -> dict:
+    session = await get_redis().hgetall(_session_key(session_id))
+    if not session or session.get("user_id") != str(user_id):
+        raise NotFoundError("Upload session not found or expired")
+    return session
+
+
+async def list_received_chunks(session_id: str) -> list[int]:
+    received = await get_redis().hkeys(_parts_key(session_id))
+    return sorted(int(i) for i in received)
+
+
+async def upload_session_chunk(
+    *,
+    session_id: str,
+    user_id: uuid.UUID,
+    offset: int,
+    body: bytes,
+    checksum: str,
+) -> tuple[dict, int]:
+    """Store one chunk. Returns the session and the chunk index it landed in."""
+    session = await get_upload_session(session_id=session_id, user_id=user_id)
+    size = int(session["size"])
+    chunk_size = int(session["chunk_size"])
+
+    if offset % chunk_size != 0 or offset >= size:
+        raise BadRequestError(f"Offset must be a multiple of {chunk_size} below {size}")
+    index = offset // chunk_size
+    expected = min(chunk_size, size - offset)
+    if len(body) != expected:
+        raise BadRequestError(f"Chunk at offset {offset} must be {expected} bytes, got {len(body)}")
+
+    digest = hashlib.sha256(body).hexdigest()
+    if digest != checksum.strip().lower():
+        raise BadRequestError("Chunk checksum mismatch")
+
+    redis = get_redis()
+    existing = await redis.hget(_parts_key(session_id), str(index))
+    if existing is None or json.loads(existing)["sha256"] != digest:
+        etag = await upload_part(session["storage_key"], session["upload_id"], index + 1, body)
+        await redis.hset(_parts_key(session_id), str(index), json.dumps({"etag": etag, "sha256": digest}))
+
+    # Keep the session alive while chunks keep arriving
+    await redis.expire(_session_key(session_id), settings.UPLOAD_SESSION_TTL_SECONDS)
+    await redis.expire(_parts_key(session_id), settings.UPLOAD_SESSION_TTL_SECONDS)
+    return session, index
+
+
+async def finalize_upload_session(
+    db: AsyncSession, *, session_id: str, user_id: uuid.UUID
+) -> File:
+    """
+    Stitch all chunks into one object and create the ``File`` row.
+
+    Safe to retry: each step is recorded on the session (``completed``,
+    ``file_id``) before the next one runs, so a finalize that failed part
+    way picks up where it stopped. The session is removed while the lock is
+    still held, so a concurrent finalize finds it gone rather than
+    completing the upload twice.
+    """
+    await get_upload_session(session_id=session_id, user_id=user_id)
+    redis = get_redis()
+    if not await redis.set(_lock_key(session_id), "1", nx=True, ex=300):
+        raise ConflictError("Upload session is already being finalized")
+
+    try:
+        # Re-read under the lock: a finalize that held it before us may have finished
+        session = await get_upload_session(session_id=session_id, user_id=user_id)
+
+        if session.get("completed") != "1":
+            parts = await redis.hgetall(_parts_key(session_id))
+            total = _total_chunks(session)
+            missing = sorted(set(range(total)) - {int(i) for i in parts})
+            if missing:
+                raise BadRequestError(f"Missing chunks: {missing[:20]}")
+
+            await complete_multipart_upload(
+                session["storage_key"],
+                session["upload_id"],
+                [{"PartNumber": int(i) + 1, "ETag": json.loads(p)["etag"]} for i, p in parts.items()],
+            )
+            await redis.hset(_session_key(session_id), "completed", "1")
+
+        # The row's id is fixed before it is created, so a retry finds it instead of adding another
+        if "file_id" not in session:
+            session["file_id"] = str(uuid.uuid4())
+            await redis.hset(_session_key(session_id), "file_id", session["file_id"])
+        file_id = uuid.UUID(session["file_id"])
+        file_record = await db.get(File, file_id)
+
+        if file_record is None:
+            head = await read_object_range(session["storage_key"], 0, SNIFF_BYTES)
+            detection = detect_file_type(head, session["filename"])
+            file_record = await create_file_record(
+                db,
+                user_id=user_id,
+                project_id=uuid.UUID(session["project_id"]),
+                filename=session["filename"],
+                size=int(session["size"]),
+                detected_format=detection["format"],
+                mime_type=detection["mime_type"],
+                storage_bucket=settings.S3_BUCKET_NAME,
+                storage_key=session["storage_key"],
+                format_hints=detection["hints"],
+                file_id=file_id,
+            )
+
+        await redis.delete(_session_key(session_id), _parts_key(session_id))
+    finally:
+        await redis.delete(_lock_key(session_id))
+
+    return file_record
+
+
+async def abort_upload_session(*, session_id: str, user_id: uuid.UUID) -> None:
+    session = await get_upload_session(session_id=session_id, user_id=user_id)
+    try:
+        await abort_multipart_upload(session["storage_key"], session["upload_id"])
+    except Exception:
+        pass  # Best-effort; the multipart upload may already be gone
+    await get_redis().delete(_session_key(session_id), _parts_key(session_id))
@@ -2,6 +2,7 @@
 Celery application configuration.
 """
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown, worker_shutdown
 from app.config import settings
 
 celery_app = Celery(
@@ -28,4 +29,22 @@ celery_app.conf.update(
     result_expires=3600,
     task_soft_time_limit=300,
     task_time_limit=600,
+    # Extraction has its own workers: a threads pool, so it can fan pages and
+    # sheets out to a process pool (see app.extraction.pool)
+    task_routes={"app.tasks.extraction.process_file_extraction": {"queue": "extraction"}},
 )
+
+
+@worker_init.connect
+def _use_null_pool(**kwargs):
+    from app.core.database import use_null_pool
+    use_null_pool()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _close_pools(**kwargs):
+    from app.core.storage import shutdown_storage
+    from app.extraction.pool import shutdown_process_pool
+    shutdown_storage()
+    shutdown_process_pool()
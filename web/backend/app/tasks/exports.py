@@ -25,13 +25,15 @@ async def _export(dataset_id: str, export_format: str):
         if dataset is None:
             return None
 
+        # The stored Parquet file is already the export; its key is owned by extraction
+        if export_format == "parquet":
+            return dataset.storage_key_parquet
+
         # In production: load parquet, convert to target format, upload to S3
         storage_key = f"exports/{dataset_id}/{uuid.uuid4()}.{export_format}"
 
         if export_format == "csv":
             dataset.storage_key_csv = storage_key
-        elif export_format == "parquet":
-            dataset.storage_key_parquet = storage_key
 
         await db.commit()
         return storage_key
@@ -1,10 +1,18 @@
 """
 File extraction Celery task — parse uploaded files into structured datasets.
 """
+import os
+import json
 import uuid
+import time
 import asyncio
+import functools
+import tempfile
+from contextlib import contextmanager
 from app.tasks import celery_app
 
+SUPPORTED_FORMATS = ("csv", "tsv", "excel", "pdf", "image", "json")
+
 
 def _run_async(coro):
     """Helper to run async code from sync Celery tasks."""
@@ -15,99 +23,570 @@ def _run_async(coro):
         loop.close()
 
 
-async def _process(file_id: str):
+class StageTimer:
+    """Collects wall-clock durations of extraction stages (in ms)."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.durations: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0) + int((time.monotonic() - start) * 1000)
+
+    def finish(self) -> dict[str, int]:
+        self.durations["total"] = int((time.monotonic() - self.started) * 1000)
+        return self.durations
+
+
+def _record_runs(db, file, durations: dict[str, int]) -> None:
+    """Persist stage timings; they feed the processing-time estimator."""
+    from app.models.extraction_run import ExtractionRun
+    from app.services.estimator_service import size_bucket
+
+    db.add_all([
+        ExtractionRun(
+            id=uuid.uuid4(),
+            file_id=file.id,
+            detected_format=file.detected_format,
+            file_size_bytes=file.file_size_bytes,
+            size_bucket=size_bucket(file.file_size_bytes),
+            stage=stage,
+            duration_ms=ms,
+        )
+        for stage, ms in durations.items()
+    ])
+
+
+def _report(file, progress: int) -> None:
+    """Publish a mid-run step. Not committed: Postgres only sees state transitions."""
+    from app.services.progress_service import publish_progress
+
+    file.processing_progress = progress
+    publish_progress(file.id, status=file.status, progress=progress)
+
+
+def _publish_state(file) -> None:
+    """Publish a committed state transition (processing, ready, error)."""
+    from app.services.progress_service import publish_progress
+
+    publish_progress(
+        file.id,
+        status=file.status,
+        progress=file.processing_progress,
+        error=file.error_message,
+        extraction_metadata=file.extraction_metadata,
+    )
+
+
+def _placeholder_schema(**types: str) -> dict:
+    """``column_schema`` entries for formats without a real engine yet."""
+    return {name: {"type": t, "nullable": True, "null_count": None, "confidence": 0.0} for name, t in types.items()}
+
+
+def _temp_path(suffix: str) -> str:
+    from app.config import settings
+
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=settings.EXTRACTION_TMP_DIR)
+    os.close(fd)
+    return path
+
+
+def _remove(*paths: str) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+async def _upload_parquet(local_path: str, parquet_key: str, *, bucket: str | None, **index_extra) -> None:
+    """Upload a finished Parquet file together with its row index sidecar."""
+    from app.core.storage import upload_file_to_s3, upload_path_to_s3
+    from app.extraction.parquet import PARQUET_MIME, ROW_INDEX_MIME, build_row_index, index_key
+
+    index = await asyncio.to_thread(build_row_index, local_path)
+    await upload_path_to_s3(local_path, parquet_key, PARQUET_MIME, bucket=bucket)
+    await upload_file_to_s3(
+        json.dumps({**index, **index_extra}, default=str).encode(), index_key(parquet_key), ROW_INDEX_MIME,
+        bucket=bucket,
+    )
+
+
+async def _upload_dataset(local_path: str, parquet_key: str, *, bucket: str | None) -> str | None:
+    """
+    Upload a dataset's Parquet file and, for large datasets, its stratified sample.
+
+    The sample is drawn while the full file uploads. Returns the sample's
+    storage key, or None when the dataset is small enough to read whole.
+    """
+    from app.config import settings
+    from app.extraction.parquet import build_sample, sample_key
+
+    sample_path = _temp_path(".parquet")
+    try:
+        _, sample = await asyncio.gather(
+            _upload_parquet(local_path, parquet_key, bucket=bucket),
+            asyncio.to_thread(
+                build_sample,
+                local_path,
+                sample_path,
+                rows=settings.DATASET_SAMPLE_ROWS,
+                row_group_rows=settings.DATASET_SAMPLE_ROW_GROUP_ROWS,
+            ),
+        )
+        if sample is None:
+            return None
+        key = sample_key(parquet_key)
+        await _upload_parquet(sample_path, key, bucket=bucket, sample=sample)
+        return key
+    finally:
+        _remove(sample_path)
+
+
+async def _upload_search_segment(local_path: str, parquet_key: str, *, bucket: str | None) -> dict | None:
+    """
+    Index the dataset's text into a full-text segment stored next to it.
+
+    Returns the segment's ``storage_key`` and statistics for
+    ``search_service.add_segment``, or None when the dataset has no text.
+    """
+    from app.config import settings
+    from app.extraction.search_index import build_segment, segment_key
+
+    segment_path = _temp_path(".parquet")
+    try:
+        stats = await asyncio.to_thread(
+            build_segment, local_path, segment_path, row_group_rows=settings.SEARCH_SEGMENT_ROW_GROUP_ROWS
+        )
+        if stats is None:
+            return None
+        key = segment_key(parquet_key)
+        await _upload_parquet(segment_path, key, bucket=bucket)
+        return {"storage_key": key, **stats}
+    finally:
+        _remove(segment_path)
+
+
+async def _extract_delimited(file, parquet_key: str) -> dict:
+    """Stream the original object through the CSV engine and upload the Parquet output."""
+    from app.config import settings
+    from app.core.storage import open_object_stream
+    from app.extraction.tabular import extract_delimited
+
+    hints = {"delimiter": "\t" if file.detected_format == "tsv" else ",", **(file.format_hints or {})}
+    local_path = _temp_path(".parquet")
+    try:
+        result = await asyncio.to_thread(
+            extract_delimited,
+            functools.partial(open_object_stream, file.storage_key_original, bucket=file.storage_bucket),
+            local_path,
+            hints=hints,
+            block_size=settings.EXTRACTION_BLOCK_SIZE_BYTES,
+            row_group_rows=settings.PARQUET_ROW_GROUP_ROWS,
+            sample_rows=settings.SCHEMA_SAMPLE_ROWS,
+            reservoir_size=settings.SCHEMA_RESERVOIR_SIZE,
+        )
+        result["storage_key_sample"] = await _upload_dataset(local_path, parquet_key, bucket=file.storage_bucket)
+    finally:
+        _remove(local_path)
+    return result
+
+
+async def _extract_json(file, parquet_key: str) -> dict:
+    """Stream the original object through the JSON flattener and upload the Parquet output."""
+    from app.config import settings
+    from app.core.storage import open_object_stream
+    from app.extraction.json_records import Flattener, extract_json
+
+    local_path = _temp_path(".parquet")
+    try:
+        result = await asyncio.to_thread(
+            extract_json,
+            functools.partial(open_object_stream, file.storage_key_original, bucket=file.storage_bucket),
+            local_path,
+            hints=file.format_hints or {},
+            flattener=Flattener(
+                array_mode=settings.JSON_ARRAY_MODE,
+                explode_path=settings.JSON_EXPLODE_PATH,
+                max_depth=settings.JSON_MAX_DEPTH,
+            ),
+            batch_rows=settings.JSON_BATCH_ROWS,
+            max_columns=settings.JSON_MAX_COLUMNS,
+            row_group_rows=settings.PARQUET_ROW_GROUP_ROWS,
+            sample_rows=settings.SCHEMA_SAMPLE_ROWS,
+            reservoir_size=settings.SCHEMA_RESERVOIR_SIZE,
+        )
+        result["storage_key_sample"] = await _upload_dataset(local_path, parquet_key, bucket=file.storage_bucket)
+    finally:
+        _remove(local_path)
+    return result
+
+
+async def _extract_pdf(file, parquet_key: str) -> dict:
+    """
+    Extract page ranges on the process pool. Ranges are written in page order
+    as soon as every earlier range is done; progress moves as each one finishes.
+    """
+    from app.config import settings
+    from app.core.storage import download_to_path
+    from app.extraction import pdf
+    from app.extraction.parquet import RowGroupWriter
+    from app.extraction.pool import get_process_pool, run_in_pool
+    from app.extraction.quality import QualityAccumulator
+    from app.extraction.schema import describe_fixed
+    from app.extraction.sketches import TableProfiler
+
+    # pdfminer needs random access (the xref table sits at the end), so work on a local copy
+    source_path = _temp_path(".pdf")
+    local_path = _temp_path(".parquet")
+    try:
+        await download_to_path(file.storage_key_original, source_path, bucket=file.storage_bucket)
+        total_pages = await asyncio.to_thread(pdf.page_count, source_path)
+        ranges = dict(pdf.page_ranges(total_pages, settings.PDF_PAGES_PER_BATCH))
+
+        pool = get_process_pool(settings.EXTRACTION_MAX_WORKERS)
+        gate = asyncio.Semaphore(len(ranges) if pool else 1)
+
+        async def run(start: int, stop: int) -> tuple:
+            async with gate:
+                return await run_in_pool(pool, functools.partial(pdf.extract_pages, source_path, start, stop))
+
+        pending = [asyncio.ensure_future(run(start, stop)) for start, stop in ranges.items()]
+        finished: dict[int, dict] = {}
+        next_start = 0
+        pages_done = 0
+        quality = QualityAccumulator(len(pdf.PDF_SCHEMA))
+        profile = TableProfiler(pdf.PDF_SCHEMA.names)
+
+        with RowGroupWriter(
+            local_path,
+            pdf.PDF_SCHEMA,
+            settings.PARQUET_ROW_GROUP_ROWS,
+            dictionary_columns=pdf.PDF_DICTIONARY_COLUMNS,
+        ) as writer:
+            try:
+                for done in asyncio.as_completed(pending):
+                    start, columns, range_profile = await done
+                    finished[start] = columns
+                    profile.merge(range_profile)
+                    while next_start in finished:
+                        batch = pdf.to_record_batch(finished.pop(next_start))
+                        writer.write_batch(batch)
+                        quality.update(batch)
+                        next_start = ranges[next_start]
+
+                    pages_done += ranges[start] - start
+                    _report(file, 10 + 80 * pages_done // total_pages)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        sample_key, search_segment = await asyncio.gather(
+            _upload_dataset(local_path, parquet_key, bucket=file.storage_bucket),
+            _upload_search_segment(local_path, parquet_key, bucket=file.storage_bucket),
+        )
+    finally:
+        _remove(source_path, local_path)
+
+    # Fixed schema: every value conforms by construction
+    score, details = quality.report(pdf.PDF_SCHEMA.names, [1.0] * len(pdf.PDF_SCHEMA))
+    return {
+        "row_count": writer.rows_written,
+        "column_count": len(pdf.PDF_SCHEMA),
+        "column_schema": describe_fixed(pdf.PDF_SCHEMA, quality.null_counts),
+        "quality_score": score,
+        "quality_details": details,
+        "column_profile": profile.to_dict(),
+        "page_count": total_pages,
+        "storage_key_sample": sample_key,
+        "search_segment": search_segment,
+    }
+
+
+async def _extract_excel(file) -> list[dict]:
+    """
+    Extract every worksheet into its own Parquet file. Sheets run in parallel
+    on the process pool unless ``EXCEL_PARALLEL_SHEETS`` is off. Empty sheets
+    are skipped. Returns one entry per dataset, in workbook order.
+    """
+    from app.config import settings
+    from app.core.storage import download_to_path
+    from app.extraction import excel
+    from app.extraction.pool import get_process_pool, run_in_pool
+
+    # Workbooks are ZIP (or OLE) containers and need random access
+    source_path = _temp_path(".xlsx")
+    local_paths = []
+    try:
+        await download_to_path(file.storage_key_original, source_path, bucket=file.storage_bucket)
+        sheets = await asyncio.to_thread(excel.list_sheets, source_path)
+
+        pool = get_process_pool(settings.EXTRACTION_MAX_WORKERS) if settings.EXCEL_PARALLEL_SHEETS else None
+        gate = asyncio.Semaphore(len(sheets) if pool else 1)
+
+        async def run(index: int, sheet: str) -> tuple[int, str, dict]:
+            local_path = _temp_path(".parquet")
+            local_paths.append(local_path)
+            call = functools.partial(
+                excel.extract_sheet,
+                source_path,
+                sheet,
+                local_path,
+                batch_rows=settings.EXCEL_BATCH_ROWS,
+                row_group_rows=settings.PARQUET_ROW_GROUP_ROWS,
+                sample_rows=settings.SCHEMA_SAMPLE_ROWS,
+                reservoir_size=settings.SCHEMA_RESERVOIR_SIZE,
+            )
+            async with gate:
+                return index, local_path, await run_in_pool(pool, call)
+
+        running = [asyncio.ensure_future(run(i, sheet)) for i, sheet in enumerate(sheets)]
+        outputs: dict[int, dict] = {}
+        finished = 0
+        try:
+            for done in asyncio.as_completed(running):
+                index, local_path, result = await done
+                if result["column_count"]:
+                    dataset_id = uuid.uuid4()
+                    parquet_key = f"{file.user_id}/{file.project_id}/datasets/{dataset_id}.parquet"
+                    sample_key = await _upload_dataset(local_path, parquet_key, bucket=file.storage_bucket)
+                    outputs[index] = {
+                        **result,
+                        "id": dataset_id,
+                        "name": f"{file.original_filename} — {result['sheet']}" if len(sheets) > 1 else file.original_filename,
+                        "storage_key_parquet": parquet_key,
+                        "storage_key_sample": sample_key,
+                    }
+                finished += 1
+                _report(file, 10 + 80 * finished // len(running))
+        except BaseException:
+            for task in running:
+                task.cancel()
+            raise
+    finally:
+        _remove(source_path, *local_paths)
+
+    return [outputs[i] for i in sorted(outputs)]
+
+
+async def _process(file_id: str) -> str | None:
+    """Run extraction for one file; returns its final status."""
     from sqlalchemy import select
     from app.core.database import async_session
     from app.models.file import File
     from app.models.dataset import Dataset
+    from app.services.search_service import add_segment
 
     async with async_session() as db:
         result = await db.execute(select(File).where(File.id == uuid.UUID(file_id)))
         file = result.scalar_one_or_none()
         if file is None:
-            return
+            return None
+
+        # Direct-to-storage uploads are never seen by the API; sniff them here
+        if file.format_hints is None:
+            from app.core.storage import read_object_range
+            from app.services.file_detector import SNIFF_BYTES, sniff
+
+            head = await read_object_range(file.storage_key_original, 0, SNIFF_BYTES, bucket=file.storage_bucket)
+            detection = sniff(head, file.original_filename)
+            file.detected_format = detection["format"]
+            file.mime_type = detection["mime_type"]
+            file.format_hints = detection["hints"]
+
+        # Content that the sniffer could not place will never parse; fail once, don't retry
+        if file.detected_format not in SUPPORTED_FORMATS:
+            file.status = "error"
+            file.error_message = f"Unsupported file format: {file.detected_format or 'unknown'}"
+            await db.commit()
+            _publish_state(file)
+            return file.status
+
+        timer = StageTimer()
+        from app.services.extraction_cache_service import attach_cached_extraction, store_extraction
 
         try:
+            # Same bytes, engine version and options as an earlier run: reuse its outputs
+            if await attach_cached_extraction(db, file=file) is not None:
+                file.status = "ready"
+                file.processing_progress = 100
+                file.extraction_metadata = {**file.extraction_metadata, "timings_ms": timer.finish()}
+                await db.commit()
+                _publish_state(file)
+                return file.status
+
             # Update status
             file.status = "processing"
             file.processing_progress = 10
             await db.commit()
+            _publish_state(file)
 
             # --- Format-specific extraction ---
             fmt = file.detected_format or "unknown"
+            dataset_id = uuid.uuid4()
+            parquet_key = None
+            outputs = None  # one entry per dataset for multi-dataset formats (workbooks)
+            extra_metadata = {}
+            extracted = {}
             schema = {}
             row_count = 0
             column_count = 0
 
-            if fmt in ("csv", "tsv", "excel"):
-                # In production: download from S3, parse with pandas
-                schema = {"column_1": "string", "column_2": "number"}
-                row_count = 100
-                column_count = 2
-                file.processing_progress = 60
-
-            elif fmt == "pdf":
-                # In production: OCR + table extraction
-                schema = {"page": "integer", "text": "string"}
-                row_count = 10
-                column_count = 2
-                file.processing_progress = 60
-
-            elif fmt == "image":
-                # In production: OCR + structured extraction
-                schema = {"extracted_text": "string", "confidence": "float"}
-                row_count = 1
-                column_count = 2
-                file.processing_progress = 60
-
-            elif fmt == "json":
-                schema = {"key": "string", "value": "any"}
-                row_count = 50
-                column_count = 2
-                file.processing_progress = 60
+            with timer.stage("extract"):
+                if fmt in ("csv", "tsv"):
+                    parquet_key = f"{file.user_id}/{file.project_id}/datasets/{dataset_id}.parquet"
+                    extracted = await _extract_delimited(file, parquet_key)
+                    schema = extracted["column_schema"]
+                    row_count = extracted["row_count"]
+                    column_count = extracted["column_count"]
+                    extra_metadata["skipped_rows"] = extracted["skipped_rows"]
+                    _report(file, 60)
 
-            await db.commit()
+                elif fmt == "excel":
+                    outputs = await _extract_excel(file)
+                    if not outputs:
+                        # Nothing a retry could change
+                        file.status = "error"
+                        file.error_message = "Workbook has no data: every sheet is empty"
+                        await db.commit()
+                        _publish_state(file)
+                        return file.status
+                    schema = {o["sheet"]: o["column_schema"] for o in outputs}
+                    row_count = sum(o["row_count"] for o in outputs)
+                    column_count = sum(o["column_count"] for o in outputs)
+                    extra_metadata["sheets"] = [
+                        {"sheet": o["sheet"], "dataset_id": str(o["id"]), "row_count": o["row_count"], "header_row": o["header_row"]}
+                        for o in outputs
+                    ]
+                    _report(file, 90)
 
-            # Create dataset record
-            dataset = Dataset(
-                id=uuid.uuid4(),
-                file_id=file.id,
-                project_id=file.project_id,
-                name=file.original_filename,
-                column_schema=schema,
-                row_count=row_count,
-                column_count=column_count,
-                quality_score=85,
-                version=1,
-            )
-            db.add(dataset)
+                elif fmt == "pdf":
+                    parquet_key = f"{file.user_id}/{file.project_id}/datasets/{dataset_id}.parquet"
+                    extracted = await _extract_pdf(file, parquet_key)
+                    schema = extracted["column_schema"]
+                    row_count = extracted["row_count"]
+                    column_count = extracted["column_count"]
+                    extra_metadata["page_count"] = extracted["page_count"]
+                    _report(file, 90)
+
+                elif fmt == "image":
+                    # In production: OCR + structured extraction
+                    schema = _placeholder_schema(extracted_text="string", confidence="float")
+                    row_count = 1
+                    column_count = 2
+                    _report(file, 60)
+
+                elif fmt == "json":
+                    parquet_key = f"{file.user_id}/{file.project_id}/datasets/{dataset_id}.parquet"
+                    extracted = await _extract_json(file, parquet_key)
+                    schema = extracted["column_schema"]
+                    row_count = extracted["row_count"]
+                    column_count = extracted["column_count"]
+                    extra_metadata["record_count"] = extracted["record_count"]
+                    extra_metadata["skipped_rows"] = extracted["skipped_rows"]
+                    if extracted["explode_path"]:
+                        extra_metadata["explode_path"] = extracted["explode_path"]
+                    _report(file, 60)
+
+            # Create dataset records
+            if outputs is None:
+                outputs = [{
+                    "id": dataset_id,
+                    "name": file.original_filename,
+                    "column_schema": schema,
+                    "row_count": row_count,
+                    "column_count": column_count,
+                    "quality_score": extracted.get("quality_score"),
+                    "quality_details": extracted.get("quality_details"),
+                    "column_profile": extracted.get("column_profile"),
+                    "storage_key_parquet": parquet_key,
+                    "storage_key_sample": extracted.get("storage_key_sample"),
+                    "search_segment": extracted.get("search_segment"),
+                }]
+            datasets = []
+            for output in outputs:
+                datasets.append(Dataset(
+                    id=output["id"],
+                    file_id=file.id,
+                    project_id=file.project_id,
+                    name=output["name"],
+                    column_schema=output["column_schema"],
+                    row_count=output["row_count"],
+                    column_count=output["column_count"],
+                    quality_score=output["quality_score"],
+                    quality_details=output["quality_details"],
+                    column_profile=output["column_profile"],
+                    storage_key_parquet=output["storage_key_parquet"],
+                    storage_key_sample=output["storage_key_sample"],
+                    version=1,
+                ))
+            db.add_all(datasets)
+
+            # Extracted text joins the project's full-text index
+            search_segments = {}
+            for dataset, output in zip(datasets, outputs):
+                if output.get("search_segment"):
+                    add_segment(db, dataset=dataset, segment=output["search_segment"])
+                    search_segments[dataset.id] = output["search_segment"]
 
             # Mark file as ready
             file.status = "ready"
             file.processing_progress = 100
             file.extracted_schema = schema
+            durations = timer.finish()
             file.extraction_metadata = {
                 "format": fmt,
                 "row_count": row_count,
                 "column_count": column_count,
+                **extra_metadata,
+                "timings_ms": durations,
             }
+            _record_runs(db, file, durations)
+            await store_extraction(db, file=file, datasets=datasets, search_segments=search_segments)
             await db.commit()
+            _publish_state(file)
+            return file.status
 
         except Exception as e:
+            # Drop whatever the failed step left pending (e.g. half-attached cached datasets)
+            await db.rollback()
+            await db.refresh(file)
             file.status = "error"
             file.error_message = str(e)
             file.retry_count += 1
             await db.commit()
+            _publish_state(file)
             raise
 
 
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=30)
-def process_file_extraction(self, file_id: str):
+def process_file_extraction(self, file_id: str, batch_id: str | None = None):
     """
     Background task: extract structured data from uploaded file.
-    Triggered after file upload.
+    Triggered after file upload. ``batch_id`` ties it to a bulk upload's
+    aggregate progress record.
     """
     try:
-        _run_async(_process(file_id))
+        status = _run_async(_process(file_id))
     except Exception as exc:
+        if batch_id and self.request.retries >= self.max_retries:
+            _record_batch_result(batch_id, succeeded=False)
         self.retry(exc=exc)
+    else:
+        if batch_id:
+            _record_batch_result(batch_id, succeeded=status == "ready")
+
+
+def _record_batch_result(batch_id: str, succeeded: bool) -> None:
+    from app.services.bulk_upload_service import record_batch_result
+
+    try:
+        record_batch_result(batch_id, succeeded)
+    except Exception:
+        pass  # Progress bookkeeping must not fail the extraction
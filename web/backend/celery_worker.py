@@ -1,5 +1,7 @@
 """
 Celery worker entry point.
-Usage: celery -A celery_worker.celery_app worker --loglevel=info
+Usage:
+    celery -A celery_worker.celery_app worker -Q celery --loglevel=info
+    celery -A celery_worker.celery_app worker -Q extraction --pool=threads --concurrency=4 --loglevel=info
 """
 from app.tasks import celery_app  # noqa: F401